@@ -1,30 +1,45 @@
 """Module with admin apis."""
+import datetime
 
 from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
-import json
 from typing import Optional, Literal
 
 from fastapi import APIRouter, Depends, Query, BackgroundTasks
-from sqlalchemy import desc
 from sqlmodel import Session, select
-from sqlalchemy.sql import text
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from payment_app.models.client_gateways import ClientGateway
 
 from payment_app.dependencies.verify_api_key import verify_api_key
 from payment_app.configs.db import get_session
 from payment_app.lib.errors.error_handler import NotFoundException
 from payment_app.models.client_gateways import ClientGateway
-from payment_app.lib.errors.error_handler import InternalServerException, NotFoundException
+from payment_app.lib.errors.error_handler import (
+    InternalServerException,
+    NotFoundException,
+    UnprocessableEntity,
+)
 from payment_app.models.access_client_relation import AccessClientMapper
 from payment_app.models.access_points import AccessPoint
 from payment_app.models.refund_transactions import RefundTransaction
 from payment_app.models.qr_codes import QRCode
 from payment_app.models.transaction import Transaction
+from payment_app.services.cold_archive import cold_archive
+from payment_app.services.export import FORMATS, export, export_filename, export_statement
+from payment_app.services.failure_analytics import (
+    cached_payments,
+    rates_by,
+    summary,
+    top_failure_reasons,
+    trend,
+)
 from payment_app.services.payment_service import PaymentService
+from payment_app.services.rollup import summarize
+from payment_app.settings import settings
 
-from payment_app.services.payment_service import PaymentService
-from payment_app.utils import custom_json_serializer
+from payment_app.lib.fieldsets import fields_of, load_options, parse_names, select_fields
+from payment_app.lib.pagination import paginate
+from payment_app.lib.serializer import FastJSONResponse
+from payment_app.lib.totals import count_total
 
 router_v1 = APIRouter(
     prefix="/admin/v1",
@@ -44,51 +59,223 @@ async def get_transactions(
     page: int = 0,
     limit: int = Query(default=10, lte=100),
     ordering: str = Query(default="-created_at"),
+    cursor: Optional[str] = None,
     qr_id: str = Query(default=""),
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
     session: Session = Depends(get_session),
     commons: dict = Depends(verify_api_key),
 ):
     """
-    Get transactions
+    Get transactions, list rows leave out JSON columns unless named in expand or fields
     """
+    fields, expand = parse_names(Transaction, fields), parse_names(Transaction, expand)
     if transaction_id:
-        transaction = session.query(Transaction).filter(Transaction.id == transaction_id).first()
+        transaction = session.query(Transaction).options(
+            *load_options(Transaction, fields, expand, defer_heavy=False)
+        ).filter(Transaction.id == transaction_id).first() or cold_archive.get_transaction(
+            transaction_id
+        )
         if transaction:
-            results = json.loads(transaction.json())
+            results = fields_of(transaction, fields)
         else:
             raise NotFoundException(message="Transaction not found!")
-    elif qr_id:
-        _number_of_transactions = session.query(Transaction).where(Transaction.gateway_order_id == qr_id).count()
-        if '-' == ordering[0]:
-            ordering = ordering[1:]
-            transactions = session.exec(
-                select(Transaction).where(Transaction.gateway_order_id == qr_id).order_by(desc(ordering)).offset((page-1)*limit).limit(limit)
-            ).all()
-        else:
-            transactions = session.exec(
-                select(Transaction).where(Transaction.gateway_order_id == qr_id).order_by(ordering).offset((page-1)*limit).limit(limit)
-            ).all()
-        results = {
-            "results": [json.loads(transaction.json()) for transaction in transactions],
-            "total": _number_of_transactions
-        }
     else:
-        _number_of_transactions = session.query(Transaction).count()
-        if '-' == ordering[0]:
-            ordering = ordering[1:]
-            transactions = session.exec(
-                select(Transaction).order_by(desc(ordering)).offset((page-1)*limit).limit(limit)
-            ).all()
+        statement = select(Transaction).options(*load_options(Transaction, fields, expand))
+        if qr_id:
+            statement = statement.where(Transaction.gateway_order_id == qr_id)
+            total, total_exact = count_total(
+                session,
+                session.query(Transaction).where(Transaction.gateway_order_id == qr_id),
+                ("transactions", "gateway_order_id", qr_id),
+            )
         else:
-            transactions = session.exec(
-                select(Transaction).order_by(ordering).offset((page-1)*limit).limit(limit)
-            ).all()
+            total, total_exact = count_total(
+                session, session.query(Transaction), ("transactions",), estimate_table="transactions"
+            )
+        transactions, next_cursor = paginate(
+            session, statement, Transaction, ordering, limit, cursor=cursor, page=page
+        )
         results = {
-            "results": [json.loads(transaction.json()) for transaction in transactions],
-            "total": _number_of_transactions
+            "results": select_fields(transactions, fields),
+            "total": total,
+            "total_exact": total_exact,
+            "next_cursor": next_cursor,
         }
 
-    return JSONResponse(results)
+    return FastJSONResponse(results)
+
+@router_v1.get("/search_transactions")
+async def search_transactions(
+    status: Optional[str] = None,
+    store_id: Optional[str] = None,
+    client_id: Optional[int] = None,
+    driver: Optional[int] = None,
+    payment_type: Optional[str] = None,
+    created_from: Optional[datetime.datetime] = None,
+    created_to: Optional[datetime.datetime] = None,
+    limit: int = Query(default=10, lte=100),
+    ordering: Literal["-created_at", "created_at"] = Query(default="-created_at"),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
+    session: Session = Depends(get_session),
+    commons: dict = Depends(verify_api_key),
+):
+    """
+    Search transactions.
+    A store_id or client_id filter, or a created_at range of at most
+    search_max_range_days, is required so every search is served by an index.
+    """
+    if not (store_id or client_id):
+        if not (created_from and created_to):
+            raise UnprocessableEntity(
+                message="store_id, client_id or created_from and created_to are required"
+            )
+        if created_to - created_from > datetime.timedelta(days=settings.search_max_range_days):
+            raise UnprocessableEntity(
+                message=f"created range is limited to {settings.search_max_range_days} days "
+                "without store_id or client_id"
+            )
+    filters = (
+        (Transaction.status, status),
+        (Transaction.store_id, store_id),
+        (Transaction.client_id, client_id),
+        (Transaction.driver, driver),
+        (Transaction.payment_type, payment_type),
+    )
+    fields, expand = parse_names(Transaction, fields), parse_names(Transaction, expand)
+    statement = select(Transaction).options(*load_options(Transaction, fields, expand))
+    count_query = session.query(Transaction)
+    for column, value in filters:
+        if value is not None:
+            statement = statement.where(column == value)
+            count_query = count_query.where(column == value)
+    if created_from:
+        statement = statement.where(Transaction.created_at >= created_from)
+        count_query = count_query.where(Transaction.created_at >= created_from)
+    if created_to:
+        statement = statement.where(Transaction.created_at < created_to)
+        count_query = count_query.where(Transaction.created_at < created_to)
+
+    transactions, next_cursor = paginate(
+        session, statement, Transaction, ordering, limit, cursor=cursor
+    )
+    total, total_exact = count_total(
+        session,
+        count_query,
+        ("transactions", status, store_id, client_id, driver, payment_type, created_from, created_to),
+    )
+    return FastJSONResponse({
+        "results": select_fields(transactions, fields),
+        "total": total,
+        "total_exact": total_exact,
+        "next_cursor": next_cursor,
+    })
+
+
+@router_v1.get("/export/{entity}")
+async def export_rows(
+    entity: Literal["transactions", "refund_transactions", "payment_analytics"],
+    created_from: datetime.datetime,
+    created_to: datetime.datetime,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    gzip: bool = False,
+    status: Optional[str] = None,
+    client_id: Optional[int] = None,
+    store_id: Optional[str] = None,
+    driver: Optional[int] = None,
+    payment_type: Optional[str] = None,
+    payment_method: Optional[str] = None,
+    commons: dict = Depends(verify_api_key),
+):
+    """
+    Stream every row of entity created in [created_from, created_to) as NDJSON or CSV.
+    Rows are read through a server side cursor and sent as a chunked response.
+    """
+    statement = export_statement(
+        entity,
+        created_from,
+        created_to,
+        status=status,
+        client_id=client_id,
+        store_id=store_id,
+        driver=driver,
+        payment_type=payment_type,
+        payment_method=payment_method,
+    )
+    filename = export_filename(entity, created_from, created_to, format, gzip)
+    return StreamingResponse(
+        export(statement, format, gzip),
+        media_type="application/gzip" if gzip else FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router_v1.get("/summary/{rollup}")
+async def get_summary(
+    rollup: Literal["transactions", "refunds"],
+    from_day: datetime.date,
+    to_day: datetime.date,
+    group_by: str = Query(default="day"),
+    status: Optional[str] = None,
+    client_id: Optional[int] = None,
+    store_id: Optional[str] = None,
+    driver: Optional[int] = None,
+    payment_type: Optional[str] = None,
+    session: Session = Depends(get_session),
+    commons: dict = Depends(verify_api_key),
+):
+    """
+    Counts and amounts of transactions or refunds per group_by dimensions,
+    read from the daily rollups instead of the transaction rows.
+    """
+    results = summarize(
+        session,
+        rollup,
+        from_day,
+        to_day,
+        [name.strip() for name in group_by.split(",") if name.strip()],
+        {
+            "status": status,
+            "client_id": client_id,
+            "store_id": store_id,
+            "driver": driver,
+            "payment_type": payment_type,
+        },
+    )
+    return FastJSONResponse({"results": results})
+
+
+@router_v1.get("/analytics/payment_rates")
+async def get_payment_rates(
+    dimension: Literal["payment_method", "card_network", "issuer", "store_id", "step"],
+    from_time: datetime.datetime,
+    to_time: datetime.datetime,
+    limit: int = Query(default=50, lte=500),
+    commons: dict = Depends(verify_api_key),
+):
+    """Payment success and failure rates per value of dimension."""
+    payments = cached_payments(from_time, to_time)
+    return FastJSONResponse({**summary(payments), "rates": rates_by(payments, dimension, limit)})
+
+
+@router_v1.get("/analytics/payment_failures")
+async def get_payment_failures(
+    from_time: datetime.datetime,
+    to_time: datetime.datetime,
+    bucket: Literal["hour", "day"] = "hour",
+    top: int = Query(default=10, lte=100),
+    commons: dict = Depends(verify_api_key),
+):
+    """Top payment failure reasons and the failure rate per time bucket."""
+    payments = cached_payments(from_time, to_time)
+    return FastJSONResponse({
+        **summary(payments),
+        "top_failure_reasons": top_failure_reasons(payments, top),
+        "trend": trend(payments, bucket),
+    })
+
 
 @router_v1.get("/get_refund_transactions/{refund_transaction_id}")
 @router_v1.get("/get_refund_transactions")
@@ -97,40 +284,51 @@ async def get_refund_transactions(
     page: int = 0,
     limit: int = Query(default=10, lte=100),
     ordering: str = Query(default="-created_at"),
+    cursor: Optional[str] = None,
     filters: str = Query(default=""),
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
     session: Session = Depends(get_session),
     commons: dict = Depends(verify_api_key),
 ):
     """
-    Get refund transactions
+    Get refund transactions, list rows leave out JSON columns unless named in expand or fields
     """
+    fields, expand = parse_names(RefundTransaction, fields), parse_names(RefundTransaction, expand)
     if refund_transaction_id:
-        refund_transaction = session.query(RefundTransaction).filter(
+        refund_transaction = session.query(RefundTransaction).options(
+            *load_options(RefundTransaction, fields, expand, defer_heavy=False)
+        ).filter(
             RefundTransaction.id == refund_transaction_id
-        ).first()
+        ).first() or cold_archive.get_refund("id", refund_transaction_id)
         if refund_transaction:
-            results = json.loads(refund_transaction.json())
+            results = fields_of(refund_transaction, fields)
         else:
             raise NotFoundException(message="Refund Transaction not found!")
     else:
-        _number_of_refund_transactions = session.query(RefundTransaction).count()
-        if '-' == ordering[0]:
-            ordering = ordering[1:]
-            refund_transactions = session.exec(
-                select(RefundTransaction).order_by(desc(ordering)).offset((page-1)*limit).limit(limit)
-            ).all()
-        else:
-            refund_transactions = session.exec(
-                select(RefundTransaction).order_by(ordering).offset((page-1)*limit).limit(limit)
-            ).all()
+        refund_transactions, next_cursor = paginate(
+            session,
+            select(RefundTransaction).options(*load_options(RefundTransaction, fields, expand)),
+            RefundTransaction,
+            ordering,
+            limit,
+            cursor=cursor,
+            page=page,
+        )
+        total, total_exact = count_total(
+            session,
+            session.query(RefundTransaction),
+            ("refund_transactions",),
+            estimate_table="refund_transactions",
+        )
         results = {
-            "results": [json.loads(
-                refund_transaction.json()
-            ) for refund_transaction in refund_transactions],
-            "total": _number_of_refund_transactions
+            "results": select_fields(refund_transactions, fields),
+            "total": total,
+            "total_exact": total_exact,
+            "next_cursor": next_cursor,
         }
 
-    return JSONResponse(results)
+    return FastJSONResponse(results)
 
 
 @router_v1.get("/get_qr_store_codes/{store_id}")
@@ -142,49 +340,64 @@ async def get_qr_codes(
     page: int = 0,
     limit: int = Query(default=10, lte=100),
     ordering: str = Query(default="-created_at"),
+    cursor: Optional[str] = None,
     filters: str = Query(default=""),
+    fields: Optional[str] = None,
+    expand: Optional[str] = None,
     session: Session = Depends(get_session),
     commons: dict = Depends(verify_api_key),
 ):
     """
-    Get QR Codes
+    Get QR Codes, list rows leave out JSON columns unless named in expand or fields
     """
+    fields, expand = parse_names(QRCode, fields), parse_names(QRCode, expand)
     if qr_code_id:
-        qr_code = session.query(QRCode).filter(
+        qr_code = session.query(QRCode).options(
+            *load_options(QRCode, fields, expand, defer_heavy=False)
+        ).filter(
             QRCode.id == qr_code_id
         ).first()
         if qr_code:
-            results = json.loads(qr_code.json())
+            results = fields_of(qr_code, fields)
         else:
             raise NotFoundException(message="QR Code not found!")
     elif store_id:
-        query = text(f"""select * from qr_codes where JSON_EXTRACT(notes,'$.store_id') = '{store_id}' AND status <> 'failed'""")
-        qr_codes = session.execute(query).all()
+        statement = (
+            select(QRCode)
+            .options(*load_options(QRCode, fields, expand, defer_heavy=False))
+            .where(QRCode.store_id == store_id)
+            .where(QRCode.status != 'failed')
+        )
+        qr_codes = session.exec(statement).all()
         if qr_codes:
             results = {
-                    "results": [json.loads(json.dumps(dict(qr_code), default=custom_json_serializer)) for qr_code in qr_codes],
+                    "results": select_fields(qr_codes, fields),
                 }
         else:
             raise NotFoundException(message="QR Code not found!")
     else:
-        _number_of_qr_codes = session.query(QRCode).count()
-        if '-' == ordering[0]:
-            ordering = ordering[1:]
-            qr_codes = session.exec(
-                select(QRCode).where(QRCode.status != 'failed').order_by(desc(ordering)).offset((page-1)*limit).limit(limit)
-            ).all()
-        else:
-            qr_codes = session.exec(
-                select(QRCode).where(QRCode.status != 'failed').order_by(ordering).offset((page-1)*limit).limit(limit)
-            ).all()
+        qr_codes, next_cursor = paginate(
+            session,
+            select(QRCode)
+            .options(*load_options(QRCode, fields, expand))
+            .where(QRCode.status != 'failed'),
+            QRCode,
+            ordering,
+            limit,
+            cursor=cursor,
+            page=page,
+        )
+        total, total_exact = count_total(
+            session, session.query(QRCode), ("qr_codes",), estimate_table="qr_codes"
+        )
         results = {
-            "results": [json.loads(
-                qr_code.json()
-            ) for qr_code in qr_codes],
-            "total": _number_of_qr_codes
+            "results": select_fields(qr_codes, fields),
+            "total": total,
+            "total_exact": total_exact,
+            "next_cursor": next_cursor,
         }
 
-    return JSONResponse(results)
+    return FastJSONResponse(results)
 
 @router_v1.get("/get_endpoints")
 async def get_Endpoints(
@@ -196,12 +409,12 @@ async def get_Endpoints(
     try:
         statement = select(AccessPoint)
         endpoints = session.exec(statement).all()
-        number_of_endpoints = session.query(AccessPoint).count()
         results = {
-            "endpoints": [json.loads(endpoint.json()) for endpoint in endpoints],
-            "total": number_of_endpoints
+            "endpoints": endpoints,
+            "total": len(endpoints),
+            "total_exact": True,
         }
-        return JSONResponse(results)
+        return FastJSONResponse(results)
     except Exception as e:
         raise InternalServerException(message=f"{str(e)}")
 
@@ -218,8 +431,8 @@ async def get_client_endpoints(
         statement = select(AccessPoint).join(AccessClientMapper).where(AccessClientMapper.client_id == client_id)
         related_endpoints = session.exec(statement)
         for related_endpoint in related_endpoints:
-            endpoints.append(json.loads(related_endpoint.json()))
-        return JSONResponse({
+            endpoints.append(related_endpoint)
+        return FastJSONResponse({
             "client_id": client_id,
             "endpoints": endpoints
         })
@@ -1,6 +1,7 @@
 """Module for payment drivers"""
+import datetime
 from abc import abstractmethod
-from typing import Union
+from typing import Optional, Union
 from fastapi import UploadFile
 from typing import List
 
@@ -14,8 +15,16 @@ from payment_app.schemas.requests.v1.make_payment_in import MakePaymentInRazorpa
 from payment_app.schemas.requests.v1.refund_payment_in import RefundPaymentIn
 
 
+# optional driver operations used by the reconciliation jobs, see BaseDriver.capabilities
+CAPABILITY_LIST_PAYMENTS = "list_payments"
+CAPABILITY_REFUND_SYNC = "refund_sync"
+CAPABILITY_SETTLEMENTS = "settlements"
+
+
 class BaseDriver:
     """Abstract class for payment drivers"""
+    # optional operations the driver implements, jobs skip drivers without them
+    capabilities: frozenset = frozenset()
 
     @abstractmethod
     def make_payment(
@@ -45,10 +54,26 @@ class BaseDriver:
     def get_refund_status(self, refund: RefundTransaction, send_callback: bool):
         """Get refund transaction status."""
 
+    @abstractmethod
+    def fetch_refund(self, refund: RefundTransaction, transaction: Transaction) -> Optional[dict]:
+        """Fetch the gateway state of a refund without writing anything."""
+
+    @abstractmethod
+    def apply_refund_response(self, refund_transaction: RefundTransaction, data: dict) -> RefundTransaction:
+        """Apply a fetched gateway refund state to the refund, caller commits."""
+
     @abstractmethod
     def get_payment_status(self, transaction: Transaction, send_callback: bool):
         """Get transaction status."""
 
+    @abstractmethod
+    def list_payments(self, from_timestamp: int, to_timestamp: int, skip: int, count: int) -> list:
+        """List gateway payments created in [from_timestamp, to_timestamp], one page."""
+
+    @abstractmethod
+    def list_settlement_items(self, day: datetime.date, skip: int, count: int) -> list:
+        """List settled payments, refunds and adjustments of one settlement day, one page."""
+
     @abstractmethod
     def process_callback(self, request: dict, callback_type: str):
         """Handles callback for all payment events."""
@@ -14,6 +14,8 @@ from payment_app.models.transaction import (
 )
 
 from payment_app.models import QRCode
+from payment_app.services.payment_analytic import analytic_row, upsert_payment_analytics
+from payment_app.services.refund_summary import apply_refund_change
 
 class CallbackEventHandler:
     """Payments event callback handler."""
@@ -30,14 +32,29 @@ class CallbackEventHandler:
         self.session.commit()
         self.session.refresh(transaction_callback)
         logger.debug(f"Payment event: {webhook_body}")
-        return self._update_payment_transaction(
+        transaction = self._update_payment_transaction(
             webhook_body["payload"]["payment"]["entity"]["order_id"],
             webhook_body["payload"]["payment"]["entity"]["id"],
             webhook_body["payload"]["payment"]["entity"]
         )
+        self._upsert_payment_analytic(transaction, webhook_body["payload"]["payment"]["entity"])
+        return transaction
+
+    def _upsert_payment_analytic(self, transaction: Transaction, payment: dict):
+        """Keep payment_analytics current from settled payment events."""
+        if payment["status"] in ("created", "authorized"):
+            return
+        try:
+            upsert_payment_analytics(
+                self.session, [analytic_row(transaction.id, transaction.status, payment)]
+            )
+            self.session.commit()
+        except Exception as ex:
+            self.session.rollback()
+            logger.error(f"Error while updating payment analytic {payment['id']}: {ex}")
 
     def handle_refund_callback(self, transaction_callback: TransactionCallbacks, webhook_body: dict):
-        """refund.created, refund.processed, refund.failed"""
+        """refund.created, refund.processed, refund.failed, returns (transaction, refund)"""
         transaction_callback.type = "refund"
         transaction_callback.callback = webhook_body
         self.session.add(transaction_callback)
@@ -70,11 +87,11 @@ class CallbackEventHandler:
             refund_transaction = results.first()
         # update refund response
 
-        self._update_refund_transaction(
+        refund_transaction = self._update_refund_transaction(
             refund_transaction,
             webhook_body["payload"]["refund"]["entity"],
         )
-        return transaction
+        return transaction, refund_transaction
 
     def handle_qr_code_callback(self, webhook_body):
         """qr.created, qr.credited, qr.closed"""
@@ -160,6 +177,8 @@ class CallbackEventHandler:
                 closed_at= None if not webhook_body["payload"]["qr_code"]["entity"]["closed_at"] else datetime.datetime.utcfromtimestamp(webhook_body["payload"]["qr_code"]["entity"]["closed_at"]),
                 close_reason=webhook_body["payload"]["qr_code"]["entity"]["close_reason"],
                 status=webhook_body["payload"]["qr_code"]["entity"]["status"],
+                store_id=webhook_body["payload"]["qr_code"]["entity"]["notes"].get("store_id"),
+                store_type=webhook_body["payload"]["qr_code"]["entity"]["notes"].get("store_type"),
             )
             self.session.add(qr_code)
             self.session.commit()
@@ -242,6 +261,8 @@ class CallbackEventHandler:
             if refund_transaction.status == STATUS_SUCCESS:
                 return refund_transaction
 
+        previous_status = refund_transaction.status
+        previous_amount = refund_transaction.amount
         refund_transaction.refund_id = data["id"]
         refund_transaction.api_response = data
         refund_transaction.callback_response = data
@@ -253,6 +274,9 @@ class CallbackEventHandler:
 
         refund_transaction.amount = data["amount"] / 100
         self.session.add(refund_transaction)
+        apply_refund_change(
+            self.session, refund_transaction, previous_status, previous_amount
+        )
         self.session.commit()
         self.session.refresh(refund_transaction)
         return refund_transaction
@@ -262,6 +286,7 @@ class CallbackEventHandler:
             refund_id=param["id"], transaction_id=transaction.id, response=param
         )
         self.session.add(refund_transaction)
+        apply_refund_change(self.session, refund_transaction)
         self.session.commit()
         self.session.refresh(refund_transaction)
         return refund_transaction
\ No newline at end of file
@@ -20,6 +20,7 @@ import requests
 import paytmchecksum
 
 from payment_app.schemas.requests.v1.refund_payment_in import RefundPaymentIn
+from payment_app.services.refund_summary import apply_refund_change
 
 
 class PaytmDriver(BaseDriver):
@@ -130,6 +131,7 @@ class PaytmDriver(BaseDriver):
         refund_transaction.api_request = paytm_params
         refund_transaction.additional_info = refund_payment_in.notes
         self.session.add(refund_transaction)
+        apply_refund_change(self.session, refund_transaction)
         self.session.commit()
         self.session.refresh(refund_transaction)
         try:
@@ -149,9 +151,13 @@ class PaytmDriver(BaseDriver):
             refund_transaction.api_status = HTTPStatus.INTERNAL_SERVER_ERROR.value
             refund_transaction.api_response = str(ex)
             self.session.add(refund_transaction)
+            apply_refund_change(
+                self.session, refund_transaction, STATUS_PENDING, refund_transaction.amount
+            )
             self.session.commit()
             raise ForbiddenException(message=f"{str(ex)}")
 
+        previous_status = refund_transaction.status
         if response["body"]["resultInfo"]["resultStatus"] == "TXN_FAILURE":
             refund_transaction.api_status = HTTPStatus.FORBIDDEN.value
             refund_transaction.status = STATUS_FAILED
@@ -162,6 +168,9 @@ class PaytmDriver(BaseDriver):
             
         refund_transaction.api_response = response
         self.session.add(refund_transaction)
+        apply_refund_change(
+            self.session, refund_transaction, previous_status, refund_transaction.amount
+        )
         self.session.commit()
         self.session.refresh(refund_transaction)
         return refund_transaction
@@ -288,10 +297,14 @@ class PaytmDriver(BaseDriver):
                     raise NotFoundException(message=f"refund transaction not found")
                 
                 transaction = refund_transaction.transaction
+                previous_status = refund_transaction.status
                 refund_transaction.status = STATUS_SUCCESS
                 refund_transaction.api_response = webhook_body
                 refund_transaction.callback_response = webhook_body
                 self.session.add(refund_transaction)
+                apply_refund_change(
+                    self.session, refund_transaction, previous_status, refund_transaction.amount
+                )
                 self.session.commit()
                 self.session.refresh(refund_transaction)
                 self.background_tasks.add_task(
@@ -300,6 +313,7 @@ class PaytmDriver(BaseDriver):
                     {
                         "event": "refund",
                         "transaction": transaction,
+                        "refund": refund_transaction,
                         "driver": "paytm",
                     },
                 )
@@ -345,6 +359,7 @@ class PaytmDriver(BaseDriver):
             refund_id=param["id"], transaction_id=transaction.id, response=param
         )
         self.session.add(refund_transaction)
+        apply_refund_change(self.session, refund_transaction)
         self.session.commit()
         self.session.refresh(refund_transaction)
         return refund_transaction
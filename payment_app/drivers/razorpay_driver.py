@@ -1,9 +1,8 @@
 """Module for payment drivers"""
 from abc import ABC
 from http import HTTPStatus
-import json
 import datetime
-from typing import Union
+from typing import Optional, Union
 import requests
 import razorpay
 import ulid
@@ -19,7 +18,12 @@ from fastapi import UploadFile
 from typing import List
 from requests.auth import HTTPBasicAuth
 
-from payment_app.drivers.base_driver import BaseDriver
+from payment_app.drivers.base_driver import (
+    CAPABILITY_LIST_PAYMENTS,
+    CAPABILITY_REFUND_SYNC,
+    CAPABILITY_SETTLEMENTS,
+    BaseDriver,
+)
 from payment_app.drivers.helpers.callback_event_handler import CallbackEventHandler
 from payment_app.drivers.helpers.razorpay_helper import RazorpayHelper
 from payment_app.handlers.client_callback_handler import (
@@ -54,10 +58,16 @@ from payment_app.schemas.requests.v1.refund_payment_in import RefundPaymentIn
 from payment_app.lib.errors import (
     ForbiddenException,InternalServerException,NotFoundException,UnprocessableEntity
 )
+from payment_app.lib.serializer import model_to_dict
+from payment_app.services.cold_archive import cold_archive
+from payment_app.services.refund_summary import apply_refund_change
 from payment_app.utils import upload_file_to_s3
 
 
 class RazorpayDriver(BaseDriver, ABC):
+    capabilities = frozenset(
+        (CAPABILITY_LIST_PAYMENTS, CAPABILITY_REFUND_SYNC, CAPABILITY_SETTLEMENTS)
+    )
     def __init__(
         self,
         session: Session,
@@ -181,6 +191,7 @@ class RazorpayDriver(BaseDriver, ABC):
         refund_transaction.api_request = request_data
 
         self.session.add(refund_transaction)
+        apply_refund_change(self.session, refund_transaction)
         self.session.commit()
         self.session.refresh(refund_transaction)
 
@@ -192,11 +203,15 @@ class RazorpayDriver(BaseDriver, ABC):
                 "receipt":receipt
             })
             logger.info(refund)
+            previous_amount = refund_transaction.amount
             refund_transaction.refund_id = refund["id"]
             refund_transaction.api_response = refund
             refund_transaction.amount = refund["amount"] / 100
             refund_transaction.api_status = HTTPStatus.OK.value
             self.session.add(refund_transaction)
+            apply_refund_change(
+                self.session, refund_transaction, STATUS_PENDING, previous_amount
+            )
             self.session.commit()
             self.session.refresh(refund_transaction)
 
@@ -208,9 +223,13 @@ class RazorpayDriver(BaseDriver, ABC):
                 refund_transaction.api_status = HTTPStatus.BAD_GATEWAY.value
             elif isinstance(ex, ServerError):
                 refund_transaction.api_status = HTTPStatus.INTERNAL_SERVER_ERROR.value
+            previous_status = refund_transaction.status
             refund_transaction.status = STATUS_FAILED
             refund_transaction.api_response = str(ex)
             self.session.add(refund_transaction)
+            apply_refund_change(
+                self.session, refund_transaction, previous_status, refund_transaction.amount
+            )
             self.session.commit()
             raise ForbiddenException(message=f"{str(ex)}")
         except Exception as ex:
@@ -224,30 +243,32 @@ class RazorpayDriver(BaseDriver, ABC):
         raise NotImplementedError
 
     def retry_refund(self, refund_transaction: RefundTransaction):
+        """Issue a refund again from the request stored by refund_payment."""
+        api_request = refund_transaction.api_request
         try:
-            logger.info("xeon")
             resp = self.client.payment.refund(
-                refund_transaction.api_request["payment_id"],
-                amount=refund_transaction.api_request["amount"],
-                data=refund_transaction.api_request["data"],
+                api_request["payment_id"],
+                {
+                    "amount": api_request["amount"],
+                    "notes": api_request.get("notes"),
+                    "receipt": api_request.get("receipt"),
+                },
             )
             logger.info(resp)
+            previous_amount = refund_transaction.amount
             refund_transaction.api_response = resp
             refund_transaction.refund_id = resp["id"]
             refund_transaction.amount = resp["amount"] / 100
             self.session.add(refund_transaction)
+            apply_refund_change(
+                self.session, refund_transaction, refund_transaction.status, previous_amount
+            )
             self.session.commit()
             self.session.refresh(refund_transaction)
             return refund_transaction
 
         except Exception as ex:
             logger.error(f"Error while trying to redo refund: {ex}")
-            #raise HTTPException(
-            #    status_code=403,
-            #    detail=str(ex),
-            #)
-
-
 
     def get_payment_status(self, transaction, send_callback):
         order_id = transaction.gateway_order_id
@@ -286,6 +307,25 @@ class RazorpayDriver(BaseDriver, ABC):
                 )
 
 
+    def list_payments(self, from_timestamp: int, to_timestamp: int, skip: int, count: int) -> list:
+        resp = self.client.payment.all({
+            "from": from_timestamp,
+            "to": to_timestamp,
+            "skip": skip,
+            "count": count,
+        })
+        return resp["items"]
+
+    def list_settlement_items(self, day: datetime.date, skip: int, count: int) -> list:
+        resp = self.client.settlement.report({
+            "year": day.year,
+            "month": day.month,
+            "day": day.day,
+            "skip": skip,
+            "count": count,
+        })
+        return resp["items"]
+
     def process_callback(self, request: dict, callback_type: str):
         webhook_body = request["request_body"]
         webhook_signature = request["request_headers"]["x-razorpay-signature"]
@@ -313,7 +353,7 @@ class RazorpayDriver(BaseDriver, ABC):
             else:
                 transaction_callback = TransactionCallbacks(
                     transaction_id=transaction.id,
-                    callback=json.dumps(raw_request),
+                    callback=webhook_body,
                 )
                 self.session.add(transaction_callback)
                 self.session.commit()
@@ -344,7 +384,7 @@ class RazorpayDriver(BaseDriver, ABC):
                         )
 
                     case "refund.created" | "refund.processed" | "refund.failed":
-                        transaction = self.callback_event_handler.handle_refund_callback(
+                        transaction, refund_transaction = self.callback_event_handler.handle_refund_callback(
                             transaction_callback=transaction_callback, 
                             webhook_body=webhook_body
                         )
@@ -354,6 +394,7 @@ class RazorpayDriver(BaseDriver, ABC):
                             {
                                 "event": "refund",  # it was event in callback though
                                 "transaction": transaction,
+                                "refund": refund_transaction,
                                 "driver": "razorpay",
                             },
                         )
@@ -437,6 +478,14 @@ class RazorpayDriver(BaseDriver, ABC):
             if refund_transaction.status == STATUS_SUCCESS:
                 return refund_transaction
 
+        self.apply_refund_response(refund_transaction, data)
+        self.session.commit()
+        self.session.refresh(refund_transaction)
+        return refund_transaction
+
+    def apply_refund_response(self, refund_transaction, data) -> RefundTransaction:
+        previous_status = refund_transaction.status
+        previous_amount = refund_transaction.amount
         refund_transaction.refund_id = data["id"]
         refund_transaction.api_response = data
         refund_transaction.callback_response = data
@@ -448,15 +497,30 @@ class RazorpayDriver(BaseDriver, ABC):
 
         refund_transaction.amount = data["amount"] / 100
         self.session.add(refund_transaction)
-        self.session.commit()
-        self.session.refresh(refund_transaction)
+        apply_refund_change(
+            self.session, refund_transaction, previous_status, previous_amount
+        )
         return refund_transaction
 
+    def fetch_refund(self, refund: RefundTransaction, transaction: Transaction) -> Optional[dict]:
+        if refund.refund_id:
+            return self.client.refund.fetch(refund.refund_id)
+        # refund request never got a response, look it up by the id sent in its notes
+        payment_id = (refund.api_request or {}).get("payment_id") or transaction.gateway_payment_id
+        if not payment_id:
+            return None
+        resp = self.client.payment.fetch_multiple_refund(payment_id, {"count": 100})
+        for item in resp["items"]:
+            if (item.get("notes") or {}).get("refund_transaction_id") == refund.id:
+                return item
+        return None
+
     def _create_refund(self, transaction, param):
         refund_transaction = RefundTransaction(
             refund_id=param["id"], transaction_id=transaction.id, response=param
         )
         self.session.add(refund_transaction)
+        apply_refund_change(self.session, refund_transaction)
         self.session.commit()
         self.session.refresh(refund_transaction)
         return refund_transaction
@@ -550,7 +614,7 @@ class RazorpayDriver(BaseDriver, ABC):
             self.session.add(transaction)
             self.session.commit()
             self.session.refresh(transaction)
-            transaction_response = transaction.json()
+            transaction_response = model_to_dict(transaction)
 
             payment_link_payload = PaymentLink(
                 transaction_id=transaction.id,
@@ -562,7 +626,7 @@ class RazorpayDriver(BaseDriver, ABC):
             self.session.add(payment_link_payload)
             self.session.commit()
 
-            return json.loads(transaction_response)
+            return transaction_response
         except NotFoundException as ex:
             raise NotFoundException(message=f"Error while create payment link: {ex.message}")
         except Exception as ex:
@@ -723,8 +787,7 @@ class RazorpayDriver(BaseDriver, ABC):
             self.session.add(qr_code)
             self.session.commit()
             self.session.refresh(qr_code)
-            qr_code_res = qr_code.json()
-            return json.loads(qr_code_res)
+            return model_to_dict(qr_code)
         
         except Exception as ex:
             qr_code.api_request = qr_request
@@ -881,7 +944,9 @@ class RazorpayDriver(BaseDriver, ABC):
             raise ForbiddenException(message=f"Can not fetch transaction for payment_id: {payment_id}")
         order_id = order["order_id"]
         statement = select(Transaction).where(Transaction.gateway_order_id == order_id)
-        transaction = self.session.exec(statement).first()
+        transaction = self.session.exec(statement).first() or next(
+            iter(cold_archive.transactions_by("gateway_order_id", order_id)), None
+        )
         if not transaction:
             raise NotFoundException(message=f"Transaction does not exist for payment_id: {payment_id}")
-        return transaction.json()
+        return transaction
@@ -1,13 +1,14 @@
 """Module for handling callbacks"""
-import json as json_lib
 import requests
 from loguru import logger
-from sqlmodel import col, select
+from sqlmodel import select
+from payment_app.lib.serializer import dumps, model_to_dict
 from payment_app.models import Client
 from payment_app.models.refund_transactions import RefundTransaction
 from payment_app.models.transaction import Transaction
 from payment_app.models.transaction_communication import TransactionCommunications
-from uplink import Consumer, headers, get, retry, returns, post, Body, response_handler, json
+from payment_app.services.refund_summary import find_refund_summary
+from uplink import Consumer, headers, get, retry, returns, post, Body, response_handler
 from uplink.retry.when import raises, status
 from uplink.retry.stop import after_attempt, after_delay
 from uplink.retry.backoff import jittered
@@ -27,33 +28,29 @@ class ClientCallbackHandler(Consumer):
         stop=after_attempt(max_attempts) | after_delay(10),
         backoff=jittered(multiplier=0.5)
         )
-    @json
     @post("")
     def send_acknowledgement(self, data: Body):
-        "Send Acknowledgement"
+        "Send Acknowledgement, data is the already encoded json body"
     
 
-# TODO add client to reduce db query maybe
 def client_callback_transaction_handler(session, data):
-    """Callback function handler"""
+    """Callback function handler, data may carry a preloaded "client"."""
     logger.info("started background task")
-    client: Client = data["transaction"].client
+    client: Client = data.pop("client", None) or data["transaction"].client
     transaction: Transaction = data["transaction"]
-    data["transaction"] = json_lib.loads(transaction.json())
+    data["transaction"] = model_to_dict(transaction)
     data["entity"] = ["transaction"]
     if data["event"] == "refund":
         logger.info("refund event")
-        statement = select(RefundTransaction).where(
-            col(RefundTransaction.refund_id) is not None).where(
-            RefundTransaction.transaction_id == transaction.id,
-        )
-        results = session.exec(statement)
-        refund_transaction: RefundTransaction = results.all()
-        refund_transactions = [
-            json_lib.loads(refund.json()) for refund in refund_transaction
-        ]
-        data["refunds"] = refund_transactions
-        data["entity"].append("refunds")
+        # summary is maintained on every refund state change, see services.refund_summary
+        refund_summary = find_refund_summary(session, transaction.id)
+        if refund_summary is not None:
+            data["refund_summary"] = model_to_dict(refund_summary)
+            data["entity"].append("refund_summary")
+        refund: RefundTransaction = data.get("refund")
+        if refund is not None:
+            data["refund"] = model_to_dict(refund)
+            data["entity"].append("refund")
     logger.info(f"client is {client.id}")
     logger.info(f"callback data is {data}")
 
@@ -79,7 +76,7 @@ def client_callback_transaction_handler(session, data):
         session.refresh(transaction_communication)
         
     client_ref = ClientCallbackHandler(base_url=client.callback_url)
-    result = client_ref.send_acknowledgement(data=data)
+    result = client_ref.send_acknowledgement(data=dumps(data))
 
     if not result.status_code in (200, 201):
         logger.info("transaction communication failed")
@@ -96,3 +93,24 @@ def client_callback_transaction_handler(session, data):
         session.commit()
         logger.info("transaction communication updated")
     logger.info("finished background task")
+
+
+def enqueue_client_callback(session, transaction_id: str, event: str = "transaction"):
+    """
+    Queue a client callback for the transaction communication cron instead of sending inline.
+    Caller commits.
+    """
+    statement = select(TransactionCommunications).where(
+        TransactionCommunications.transaction_id == transaction_id
+    ).where(TransactionCommunications.event == event)
+    transaction_communication = session.exec(statement).first()
+    if not transaction_communication:
+        transaction_communication = TransactionCommunications(
+            transaction_id=transaction_id,
+            communication_count=0,
+            event=event,
+            status="pending",
+        )
+    transaction_communication.status = "pending"
+    session.add(transaction_communication)
+    return transaction_communication
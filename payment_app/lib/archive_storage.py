@@ -0,0 +1,122 @@
+"""Module for the storages of archived rows, see services.archive and services.cold_archive."""
+import os
+import tempfile
+from typing import Iterable
+
+import boto3
+
+from payment_app.lib.errors.error_handler import InternalServerException
+from payment_app.settings import settings
+
+# archives are spooled in memory up to this size before the upload
+SPOOL_SIZE = 16 * 1024 * 1024
+
+
+class LocalStorage:
+    """Archives as files below directory, written to a hidden file and renamed once complete."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def write(self, key: str, chunks: Iterable[bytes]) -> int:
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}")
+        size = 0
+        with open(temporary, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+                size += len(chunk)
+        os.replace(temporary, path)
+        return size
+
+    def read(self, key: str) -> bytes:
+        with open(os.path.join(self.directory, key), "rb") as file:
+            return file.read()
+
+    def list(self, prefix: str) -> dict[str, int]:
+        """Size of every key below prefix, files still being written are left out."""
+        keys = {}
+        for root, _, filenames in os.walk(os.path.join(self.directory, prefix)):
+            for filename in filenames:
+                if not filename.startswith("."):
+                    path = os.path.join(root, filename)
+                    key = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                    keys[key] = os.path.getsize(path)
+        return keys
+
+    def delete(self, key: str):
+        os.remove(os.path.join(self.directory, key))
+
+
+class S3Storage:
+    """Archives as objects of an S3 compatible bucket, uploaded in parts by boto3."""
+
+    def __init__(self, bucket: str, endpoint_url: str = None):
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def write(self, key: str, chunks: Iterable[bytes]) -> int:
+        size = 0
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as file:
+            for chunk in chunks:
+                file.write(chunk)
+                size += len(chunk)
+            file.seek(0)
+            self.client.upload_fileobj(file, self.bucket, key)
+        return size
+
+    def read(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def list(self, prefix: str) -> dict[str, int]:
+        keys = {}
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{prefix}/"):
+            keys.update((item["Key"], item["Size"]) for item in page.get("Contents", ()))
+        return keys
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+class MemoryStorage:
+    """Archives kept in a dict, stand-in storage for tests."""
+
+    def __init__(self):
+        self.objects = {}
+
+    def write(self, key: str, chunks: Iterable[bytes]) -> int:
+        self.objects[key] = b"".join(chunks)
+        return len(self.objects[key])
+
+    def read(self, key: str) -> bytes:
+        return self.objects[key]
+
+    def list(self, prefix: str) -> dict[str, int]:
+        return {
+            key: len(value) for key, value in self.objects.items() if key.startswith(f"{prefix}/")
+        }
+
+    def delete(self, key: str):
+        del self.objects[key]
+
+
+def require_shared_storage(storage: str, allow_local: bool = settings.allow_local_storage):
+    """Refuse local storage unless allowed, its files would stay on a single replica."""
+    if storage == "local" and not allow_local:
+        raise InternalServerException(
+            message="local storage is not shared between replicas, "
+            "configure s3 storage or set allow_local_storage"
+        )
+
+
+def create_storage():
+    """Storage configured by settings.archive_storage."""
+    if settings.archive_storage == "local":
+        return LocalStorage(settings.archive_dir)
+    if settings.archive_storage == "s3":
+        if not settings.archive_bucket:
+            raise InternalServerException(message="archive_bucket is not set")
+        return S3Storage(settings.archive_bucket, settings.archive_endpoint_url)
+    raise InternalServerException(message=f"unknown archive storage {settings.archive_storage}")
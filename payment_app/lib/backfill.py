@@ -0,0 +1,142 @@
+"""Module for chunked, resumable data backfills."""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from loguru import logger
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from payment_app.configs.db import engine
+from payment_app.lib.checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+
+
+class Backfill:
+    """
+    Backfill definition.
+    Rows of model matching conditions() are read in chunks of (key, *columns) by keyset on key
+    and each chunk is handed to apply(), which writes its changes and returns the updated count.
+    Prefer one set-based UPDATE over the chunk ids in apply() when the change is expressible in SQL.
+    """
+
+    name: str
+    model = None
+    key = None
+    columns: tuple = ()
+    distinct: bool = False
+    chunk_size: int = 1000
+
+    def key_column(self):
+        return self.key if self.key is not None else self.model.id
+
+    def conditions(self) -> list:
+        """Where clauses selecting the rows to backfill."""
+        return []
+
+    def apply(self, session: Session, rows: list) -> int:
+        """Write the changes of one chunk without committing, return updated row count."""
+        raise NotImplementedError
+
+
+class BackfillRunner:
+    """
+    Run a backfill with parallel chunk workers, checkpoints and progress reporting.
+    In dry run every chunk is applied and rolled back, so counts are exact and nothing is kept.
+    """
+
+    def __init__(self, backfill: Backfill, workers: int = 4, dry_run: bool = False, resume: bool = True):
+        self.backfill = backfill
+        self.workers = workers
+        self.dry_run = dry_run
+        self.resume = resume and not dry_run
+        self.checkpoint_name = f"backfill:{backfill.name}"
+        self.stats = {"read": 0, "updated": 0}
+
+    def _statement(self, *columns):
+        statement = select(*columns)
+        for condition in self.backfill.conditions():
+            statement = statement.where(condition)
+        return statement
+
+    def count(self, session: Session, cursor: Optional[dict]) -> int:
+        """Rows left to read, used for the ETA."""
+        key = self.backfill.key_column()
+        subquery = self._statement(key)
+        if self.backfill.distinct:
+            subquery = subquery.distinct()
+        if cursor:
+            subquery = subquery.where(key > cursor["key"])
+        return session.exec(select(func.count()).select_from(subquery.subquery())).one()
+
+    def next_chunk(self, session: Session, cursor: Optional[dict]) -> list:
+        key = self.backfill.key_column()
+        statement = self._statement(key, *self.backfill.columns)
+        if self.backfill.distinct:
+            statement = statement.distinct()
+        if cursor:
+            statement = statement.where(key > cursor["key"])
+        # execute returns rows even for a single column, keys are rows[i][0]
+        return session.execute(statement.order_by(key).limit(self.backfill.chunk_size)).all()
+
+    def apply_chunk(self, rows: list) -> int:
+        """Apply one chunk in its own session and transaction."""
+        with Session(engine) as session:
+            updated = self.backfill.apply(session, rows)
+            if self.dry_run:
+                session.rollback()
+            else:
+                session.commit()
+            return updated
+
+    def run(self, deadline: Optional[float] = None) -> dict:
+        """Run the backfill until done or time.monotonic() passes deadline."""
+        started_at = time.monotonic()
+        with Session(engine) as session, ThreadPoolExecutor(self.workers) as executor:
+            cursor = load_checkpoint(session, self.checkpoint_name) if self.resume else None
+            total = self.count(session, cursor)
+            logger.info(f"backfill {self.backfill.name}: {total} rows to read, dry run {self.dry_run}")
+            while True:
+                # read up to one chunk per worker ahead, memory stays at workers * chunk_size rows
+                chunks = []
+                for _ in range(self.workers):
+                    rows = self.next_chunk(session, cursor)
+                    if not rows:
+                        break
+                    chunks.append(rows)
+                    cursor = {"key": rows[-1][0]}
+                if not chunks:
+                    if not self.dry_run:
+                        clear_checkpoint(session, self.checkpoint_name)
+                    break
+                self.stats["updated"] += sum(executor.map(self.apply_chunk, chunks))
+                self.stats["read"] += sum(len(rows) for rows in chunks)
+                if not self.dry_run:
+                    save_checkpoint(session, self.checkpoint_name, cursor)
+                self._report(started_at, total)
+                if deadline and time.monotonic() >= deadline:
+                    break
+        return self.stats
+
+    def _report(self, started_at: float, total: int):
+        elapsed = time.monotonic() - started_at
+        rate = self.stats["read"] / elapsed if elapsed else 0
+        eta = (total - self.stats["read"]) / rate if rate else 0
+        logger.info(
+            f"backfill {self.backfill.name}: {self.stats['read']}/{total} read, "
+            f"{self.stats['updated']} updated, {rate:.0f} rows/s, eta {eta:.0f}s"
+        )
+
+
+def run_backfill(backfill: Backfill, argv: Optional[list] = None) -> dict:
+    """Command line entry point of a backfill script."""
+    parser = argparse.ArgumentParser(description=backfill.__doc__)
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=backfill.chunk_size)
+    parser.add_argument("--no-resume", dest="resume", action="store_false")
+    args = parser.parse_args(argv)
+    backfill.chunk_size = args.chunk_size
+    return BackfillRunner(
+        backfill, workers=args.workers, dry_run=args.dry_run, resume=args.resume
+    ).run()
@@ -0,0 +1,32 @@
+"""Module to load and store batch job checkpoints."""
+from typing import Optional
+
+from sqlmodel import Session
+
+from payment_app.models.job_checkpoint import JobCheckpoint
+
+
+def load_checkpoint(session: Session, name: str) -> Optional[dict]:
+    """Return the saved cursor of a job or None."""
+    checkpoint = session.get(JobCheckpoint, name, populate_existing=True)
+    if checkpoint:
+        return checkpoint.cursor
+    return None
+
+
+def save_checkpoint(session: Session, name: str, cursor: dict):
+    """Store the cursor of a job and commit."""
+    checkpoint = session.get(JobCheckpoint, name)
+    if not checkpoint:
+        checkpoint = JobCheckpoint(name=name)
+    checkpoint.cursor = cursor
+    session.add(checkpoint)
+    session.commit()
+
+
+def clear_checkpoint(session: Session, name: str):
+    """Remove the cursor of a job so the next run starts from the beginning."""
+    checkpoint = session.get(JobCheckpoint, name)
+    if checkpoint:
+        session.delete(checkpoint)
+        session.commit()
@@ -0,0 +1,55 @@
+"""Module for sparse fieldsets (fields=) and expandable heavy columns (expand=) of read apis."""
+from typing import Optional
+
+from sqlalchemy.orm import defer, load_only, undefer, undefer_group
+from sqlmodel import SQLModel
+
+from payment_app.lib.errors.error_handler import UnprocessableEntity
+from payment_app.lib.serializer import model_to_dict
+from payment_app.models.types import PAYLOAD_GROUP
+
+# JSON columns left out of list responses unless expanded or asked for in fields
+HEAVY_COLUMNS = {
+    "transactions": ("api_request", "api_response", "callback_response", "additional_info"),
+    "refund_transactions": ("api_request", "api_response", "callback_response", "additional_info"),
+    "qr_codes": ("api_request", "api_response", "notes"),
+}
+# always loaded, needed for cursors
+KEY_COLUMNS = ("id", "created_at", "updated_at")
+
+
+def parse_names(model, value: Optional[str]) -> Optional[set]:
+    """Split a comma separated field list and check the names exist on model."""
+    if not value:
+        return None
+    names = {name.strip() for name in value.split(",") if name.strip()}
+    unknown = names - set(model.__fields__)
+    if unknown:
+        raise UnprocessableEntity(message=f"unknown fields: {', '.join(sorted(unknown))}")
+    return names
+
+
+def load_options(model, fields: Optional[set], expand: Optional[set], defer_heavy: bool = True) -> list:
+    """ORM options loading only the requested columns, heavy columns deferred unless requested."""
+    if fields:
+        return [load_only(*[getattr(model, name) for name in fields | set(KEY_COLUMNS)])]
+    if not defer_heavy:
+        # payload columns are deferred by the models
+        return [undefer_group(PAYLOAD_GROUP)]
+    expand = expand or set()
+    return [
+        undefer(getattr(model, name)) if name in expand else defer(getattr(model, name))
+        for name in HEAVY_COLUMNS.get(model.__tablename__, ())
+    ]
+
+
+def select_fields(rows: list, fields: Optional[set]) -> list:
+    """Rows limited to fields, deferred columns left unloaded are skipped."""
+    return [model_to_dict(row, fields, skip_unloaded=True) for row in rows]
+
+
+def fields_of(row: SQLModel, fields: Optional[set]):
+    """Single row limited to fields."""
+    if not fields:
+        return row
+    return model_to_dict(row, fields, skip_unloaded=True)
@@ -0,0 +1,74 @@
+"""Module for keyset (cursor) pagination of list endpoints."""
+import base64
+import datetime
+from typing import Final, Optional
+
+import orjson
+from sqlalchemy import and_, or_
+from sqlmodel import Session
+
+from payment_app.lib.errors.error_handler import UnprocessableEntity
+
+# orderings backed by (column, id) indexes, id breaks ties between equal timestamps
+ORDERINGS: Final = ("created_at", "-created_at", "updated_at", "-updated_at")
+
+
+def encode_cursor(ordering: str, value: datetime.datetime, last_id) -> str:
+    """Opaque cursor pointing after the row with (value, last_id)."""
+    payload = orjson.dumps({"o": ordering, "v": value.isoformat(), "id": last_id})
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor: str, ordering: str) -> tuple[datetime.datetime, object]:
+    """Return (value, last_id) of a cursor issued for the same ordering."""
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if payload["o"] != ordering:
+            raise ValueError("cursor was issued for another ordering")
+        return datetime.datetime.fromisoformat(payload["v"]), payload["id"]
+    except Exception as ex:
+        raise UnprocessableEntity(message=f"invalid cursor: {ex}")
+
+
+def paginate(
+    session: Session,
+    statement,
+    model,
+    ordering: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    page: Optional[int] = None,
+) -> tuple[list, Optional[str]]:
+    """
+    Return (rows, next_cursor) of one page of statement over model.
+    Pages are read by keyset after cursor, page is only an OFFSET fallback for old callers.
+    """
+    if ordering not in ORDERINGS:
+        raise UnprocessableEntity(message=f"ordering must be one of {', '.join(ORDERINGS)}")
+    descending = ordering.startswith("-")
+    column = getattr(model, ordering.lstrip("-"))
+    if cursor:
+        value, last_id = decode_cursor(cursor, ordering)
+        if descending:
+            statement = statement.where(
+                or_(column < value, and_(column == value, model.id < last_id))
+            )
+        else:
+            statement = statement.where(
+                or_(column > value, and_(column == value, model.id > last_id))
+            )
+    elif page and page > 1:
+        statement = statement.offset((page - 1) * limit)
+    if descending:
+        statement = statement.order_by(column.desc(), model.id.desc())
+    else:
+        statement = statement.order_by(column, model.id)
+    rows = session.exec(statement.limit(limit)).all()
+
+    next_cursor = None
+    if limit and len(rows) == limit:
+        last = rows[-1]
+        last_value = getattr(last, ordering.lstrip("-"))
+        if last_value is not None:
+            next_cursor = encode_cursor(ordering, last_value, last.id)
+    return rows, next_cursor
@@ -0,0 +1,51 @@
+"""Module with thread safe rate limiting helpers."""
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket allowing `rate` acquisitions per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self, tokens: float = 1):
+        """Block until `tokens` are available and take them."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RateLimiterRegistry:
+    """Lazily created token buckets keyed by gateway, client etc."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key) -> TokenBucket:
+        """Return the bucket for key."""
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(self.rate, self.capacity)
+            return self._buckets[key]
+
+    def acquire(self, key, tokens: float = 1):
+        """Block until the bucket for key allows `tokens`."""
+        self.get(key).acquire(tokens)
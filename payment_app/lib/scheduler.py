@@ -0,0 +1,164 @@
+"""Module for running periodic jobs inside the service, once across replicas."""
+import os
+import random
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+from loguru import logger
+from sqlalchemy import func, or_, text, update
+from sqlalchemy.dialects.mysql import insert
+from sqlmodel import Session, col
+
+from payment_app.configs.db import engine
+from payment_app.models.job_lease import JobLease
+from payment_app.settings import settings
+
+
+class Job:
+    """
+    Periodic job definition.
+    func is called with a time.monotonic() deadline after which it should stop.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[float], object],
+        interval: float,
+        jitter: float = 0,
+        max_runtime: Optional[float] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.max_runtime = max_runtime or interval
+
+    def next_run_delay(self) -> float:
+        """Seconds until the next run, jittered so replicas and jobs do not fire together."""
+        return self.interval + random.uniform(0, self.jitter)
+
+
+def seconds_from_now(seconds: float):
+    """Database time seconds from now, replicas with skewed clocks agree on leases."""
+    return func.timestampadd(text("SECOND"), int(seconds), func.now())
+
+
+class Scheduler:
+    """
+    Runs jobs on a background thread.
+    A job is claimed through a conditional update of its job_leases row, so only the
+    replica winning the update runs it and next_run_at is shared by all replicas.
+    Lease times are computed by the database, never by the local clock of a replica.
+    """
+
+    def __init__(self, jobs: list[Job], tick: float = settings.scheduler_tick):
+        self.jobs = jobs
+        self.tick = tick
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"[:64]
+        self.metrics = {
+            job.name: {"runs": 0, "failures": 0, "last_duration": None, "total_duration": 0.0}
+            for job in jobs
+        }
+        self._running: dict[str, threading.Thread] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _ensure_leases(self, session: Session):
+        """Create missing lease rows, existing rows are left untouched."""
+        statement = insert(JobLease.__table__).prefix_with("IGNORE")
+        session.execute(statement, [{"name": job.name} for job in self.jobs])
+        session.commit()
+
+    def claim(self, session: Session, job: Job) -> bool:
+        """Take the lease of a due job, True if this replica should run it."""
+        now = func.now()
+        statement = (
+            update(JobLease)
+            .where(JobLease.name == job.name)
+            .where(or_(col(JobLease.lease_until).is_(None), JobLease.lease_until < now))
+            .where(or_(col(JobLease.next_run_at).is_(None), JobLease.next_run_at <= now))
+            .values(
+                owner=self.owner,
+                lease_until=seconds_from_now(job.max_runtime + self.tick),
+            )
+        )
+        result = session.execute(statement)
+        session.commit()
+        return result.rowcount == 1
+
+    def release(self, session: Session, job: Job, duration: float, status: str):
+        """Give the lease back and schedule the next run."""
+        statement = (
+            update(JobLease)
+            .where(JobLease.name == job.name)
+            .where(JobLease.owner == self.owner)
+            .values(
+                lease_until=None,
+                next_run_at=seconds_from_now(job.next_run_delay()),
+                last_duration=duration,
+                last_status=status,
+            )
+        )
+        session.execute(statement)
+        session.commit()
+
+    def _record(self, job: Job, duration: float, status: str):
+        metrics = self.metrics[job.name]
+        metrics["runs"] += 1
+        metrics["last_duration"] = duration
+        metrics["total_duration"] += duration
+        if status != "success":
+            metrics["failures"] += 1
+        logger.info(f"job {job.name} {status} in {duration:.2f}s, metrics: {metrics}")
+
+    def _run_job(self, job: Job):
+        started_at = time.monotonic()
+        status = "success"
+        try:
+            job.func(started_at + job.max_runtime)
+        except Exception as ex:
+            status = "failed"
+            logger.error(f"job {job.name} failed: {ex}")
+        duration = time.monotonic() - started_at
+        self._record(job, duration, status)
+        try:
+            with Session(engine) as session:
+                self.release(session, job, duration, status)
+        except Exception as ex:
+            logger.error(f"Error while releasing job {job.name}: {ex}")
+
+    def _loop(self):
+        try:
+            with Session(engine) as session:
+                self._ensure_leases(session)
+        except Exception as ex:
+            logger.error(f"Error while creating job leases: {ex}")
+        while not self._stop.wait(self.tick):
+            for job in self.jobs:
+                running = self._running.get(job.name)
+                if running and running.is_alive():
+                    continue
+                try:
+                    with Session(engine) as session:
+                        claimed = self.claim(session, job)
+                except Exception as ex:
+                    logger.error(f"Error while claiming job {job.name}: {ex}")
+                    continue
+                if claimed:
+                    thread = threading.Thread(
+                        target=self._run_job, args=(job,), name=f"job-{job.name}", daemon=True
+                    )
+                    self._running[job.name] = thread
+                    thread.start()
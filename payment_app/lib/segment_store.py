@@ -0,0 +1,323 @@
+"""
+Module for immutable segment files of compressed records with memory-mapped key indexes.
+
+A segment <name> is a data file <name>.data of zlib compressed records and one index file
+<name>.<index>.idx per indexed key. An index file holds the sorted keys as fixed width bytes
+followed by the (offset, length) of their records, both memory mapped so a lookup is a binary
+search touching a few pages. Files are written hidden and renamed once complete.
+
+Segments are published to an archive storage (lib.archive_storage) below a prefix, the data
+file last and every file read back before the next one, so a listing only shows whole
+segments. SegmentStore lists the storage at most every refresh seconds and reads from local
+copies in a cache directory, segments never change so a cached copy never goes stale.
+Segments of about the same size are merged (merge_segments) to keep their number, and with
+it the cost of a lookup missing every segment, growing with the log of the archive size.
+"""
+import hashlib
+import mmap
+import os
+import threading
+import time
+import zlib
+from collections import defaultdict
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+from loguru import logger
+
+from payment_app.lib.errors.error_handler import InternalServerException
+
+# keys longer than this are truncated in the index, callers check the keys of found records
+KEY_WIDTH = 104
+POSITION_DTYPE = np.dtype([("offset", "<u8"), ("length", "<u4")])
+COMPRESS_LEVEL = 6
+READ_SIZE = 1024 * 1024
+
+
+def index_key(value) -> bytes:
+    return str(value).encode()[:KEY_WIDTH]
+
+
+def segment_filenames(directory: str, name: str) -> list[str]:
+    """Files of a segment in directory, the data file last."""
+    indexes = sorted(
+        filename
+        for filename in os.listdir(directory)
+        if filename.startswith(f"{name}.") and filename.endswith(".idx")
+    )
+    return [*indexes, f"{name}.data"]
+
+
+def write_index(path: str, keys: np.ndarray, positions: np.ndarray):
+    """Write an index of sorted keys to a hidden file and rename it into place."""
+    temporary = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}")
+    with open(temporary, "wb") as file:
+        file.write(keys.tobytes())
+        file.write(positions.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def _file_chunks(path: str, digest) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        while chunk := file.read(READ_SIZE):
+            digest.update(chunk)
+            yield chunk
+
+
+class SegmentWriter:
+    """Write one segment, records are added in any order and indexed under their keys."""
+
+    def __init__(self, directory: str, name: str, index_names: Iterable[str]):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name = name
+        self.entries = {index_name: [] for index_name in index_names}
+        self.file = open(self._temporary(f"{name}.data"), "wb")
+        self.offset = 0
+        self.records = 0
+
+    def _temporary(self, filename: str) -> str:
+        return os.path.join(self.directory, f".{filename}")
+
+    def add(self, record: bytes, keys: dict):
+        """Append a record, keys maps index names to the key values of the record."""
+        data = zlib.compress(record, COMPRESS_LEVEL)
+        self.file.write(data)
+        for index_name, values in keys.items():
+            for value in values:
+                if value is not None:
+                    self.entries[index_name].append((index_key(value), self.offset, len(data)))
+        self.offset += len(data)
+        self.records += 1
+
+    def close(self) -> int:
+        """Write the indexes and publish the segment, return the number of records."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        for index_name, entries in self.entries.items():
+            entries.sort(key=lambda entry: entry[0])
+            keys = np.array([entry[0] for entry in entries], dtype=f"S{KEY_WIDTH}")
+            positions = np.array([entry[1:] for entry in entries], dtype=POSITION_DTYPE)
+            path = os.path.join(self.directory, f"{self.name}.{index_name}.idx")
+            write_index(path, keys, positions)
+        os.replace(
+            self._temporary(f"{self.name}.data"), os.path.join(self.directory, f"{self.name}.data")
+        )
+        return self.records
+
+    def abort(self):
+        """Drop a segment that will not be published."""
+        self.file.close()
+        os.remove(self._temporary(f"{self.name}.data"))
+
+
+def publish_segment(storage, prefix: str, directory: str, name: str):
+    """Upload a written segment, every file is read back and compared before the next."""
+    for filename in segment_filenames(directory, name):
+        key = f"{prefix}/{filename}"
+        digest = hashlib.sha256()
+        storage.write(key, _file_chunks(os.path.join(directory, filename), digest))
+        if hashlib.sha256(storage.read(key)).digest() != digest.digest():
+            raise InternalServerException(message=f"segment file {key} differs after upload")
+
+
+def download_segment(storage, prefix: str, directory: str, filenames: Iterable[str]):
+    """Copy the files of a published segment to directory, the data file last."""
+    os.makedirs(directory, exist_ok=True)
+    for filename in sorted(filenames, key=lambda filename: filename.endswith(".data")):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            continue
+        # processes may share the directory
+        temporary = os.path.join(directory, f".{filename}.{os.getpid()}")
+        with open(temporary, "wb") as file:
+            file.write(storage.read(f"{prefix}/{filename}"))
+        os.replace(temporary, path)
+
+
+def unpublish_segments(storage, prefix: str, names: Iterable[str]):
+    """Delete published segments, data files first so listings stop showing them at once."""
+    names = set(names)
+    keys = [key for key in storage.list(prefix) if segment_name(prefix, key) in names]
+    for key in sorted(keys, key=lambda key: not key.endswith(".data")):
+        storage.delete(key)
+
+
+def segment_name(prefix: str, key: str) -> str:
+    return key[len(prefix) + 1:].split(".", 1)[0]
+
+
+def published_segments(storage, prefix: str) -> dict[str, list[str]]:
+    """Files of every whole segment published below prefix by segment name."""
+    files = defaultdict(list)
+    for key in storage.list(prefix):
+        files[segment_name(prefix, key)].append(key[len(prefix) + 1:])
+    return {name: filenames for name, filenames in files.items() if f"{name}.data" in filenames}
+
+
+def remove_segment(directory: str, name: str):
+    """Remove the local files of a segment."""
+    for filename in segment_filenames(directory, name):
+        os.remove(os.path.join(directory, filename))
+
+
+class Segment:
+    """Read access to a segment of a local directory, its indexes are mapped when opened."""
+
+    def __init__(self, directory: str, name: str):
+        self.directory = directory
+        self.name = name
+        self.fd = os.open(os.path.join(directory, f"{name}.data"), os.O_RDONLY)
+        self.size = os.fstat(self.fd).st_size
+        self.maps = []
+        self.indexes = {}
+        for filename in segment_filenames(directory, name)[:-1]:
+            index_name = filename[len(name) + 1:-len(".idx")]
+            self.indexes[index_name] = self._map(os.path.join(directory, filename))
+        # lookups in progress, a segment removed from the store is closed once they are done
+        self.readers = 0
+        self.retired = False
+
+    def _map(self, path: str) -> tuple[np.ndarray, np.ndarray]:
+        count = os.path.getsize(path) // (KEY_WIDTH + POSITION_DTYPE.itemsize)
+        if not count:
+            return np.zeros(0, f"S{KEY_WIDTH}"), np.zeros(0, POSITION_DTYPE)
+        with open(path, "rb") as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.maps.append(buffer)
+        keys = np.frombuffer(buffer, dtype=f"S{KEY_WIDTH}", count=count)
+        positions = np.frombuffer(
+            buffer, dtype=POSITION_DTYPE, count=count, offset=count * KEY_WIDTH
+        )
+        return keys, positions
+
+    def find(self, index_name: str, value) -> list[bytes]:
+        """Records indexed under value, a truncated key may return extra records."""
+        keys, positions = self.indexes[index_name]
+        key = index_key(value)
+        start = np.searchsorted(keys, key, side="left")
+        end = np.searchsorted(keys, key, side="right")
+        return [
+            zlib.decompress(os.pread(self.fd, int(length), int(offset)))
+            for offset, length in positions[start:end].tolist()
+        ]
+
+    def close(self):
+        os.close(self.fd)
+        # the arrays hold the buffers, they are dropped before the maps are closed
+        self.indexes = {}
+        for buffer in self.maps:
+            buffer.close()
+        self.maps = []
+
+
+def merge_segments(segments: list[Segment], directory: str, name: str) -> int:
+    """
+    Write the records of segments as one segment to directory, return its data size. The
+    compressed records are copied as they are and the indexes merged with moved offsets.
+    """
+    os.makedirs(directory, exist_ok=True)
+    temporary = os.path.join(directory, f".{name}.data")
+    bases = []
+    with open(temporary, "wb") as file:
+        for segment in segments:
+            bases.append(file.tell())
+            offset = 0
+            while offset < segment.size:
+                chunk = os.pread(segment.fd, min(READ_SIZE, segment.size - offset), offset)
+                file.write(chunk)
+                offset += len(chunk)
+        size = file.tell()
+        file.flush()
+        os.fsync(file.fileno())
+    for index_name in segments[0].indexes:
+        keys = np.concatenate([segment.indexes[index_name][0] for segment in segments])
+        positions = np.concatenate([
+            _moved(segment.indexes[index_name][1], base) for segment, base in zip(segments, bases)
+        ])
+        order = np.argsort(keys, kind="stable")
+        path = os.path.join(directory, f"{name}.{index_name}.idx")
+        write_index(path, keys[order], positions[order])
+    os.replace(temporary, os.path.join(directory, f"{name}.data"))
+    return size
+
+
+def _moved(positions: np.ndarray, base: int) -> np.ndarray:
+    moved = positions.copy()
+    moved["offset"] += base
+    return moved
+
+
+class SegmentStore:
+    """
+    The segments published below prefix of storage, read from local copies in directory. The
+    listing is refreshed at most every refresh seconds, so a published segment is visible to
+    every store once refresh seconds have passed.
+    """
+
+    def __init__(self, storage, prefix: str, directory: str, refresh: float = 60):
+        self.storage = storage
+        self.prefix = prefix
+        self.directory = directory
+        self.refresh = refresh
+        self.segments: dict[str, Segment] = {}
+        self.listed_at: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def _list(self):
+        """Open new segments and retire removed ones, the caller holds the lock."""
+        listed_at = time.monotonic()
+        files = published_segments(self.storage, self.prefix)
+        names = set(files)
+        for name in set(self.segments) - names:
+            self._retire(self.segments.pop(name))
+        for name in sorted(names - set(self.segments)):
+            try:
+                download_segment(self.storage, self.prefix, self.directory, files[name])
+            except Exception as ex:
+                # removed by a merge since the listing, list again on the next lookup
+                logger.warning(f"Error while downloading segment {name}: {ex}")
+                listed_at = None
+                continue
+            self.segments[name] = Segment(self.directory, name)
+        self.listed_at = listed_at
+
+    def _retire(self, segment: Segment):
+        segment.retired = True
+        if not segment.readers:
+            self._close(segment)
+
+    def _close(self, segment: Segment):
+        segment.close()
+        remove_segment(self.directory, segment.name)
+
+    def acquire(self) -> list[Segment]:
+        """Current segments newest first, each held open until release()."""
+        with self.lock:
+            if self.listed_at is None or time.monotonic() - self.listed_at >= self.refresh:
+                self._list()
+            segments = [self.segments[name] for name in sorted(self.segments, reverse=True)]
+            for segment in segments:
+                segment.readers += 1
+            return segments
+
+    def release(self, segments: list[Segment]):
+        with self.lock:
+            for segment in segments:
+                segment.readers -= 1
+                if segment.retired and not segment.readers:
+                    self._close(segment)
+
+    def find(self, index_name: str, value) -> list[bytes]:
+        """Records indexed under value in every segment, newest segment first."""
+        segments = self.acquire()
+        try:
+            records = []
+            for segment in segments:
+                records.extend(segment.find(index_name, value))
+            return records
+        finally:
+            self.release(segments)
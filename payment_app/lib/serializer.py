@@ -0,0 +1,52 @@
+"""Module for fast json serialization of models and responses."""
+from typing import Any, Iterable, Optional
+
+import orjson
+from sqlalchemy import inspect
+from sqlmodel import SQLModel
+from starlette.responses import JSONResponse
+
+from payment_app.utils import custom_json_serializer
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def model_to_dict(
+    model: SQLModel, fields: Optional[Iterable[str]] = None, skip_unloaded: bool = False
+) -> dict:
+    """
+    Return model fields (or the given subset) as dict without the model.json() round trip.
+    Deferred columns that were never loaded are loaded on access (payload columns in one
+    query), with skip_unloaded or on detached rows they are left out instead.
+    """
+    names = model.__fields__ if fields is None else fields
+    state = inspect(model, raiseerr=False)
+    if state is not None and state.has_identity and (skip_unloaded or state.detached):
+        skipped = state.unloaded - state.expired_attributes
+        if skipped:
+            return {name: getattr(model, name) for name in names if name not in skipped}
+    return {name: getattr(model, name) for name in names}
+
+
+def _default(value: Any):
+    """Encode types orjson does not support natively."""
+    if isinstance(value, SQLModel):
+        return model_to_dict(value)
+    return custom_json_serializer(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content (models, Decimal, datetime, JSON columns) straight to bytes."""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def loads(content: bytes | str) -> Any:
+    """Decode json bytes or str."""
+    return orjson.loads(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """Json response rendered with orjson, accepts models anywhere in content."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
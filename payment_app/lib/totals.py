@@ -0,0 +1,56 @@
+"""Module for cached and estimated totals of list endpoints."""
+import threading
+import time
+from typing import Final, Optional
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from payment_app.settings import settings
+
+MAX_ENTRIES: Final = 1024
+
+_cache: dict = {}
+_lock = threading.Lock()
+
+
+def _estimate(session: Session, table: str) -> Optional[int]:
+    """Row count estimate from InnoDB table statistics."""
+    statement = text(
+        "SELECT TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+    )
+    return session.execute(statement, {"table": table}).scalar()
+
+
+def _store(key: tuple, total: int, exact: bool, now: float):
+    with _lock:
+        if len(_cache) >= MAX_ENTRIES:
+            for expired in [name for name, entry in _cache.items() if entry[2] <= now]:
+                del _cache[expired]
+            if len(_cache) >= MAX_ENTRIES:
+                _cache.clear()
+        _cache[key] = (total, exact, now + settings.total_cache_ttl)
+
+
+def count_total(session: Session, query, key: tuple, estimate_table: Optional[str] = None) -> tuple[int, bool]:
+    """
+    Return (total, exact) of query, cached for total_cache_ttl seconds under key.
+    With estimate_table (unfiltered lists only) tables above total_estimate_threshold rows
+    report the table statistics estimate instead of counting.
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(key)
+    if cached and cached[2] > now:
+        return cached[0], cached[1]
+
+    total, exact = None, True
+    if estimate_table:
+        estimate = _estimate(session, estimate_table)
+        if estimate is not None and estimate >= settings.total_estimate_threshold:
+            total, exact = int(estimate), False
+    if total is None:
+        total = query.count()
+    _store(key, total, exact, now)
+    return total, exact
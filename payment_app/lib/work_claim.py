@@ -0,0 +1,91 @@
+"""Module to claim batches of rows for one background worker across instances."""
+import os
+import socket
+import threading
+from typing import Iterable
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.mysql import insert
+from sqlmodel import Session, SQLModel, col, select
+
+from payment_app.lib.scheduler import seconds_from_now
+from payment_app.models.work_claim import WorkClaim
+from payment_app.settings import settings
+
+
+def default_owner() -> str:
+    """Claim owner of the current process and thread."""
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:64]
+
+
+def claim_batch(
+    session: Session,
+    entity: str,
+    statement,
+    model,
+    owner: str,
+    ttl: float = settings.claim_ttl,
+) -> list:
+    """
+    Run a candidate select over model and claim the returned rows for owner, then commit.
+    Candidates locked by a concurrent claimer are skipped (FOR UPDATE SKIP LOCKED)
+    and rows with an unexpired claim are excluded, so every row is handed to one worker.
+    The claim expires after ttl seconds if the worker dies before releasing it, claims are
+    timed by the database clock so replicas with skewed clocks agree on them.
+    """
+    active_claims = (
+        select(WorkClaim.entity_id)
+        .where(WorkClaim.entity == entity)
+        .where(WorkClaim.claimed_until > func.now())
+    )
+    statement = statement.where(col(model.id).not_in(active_claims)).with_for_update(
+        skip_locked=True, of=model
+    )
+    rows = session.exec(statement).all()
+    if not rows:
+        session.commit()
+        return rows
+    claimed_until = seconds_from_now(ttl)
+    upsert = insert(WorkClaim.__table__).values(
+        [
+            {"entity": entity, "entity_id": _row_id(row), "owner": owner, "claimed_until": claimed_until}
+            for row in rows
+        ]
+    )
+    session.execute(
+        upsert.on_duplicate_key_update(
+            owner=upsert.inserted.owner, claimed_until=upsert.inserted.claimed_until
+        )
+    )
+    # keep the claimed rows loaded instead of reloading each one on first access
+    expire_on_commit = session.expire_on_commit
+    session.expire_on_commit = False
+    try:
+        session.commit()
+    finally:
+        session.expire_on_commit = expire_on_commit
+    return rows
+
+
+def release_claims(session: Session, entity: str, entity_ids: Iterable[str], owner: str):
+    """Remove the claims of owner on the given rows and commit."""
+    entity_ids = list(entity_ids)
+    if not entity_ids:
+        return
+    session.execute(
+        delete(WorkClaim)
+        .where(WorkClaim.entity == entity)
+        .where(col(WorkClaim.entity_id).in_(entity_ids))
+        .where(WorkClaim.owner == owner)
+    )
+    session.commit()
+
+
+def _row_id(row) -> str:
+    """Id of a claimed row, a model or a row whose first column is the model or its id."""
+    if isinstance(row, SQLModel):
+        return row.id
+    first = row[0]
+    if isinstance(first, SQLModel):
+        return first.id
+    return first
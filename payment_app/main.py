@@ -21,6 +21,7 @@ from payment_app.admin_apis.apis_v1 import router_v1 as router_v1_admin
 from payment_app.utils import parse_body
 
 from payment_app.lib.errors import CustomException
+from payment_app.settings import settings
 
 app = FastAPI()
 
@@ -87,6 +88,23 @@ app.include_router(router_dispute_document_v1)
 init_listeners(app_=app)
 
 
+@app.on_event("startup")
+def start_scheduler():
+    """Start the embedded job scheduler."""
+    if settings.scheduler_enabled:
+        from payment_app.services.scheduled_jobs import create_scheduler
+        app.state.scheduler = create_scheduler()
+        app.state.scheduler.start()
+
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    """Stop the embedded job scheduler."""
+    scheduler = getattr(app.state, "scheduler", None)
+    if scheduler:
+        scheduler.stop()
+
+
 @app.get("/ping")
 async def pong():
     """Get api for initial testing."""
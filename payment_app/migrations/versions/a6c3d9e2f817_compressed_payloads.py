@@ -0,0 +1,49 @@
+"""compressed payloads
+
+Revision ID: a6c3d9e2f817
+Revises: f5a2c8d3e716
+Create Date: 2026-10-19 21:02:18.530417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c3d9e2f817'
+down_revision = 'f5a2c8d3e716'
+branch_labels = None
+depends_on = None
+
+PAYLOAD_COLUMNS = {
+    'transactions': ('api_request', 'api_response', 'callback_response'),
+    'refund_transactions': ('api_request', 'api_response', 'callback_response'),
+    'qr_codes': ('api_request', 'api_response'),
+}
+
+
+def convert(table, column, column_type, expression):
+    """Rewrite column through a temporary column of column_type filled with expression."""
+    temporary = f'{column}_converted'
+    op.add_column(table, sa.Column(temporary, column_type, nullable=True))
+    op.execute(f'UPDATE {table} SET {temporary} = {expression.format(column=column)}')
+    op.drop_column(table, column)
+    op.alter_column(
+        table, temporary, new_column_name=column, existing_type=column_type, existing_nullable=True
+    )
+
+
+def upgrade():
+    for table, columns in PAYLOAD_COLUMNS.items():
+        for column in columns:
+            convert(table, column, mysql.LONGBLOB(), 'COMPRESS(CAST({column} AS CHAR))')
+
+
+def downgrade():
+    for table, columns in PAYLOAD_COLUMNS.items():
+        for column in columns:
+            convert(
+                table, column, sa.JSON(), 'CAST(CONVERT(UNCOMPRESS({column}) USING utf8mb4) AS JSON)'
+            )
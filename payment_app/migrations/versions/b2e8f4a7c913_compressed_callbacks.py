@@ -0,0 +1,59 @@
+"""compressed callbacks
+
+Revision ID: b2e8f4a7c913
+Revises: a6c3d9e2f817
+Create Date: 2026-10-19 21:48:05.116283
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e8f4a7c913'
+down_revision = 'a6c3d9e2f817'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('transaction_callbacks', sa.Column('callback_compressed', mysql.LONGBLOB(), nullable=True))
+    # format byte 0 then COMPRESS(), raw bodies stored as a json string are unwrapped
+    op.execute(
+        """
+        UPDATE transaction_callbacks
+        SET callback_compressed = CONCAT(X'00', COMPRESS(
+            IF(
+                JSON_TYPE(callback) = 'STRING' AND JSON_VALID(JSON_UNQUOTE(callback)),
+                JSON_UNQUOTE(callback),
+                CAST(callback AS CHAR)
+            )
+        ))
+        WHERE callback IS NOT NULL
+        """
+    )
+    op.drop_column('transaction_callbacks', 'callback')
+    op.alter_column(
+        'transaction_callbacks', 'callback_compressed', new_column_name='callback',
+        existing_type=mysql.LONGBLOB(), existing_nullable=True
+    )
+
+
+def downgrade():
+    # rows written with a dictionary can not be decompressed in SQL and are left NULL,
+    # export them first if they are needed
+    op.add_column('transaction_callbacks', sa.Column('callback_json', sa.JSON(), nullable=True))
+    op.execute(
+        """
+        UPDATE transaction_callbacks
+        SET callback_json = CAST(CONVERT(UNCOMPRESS(SUBSTRING(callback, 2)) USING utf8mb4) AS JSON)
+        WHERE ASCII(callback) = 0
+        """
+    )
+    op.drop_column('transaction_callbacks', 'callback')
+    op.alter_column(
+        'transaction_callbacks', 'callback_json', new_column_name='callback',
+        existing_type=sa.JSON(), existing_nullable=True
+    )
@@ -12,3 +12,8 @@ from payment_app.models.payment_analytic import *
 from payment_app.models.dispute import *
 from payment_app.models.access_points import *
 from payment_app.models.access_client_relation import *
+from payment_app.models.refund_summary import *
+from payment_app.models.job_checkpoint import *
+from payment_app.models.job_lease import *
+from payment_app.models.work_claim import *
+from payment_app.models.rollup import *
@@ -0,0 +1,30 @@
+"""
+Module for the zlib preset dictionaries of compressed columns.
+
+A dictionary version is never changed once released, rows written with it need it to be read.
+Train a new one with payment_app.scripts.train_dictionary and add it as the next version.
+"""
+
+DICTIONARIES = {
+    "callback": {
+        # razorpay payment, refund and qr code webhooks
+        1: (
+            b'"card""created""customer""processed""authorized""refund.failed""refund.created"'
+            b'"payment.failed""payment_failed""failed""arn":"refund.processed"'
+            b'"BAD_REQUEST_ERROR""payment.authorized""name":"type":"active""upi_qr""usage":'
+            b'"normal""refund""payment_authentication""refund":"qr_code":"refunded""receipt":'
+            b'"close_by":"batch_id":"closed_at":"single_use""image_url":"payment.captured"'
+            b'"payment_id":"customer_id":"fixed_amount":"close_reason":"upi""captured""INR"'
+            b'"id":"payment_amount":"speed_requested":"speed_processed":"order_payment_id":'
+            b'"vpa":"fee":"rrn":"tax":"refund_for_order_id":"bank":"event""card":'
+            b'"refund_transaction_id":"payments_count_received":"email":"event":"notes":'
+            b'"payments_amount_received":"status":"payment""wallet":"amount":"driver":'
+            b'"method":"entity":"contact":"payload":"payment":"card_id":"captured":"currency":'
+            b'"store_id":"contains":"order_id":"client_id":"source_id":"error_code":'
+            b'"error_step":"created_at":"store_type":"invoice_id":"account_id":"description":'
+            b'"pos_store_id""error_source":"payment_type":"error_reason":"acquirer_data":'
+            b'"international":"refund_status":"client_version":"transaction_id":'
+            b'"amount_refunded":"error_description":"store_order_payment""upi_transaction_id":'
+        ),
+    },
+}
@@ -1,5 +1,5 @@
 from typing import Optional, List
-from sqlmodel import Relationship, SQLModel, Field, TIMESTAMP
+from sqlmodel import Index, Relationship, SQLModel, Field, TIMESTAMP
 from sqlalchemy import Column, TEXT, JSON
 from datetime import datetime
 from payment_app.models.timestampsmixin import TimeStampMixin
@@ -28,6 +28,10 @@ class Dispute(DisputeBase, TimeStampMixin, table=True):
     __tablename__ = "disputes"
     id: int = Field(default=None, primary_key=True, nullable=False)
     dispute_evidence: Optional["DisputeEvidence"] = Relationship(back_populates="dispute")
+    __table_args__ = (
+        Index("dispute_created_index", "created_at", "id"),
+        Index("dispute_updated_index", "updated_at", "id"),
+    )
 
 
 class DisputeEvidenceBase(SQLModel):
@@ -0,0 +1,19 @@
+"""Module for payment entities."""
+from sqlalchemy import Column
+from sqlmodel import JSON, SQLModel, Field
+
+from payment_app.models.timestampsmixin import TimeStampMixin
+
+
+class JobCheckpointBase(SQLModel):
+    """
+    Job checkpoint base model.
+    Stores the last processed cursor of a batch job so the next run resumes from it.
+    """
+    cursor: dict = Field(sa_column=Column(JSON))
+
+
+class JobCheckpoint(JobCheckpointBase, TimeStampMixin, table=True):
+    """Job checkpoint entity."""
+    __tablename__ = "job_checkpoints"
+    name: str = Field(primary_key=True, nullable=False, max_length=64)
@@ -0,0 +1,26 @@
+"""Module for payment entities."""
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import SQLModel, Field
+
+from payment_app.models.timestampsmixin import TimeStampMixin
+
+
+class JobLeaseBase(SQLModel):
+    """
+    Job lease base model.
+    A scheduled job runs on the replica owning its lease until lease_until,
+    next_run_at is shared so the job runs once per interval across replicas.
+    """
+    owner: str = Field(nullable=True, max_length=64)
+    lease_until: Optional[datetime] = Field(nullable=True)
+    next_run_at: Optional[datetime] = Field(nullable=True)
+    last_duration: Optional[float] = Field(nullable=True)
+    last_status: str = Field(nullable=True, max_length=10)
+
+
+class JobLease(JobLeaseBase, TimeStampMixin, table=True):
+    """Job lease entity."""
+    __tablename__ = "job_leases"
+    name: str = Field(primary_key=True, nullable=False, max_length=64)
@@ -1,10 +1,14 @@
 """Module for payment entities."""
+from datetime import datetime
+
 import ulid
 from sqlalchemy import Column
 from sqlalchemy.dialects.mysql import LONGTEXT
-from sqlmodel import SQLModel, Field
+from sqlmodel import Field, Index, SQLModel
 from typing_extensions import Annotated
 
+from payment_app.models.timestampsmixin import TimeStampMixin
+
 class PaymentAnalyticBase(SQLModel):
     """Base model for payment analytics."""
     transaction_id: str = Field(max_length=64)
@@ -20,12 +24,18 @@ class PaymentAnalyticBase(SQLModel):
     issuer: str = Field(nullable=True, max_length=64)
     step: str = Field(nullable=True, max_length=64)
     reason: str = Field(nullable=True, sa_column=Column(LONGTEXT))
+    # creation time (UTC) of the payment at the gateway, rows may be written much later
+    payment_created_at: datetime = Field(nullable=True)
 
-class PaymentAnalytic(PaymentAnalyticBase, table=True):
+class PaymentAnalytic(PaymentAnalyticBase, TimeStampMixin, table=True):
     """Payment analytic entity."""
     __tablename__ = "payment_analytics"
     id: Annotated[
         str,
         Field(primary_key=True, nullable=False, default_factory=lambda: ulid.ulid()),
     ]
-    __table_args__ = ()
+    __table_args__ = (
+        Index("payment_analytic_transaction_index", "transaction_id"),
+        Index("payment_analytic_payment_created_index", "payment_created_at"),
+        Index("payment_analytic_updated_index", "updated_at", "id"),
+    )
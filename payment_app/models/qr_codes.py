@@ -3,10 +3,11 @@ from datetime import datetime
 import ulid
 from pydantic import condecimal
 from sqlalchemy import Column, SMALLINT
-from sqlmodel import JSON, SQLModel, Field, TIMESTAMP
+from sqlmodel import JSON, Index, SQLModel, Field, TIMESTAMP
 from typing_extensions import Annotated
 
 from payment_app.models.timestampsmixin import TimeStampMixin
+from payment_app.models.types import CompressedJSON, defer_payloads
 
 class QRCodeBase(SQLModel):
     qr_id: str = Field(max_length=65, nullable=True)
@@ -14,8 +15,8 @@ class QRCodeBase(SQLModel):
     type: str = Field(max_length=20, default="upi_qr")
     payment_amount: condecimal(decimal_places=2) = Field(default=0)
     is_fixed_amount: int= Field(sa_column=Column(SMALLINT))
-    api_request: dict = Field(sa_column=Column(JSON))
-    api_response: dict = Field(sa_column=Column(JSON))
+    api_request: dict = Field(sa_column=Column(CompressedJSON))
+    api_response: dict = Field(sa_column=Column(CompressedJSON))
     notes: dict = Field(sa_column=Column(JSON))
     image_url: str = Field(max_length=65, nullable=True)
     close_by: datetime = Field(sa_column=Column(TIMESTAMP), nullable=True)
@@ -23,6 +24,8 @@ class QRCodeBase(SQLModel):
     close_reason: str = Field(max_length=20, nullable=True)
     status: str = Field(max_length=10, default="active")
     driver: int = Field(nullable=True)
+    store_id: str = Field(max_length=64, nullable=True)
+    store_type: str = Field(max_length=20, nullable=True)
 
 class QRCode(QRCodeBase, TimeStampMixin, table=True):
     """QR code entity."""
@@ -31,3 +34,11 @@ class QRCode(QRCodeBase, TimeStampMixin, table=True):
         str,
         Field(primary_key=True, nullable=False, default_factory=lambda: ulid.ulid()),
     ]
+    __table_args__ = (
+        Index("qr_code_created_index", "created_at", "id"),
+        Index("qr_code_updated_index", "updated_at", "id"),
+        Index("qr_code_store_index", "store_id", "status"),
+    )
+
+
+defer_payloads(QRCode, "api_request", "api_response")
@@ -0,0 +1,29 @@
+"""Module for payment entities."""
+from typing import Final
+
+from pydantic import condecimal
+from sqlalchemy import Column
+from sqlmodel import JSON, SQLModel, Field
+
+from payment_app.models.timestampsmixin import TimeStampMixin
+
+LATEST_REFUNDS_LIMIT: Final = 5
+
+
+class RefundSummaryBase(SQLModel):
+    """
+    Refund summary base model.
+    Maintained incrementally whenever a refund of the transaction changes state.
+    """
+    refund_count: int = Field(default=0, nullable=False)
+    refunded_amount: condecimal(decimal_places=2) = Field(default=0)
+    pending_amount: condecimal(decimal_places=2) = Field(default=0)
+    latest_refunds: list = Field(sa_column=Column(JSON))
+
+
+class RefundSummary(RefundSummaryBase, TimeStampMixin, table=True):
+    """Refund summary entity, one row per transaction."""
+    __tablename__ = "refund_summaries"
+    transaction_id: str = Field(
+        primary_key=True, nullable=False, foreign_key="transactions.id"
+    )
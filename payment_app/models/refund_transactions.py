@@ -1,21 +1,22 @@
 """Module for payment entities."""
 from typing import Optional
 from pydantic import condecimal
-from sqlmodel import Relationship, SQLModel, Field, JSON
+from sqlmodel import Index, Relationship, SQLModel, Field, JSON
 from typing_extensions import Annotated
 import ulid
 from sqlalchemy import Column
 
 from payment_app.models import Transaction, TimeStampMixin
+from payment_app.models.types import CompressedJSON, defer_payloads
 
 class RefundTransactionBase(SQLModel):
     """Base model for refund transactions."""
     transaction_id: str = Field(default=None, foreign_key="transactions.id")
     refund_id: str = Field(nullable=True, max_length=100, index=True, sa_column=Column(unique=True))
-    api_request: dict = Field(sa_column=Column(JSON))
-    api_response: dict = Field(sa_column=Column(JSON))
+    api_request: dict = Field(sa_column=Column(CompressedJSON))
+    api_response: dict = Field(sa_column=Column(CompressedJSON))
     api_status: int = Field(nullable=True)
-    callback_response: dict = Field(sa_column=Column(JSON))
+    callback_response: dict = Field(sa_column=Column(CompressedJSON))
     status: str = Field(max_length=10, default="pending")
     amount: condecimal(decimal_places=2) = Field(default=0)
     additional_info: dict = Field(sa_column=Column(JSON))
@@ -31,3 +32,10 @@ class RefundTransaction(RefundTransactionBase, TimeStampMixin, table=True):
     transaction: Optional[Transaction] = Relationship(
         back_populates="refund_transaction"
     )
+    __table_args__ = (
+        Index("refund_transaction_created_index", "created_at", "id"),
+        Index("refund_transaction_updated_index", "updated_at", "id"),
+    )
+
+
+defer_payloads(RefundTransaction, "api_request", "api_response", "callback_response")
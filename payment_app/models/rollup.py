@@ -0,0 +1,148 @@
+"""Module for payment entities."""
+from datetime import date
+from typing import Final
+
+from pydantic import condecimal
+from sqlalchemy import event, func, inspect, literal, select
+from sqlalchemy.dialects.mysql import insert
+from sqlalchemy.orm import Session
+from sqlmodel import Field, Index, SQLModel
+
+from payment_app.models.refund_transactions import RefundTransaction
+from payment_app.models.timestampsmixin import TimeStampMixin
+from payment_app.models.transaction import Transaction
+
+TRANSACTION_DIMENSIONS: Final = ("day", "client_id", "store_id", "driver", "payment_type", "status")
+REFUND_DIMENSIONS: Final = ("day", "client_id", "store_id", "driver", "status")
+
+
+class TransactionRollupBase(SQLModel):
+    """
+    Transaction rollup base model.
+    Count and amount of the transactions created on day per dimensions and current status.
+    """
+    payment_count: int = Field(default=0, nullable=False)
+    amount: condecimal(max_digits=14, decimal_places=2) = Field(default=0, nullable=False)
+
+
+class TransactionRollup(TransactionRollupBase, TimeStampMixin, table=True):
+    """Transaction rollup entity."""
+    __tablename__ = "transaction_rollups"
+    day: date = Field(primary_key=True, nullable=False)
+    client_id: int = Field(primary_key=True, nullable=False)
+    store_id: str = Field(primary_key=True, nullable=False, max_length=64)
+    driver: int = Field(primary_key=True, nullable=False)
+    payment_type: str = Field(primary_key=True, nullable=False, max_length=20)
+    status: str = Field(primary_key=True, nullable=False, max_length=10)
+    __table_args__ = (
+        Index("transaction_rollup_client_index", "client_id", "day"),
+        Index("transaction_rollup_store_index", "store_id", "day"),
+    )
+
+
+class RefundRollupBase(SQLModel):
+    """
+    Refund rollup base model.
+    Count and amount of the refunds created on day per dimensions of their transaction and status.
+    """
+    refund_count: int = Field(default=0, nullable=False)
+    amount: condecimal(max_digits=14, decimal_places=2) = Field(default=0, nullable=False)
+
+
+class RefundRollup(RefundRollupBase, TimeStampMixin, table=True):
+    """Refund rollup entity."""
+    __tablename__ = "refund_rollups"
+    day: date = Field(primary_key=True, nullable=False)
+    client_id: int = Field(primary_key=True, nullable=False)
+    store_id: str = Field(primary_key=True, nullable=False, max_length=64)
+    driver: int = Field(primary_key=True, nullable=False)
+    status: str = Field(primary_key=True, nullable=False, max_length=10)
+    __table_args__ = (
+        Index("refund_rollup_client_index", "client_id", "day"),
+        Index("refund_rollup_store_index", "store_id", "day"),
+    )
+
+
+def transaction_rollup_rows(status=None, sign: int = 1):
+    """
+    Select rollup rows of transactions, the row status unless status is given.
+    Missing dimensions are stored as 0 or "" since they are part of the primary key.
+    """
+    return select(
+        func.date(Transaction.created_at),
+        func.coalesce(Transaction.client_id, 0),
+        func.coalesce(Transaction.store_id, ""),
+        func.coalesce(Transaction.driver, 0),
+        func.coalesce(Transaction.payment_type, ""),
+        Transaction.status if status is None else literal(status),
+        literal(sign),
+        Transaction.amount * sign,
+    )
+
+
+def refund_rollup_rows(status=None, sign: int = 1):
+    """Select rollup rows of refunds with the dimensions of their transaction."""
+    return select(
+        func.date(RefundTransaction.created_at),
+        func.coalesce(Transaction.client_id, 0),
+        func.coalesce(Transaction.store_id, ""),
+        func.coalesce(Transaction.driver, 0),
+        RefundTransaction.status if status is None else literal(status),
+        literal(sign),
+        RefundTransaction.amount * sign,
+    ).join(Transaction, Transaction.id == RefundTransaction.transaction_id)
+
+
+def add_to_rollup(model, rows, accumulate: bool = True):
+    """INSERT ... SELECT of rollup rows, added to existing groups unless accumulate is False."""
+    if model is TransactionRollup:
+        names, count_column = TRANSACTION_DIMENSIONS, "payment_count"
+    else:
+        names, count_column = REFUND_DIMENSIONS, "refund_count"
+    table = model.__table__
+    statement = insert(table).from_select([*names, count_column, "amount"], rows)
+    if accumulate:
+        updates = {
+            count_column: table.c[count_column] + statement.inserted[count_column],
+            "amount": table.c.amount + statement.inserted.amount,
+        }
+    else:
+        updates = {
+            count_column: statement.inserted[count_column],
+            "amount": statement.inserted.amount,
+        }
+    return statement.on_duplicate_key_update(updates)
+
+
+def _status_changes(session: Session, model) -> tuple[list, dict]:
+    """Return (new ids, {previous status: ids}) of the flushed rows of model."""
+    created = [row.id for row in session.new if isinstance(row, model)]
+    changed = {}
+    for row in session.dirty:
+        if not isinstance(row, model):
+            continue
+        history = inspect(row).attrs.status.history
+        if history.deleted and history.deleted[0] != row.status:
+            changed.setdefault(history.deleted[0], []).append(row.id)
+    return created, changed
+
+
+@event.listens_for(Session, "after_flush")
+def maintain_rollups(session: Session, flush_context):
+    """
+    Apply flushed transaction and refund status changes to the rollups in the same transaction.
+    A status change moves the row from its previous status group to the new one, deletes and
+    amount changes are not tracked, the rebuild job repairs anything missed.
+    """
+    for model, rollup, rows in (
+        (Transaction, TransactionRollup, transaction_rollup_rows),
+        (RefundTransaction, RefundRollup, refund_rollup_rows),
+    ):
+        created, changed = _status_changes(session, model)
+        ids = created + [row_id for row_ids in changed.values() for row_id in row_ids]
+        if ids:
+            session.connection().execute(add_to_rollup(rollup, rows().where(model.id.in_(ids))))
+        for status, row_ids in changed.items():
+            session.connection().execute(
+                add_to_rollup(rollup, rows(status=status, sign=-1).where(model.id.in_(row_ids)))
+            )
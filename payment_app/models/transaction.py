@@ -9,6 +9,7 @@ from typing_extensions import Annotated
 
 from payment_app.models.client import Client
 from payment_app.models.timestampsmixin import TimeStampMixin
+from payment_app.models.types import CompressedJSON, defer_payloads
 
 from payment_app.schemas.requests.v1.make_payment_in import StoreType
 
@@ -34,9 +35,9 @@ class TransactionBase(SQLModel):
     gateway_order_id: str = Field(nullable=True, max_length=100, index=True)
     gateway_payment_id: str = Field(nullable=True, max_length=100, index=True)
     status: str = Field(max_length=10, default="pending")  # pending failed sucess
-    api_request: dict = Field(sa_column=Column(JSON))
-    api_response: dict = Field(sa_column=Column(JSON))
-    callback_response: dict = Field(sa_column=Column(JSON))
+    api_request: dict = Field(sa_column=Column(CompressedJSON))
+    api_response: dict = Field(sa_column=Column(CompressedJSON))
+    callback_response: dict = Field(sa_column=Column(CompressedJSON))
     api_status: int = Field(sa_column=Column(SMALLINT))
     store_id: str = Field(max_length=64)
     client_id: int = Field(default=None, foreign_key="clients.id")
@@ -67,4 +68,18 @@ class Transaction(TransactionBase, TimeStampMixin, table=True):
             "store_id",
             "client_id",
         ),
+        Index(
+            "transaction_status_created_index",
+            "status",
+            "created_at",
+            "id",
+        ),
+        Index("transaction_created_index", "created_at", "id"),
+        Index("transaction_updated_index", "updated_at", "id"),
+        Index("transaction_order_created_index", "gateway_order_id", "created_at", "id"),
+        Index("transaction_store_search_index", "store_id", "status", "created_at", "id"),
+        Index("transaction_client_search_index", "client_id", "status", "created_at", "id"),
     )
+
+
+defer_payloads(Transaction, "api_request", "api_response", "callback_response")
@@ -1,8 +1,9 @@
 """Module for payment entities."""
 from typing import Final
 from sqlalchemy import Column
-from sqlmodel import JSON, SQLModel, Field
+from sqlmodel import Index, SQLModel, Field
 from payment_app.models.timestampsmixin import TimeStampMixin
+from payment_app.models.types import DictionaryCompressedJSON
 
 CALLBACK_ORDER: Final = "payment"
 CALLBACK_REFUND: Final = "refund"
@@ -14,7 +15,7 @@ class TransactionCallbacksBase(SQLModel):
     To store all callbacks to the payment gateway.
     """
     transaction_id: str = Field(nullable=True, foreign_key="transactions.id")
-    callback: dict = Field(sa_column=Column(JSON))
+    callback: dict = Field(sa_column=Column(DictionaryCompressedJSON("callback")))
     event: str = Field(nullable=True)
     type: str = Field(nullable=True, default=CALLBACK_ORDER)
 
@@ -25,3 +26,4 @@ class TransactionCallbacks(
     """Transaction call back entity."""
     __tablename__ = "transaction_callbacks"
     id: int = Field(default=None, primary_key=True, nullable=False)
+    __table_args__ = (Index("transaction_callback_created_index", "created_at"),)
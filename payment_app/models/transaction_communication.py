@@ -4,7 +4,7 @@ from typing import Optional
 
 import ulid
 from sqlalchemy import Column, TEXT
-from sqlmodel import SQLModel, Field, DateTime, Relationship
+from sqlmodel import SQLModel, Field, DateTime, Index, Relationship
 from typing_extensions import Annotated
 
 from payment_app.models.timestampsmixin import TimeStampMixin
@@ -35,3 +35,4 @@ class TransactionCommunications(
     transaction: Optional[Transaction] = Relationship(
         back_populates="transaction_communication"
     )
+    __table_args__ = (Index("transaction_communication_created_index", "created_at"),)
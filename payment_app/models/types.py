@@ -0,0 +1,157 @@
+"""Module for custom column types."""
+import datetime
+import re
+import struct
+import zlib
+from collections import Counter
+from decimal import Decimal
+from typing import Final, Iterable
+
+import orjson
+from sqlalchemy import LargeBinary, cast, func
+from sqlalchemy.dialects.mysql import CHAR, LONGBLOB
+from sqlalchemy.orm import deferred
+from sqlalchemy.types import TypeDecorator
+
+from payment_app.models.dictionaries import DICTIONARIES
+
+# deferred group of the gateway payload columns, loaded together on first access
+PAYLOAD_GROUP: Final = "payload"
+COMPRESS_LEVEL: Final = 6
+# format byte of dictionary compressed values holding the MySQL COMPRESS() format
+FORMAT_COMPRESS: Final = 0
+# zlib uses at most the last 32KB of a preset dictionary
+DICTIONARY_SIZE: Final = 32768
+# keys and string values of compact json
+FRAGMENT = re.compile(rb'"(?:[^"\\]|\\.)*":?')
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"Value {value!r} not serializable")
+
+
+def json_bytes(value) -> bytes:
+    return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def compress_json(value) -> bytes:
+    """Json of value in the MySQL COMPRESS() format, 4 byte length then a zlib stream."""
+    data = json_bytes(value)
+    return struct.pack("<I", len(data)) + zlib.compress(data, COMPRESS_LEVEL)
+
+
+def decompress_json(value: bytes):
+    if not value:
+        return None
+    return orjson.loads(zlib.decompress(value[4:]))
+
+
+class CompressedJSON(TypeDecorator):
+    """
+    JSON stored compressed in a blob, readable in SQL with UNCOMPRESS(), see payload_text().
+    Large gateway payloads shrink several times and leave the hot row.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(LONGBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_json(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_json(value)
+
+
+def payload_text(column):
+    """SQL expression of a CompressedJSON column as json text, for JSON_EXTRACT and friends."""
+    return cast(func.uncompress(column), CHAR(charset="utf8mb4"))
+
+
+def defer_payloads(model, *names: str):
+    """Load the payload columns of model only when first accessed, all in one query."""
+    for name in names:
+        model.__mapper__.add_property(
+            name, deferred(model.__table__.c[name], group=PAYLOAD_GROUP)
+        )
+
+
+def dictionary_compress(data: bytes, version: int, dictionary: bytes) -> bytes:
+    """Raw deflate of data with a preset dictionary, prefixed by the dictionary version."""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    return bytes([version]) + compressor.compress(data) + compressor.flush()
+
+
+def dictionary_decompress(value: bytes, dictionaries: dict) -> bytes:
+    """Inverse of dictionary_compress, version 0 is the MySQL COMPRESS() format."""
+    version = value[0]
+    if version == FORMAT_COMPRESS:
+        return zlib.decompress(value[5:])
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=dictionaries[version])
+    return decompressor.decompress(value[1:]) + decompressor.flush()
+
+
+def train_dictionary(samples: Iterable[bytes], size: int = DICTIONARY_SIZE) -> bytes:
+    """
+    Preset dictionary of the json fragments (keys and string values) saving the most bytes
+    over samples. Fragments are counted once per sample, the most valuable are placed last
+    since deflate reaches the end of the dictionary with the shortest distances.
+    """
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(FRAGMENT.findall(sample)))
+    ranked = sorted(
+        (fragment for fragment, count in counts.items() if count > 1),
+        key=lambda fragment: counts[fragment] * len(fragment),
+        reverse=True,
+    )
+    chosen, total = [], 0
+    for fragment in ranked:
+        if total + len(fragment) > size:
+            continue
+        chosen.append(fragment)
+        total += len(fragment)
+    return b"".join(reversed(chosen))
+
+
+class DictionaryCompressedJSON(TypeDecorator):
+    """
+    JSON compressed with a preset dictionary trained on typical payloads of the column, small
+    payloads of the same shape shrink several times more than compressed on their own.
+    The leading byte is the dictionary version, DICTIONARIES[name] holds every version in use
+    and new values are written with the latest. Version 0 is plain COMPRESS() of migrated rows.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "mysql":
+            return dialect.type_descriptor(LONGBLOB())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        dictionaries = DICTIONARIES[self.name]
+        version = max(dictionaries)
+        return dictionary_compress(json_bytes(value), version, dictionaries[version])
+
+    def process_result_value(self, value, dialect):
+        if not value:
+            return None
+        return orjson.loads(dictionary_decompress(value, DICTIONARIES[self.name]))
@@ -0,0 +1,23 @@
+"""Module for payment entities."""
+from datetime import datetime
+
+from sqlmodel import SQLModel, Field
+
+from payment_app.models.timestampsmixin import TimeStampMixin
+
+
+class WorkClaimBase(SQLModel):
+    """
+    Work claim base model.
+    A row claimed by a background worker is skipped by other workers until
+    claimed_until, claims are removed once the worker is done with the row.
+    """
+    owner: str = Field(nullable=False, max_length=64)
+    claimed_until: datetime = Field(nullable=False, index=True)
+
+
+class WorkClaim(WorkClaimBase, TimeStampMixin, table=True):
+    """Work claim entity."""
+    __tablename__ = "work_claims"
+    entity: str = Field(primary_key=True, nullable=False, max_length=32)
+    entity_id: str = Field(primary_key=True, nullable=False, max_length=64)
@@ -1,15 +1,14 @@
 """Module with payment apis."""
-import json
 from typing import Union
 
 from fastapi import APIRouter, BackgroundTasks, Body, Depends, HTTPException, Query
-from fastapi.responses import JSONResponse
 from sqlmodel import Session, select
 from pydantic import BaseModel
 from loguru import logger
 
 from payment_app.configs.db import get_session
 from payment_app.dependencies.verify_api_key import verify_api_key
+from payment_app.lib.serializer import FastJSONResponse
 from payment_app.lib.errors.error_handler import (
     UnprocessableEntity,NotFoundException,ForbiddenException
 )
@@ -20,6 +19,7 @@ from payment_app.schemas.requests.v1.make_payment_in import (
     MakePaymentInRazorpay, MakePaymentInPaytm
 )
 from payment_app.schemas.requests.v1.refund_payment_in import RefundPaymentIn
+from payment_app.services.cold_archive import cold_archive
 from payment_app.services.payment_service import PaymentService
 from payment_app.models.transaction import STATUS_PENDING
 
@@ -54,20 +54,23 @@ async def get_payment_status_by_order_id(
     )
     results = session.exec(statement).first()
     if results:
-        return JSONResponse(
+        return FastJSONResponse(
         content={
             "event": "transaction",
-            "transaction": json.loads(results.json()),
+            "transaction": results,
             "driver": "razorpay",
         }
     )
     statement = select(Transaction).where(Transaction.source_id == source_id)
-    results = session.exec(statement).first()
+    # archived transactions are all finalized
+    results = session.exec(statement).first() or next(
+        iter(cold_archive.transactions_by("source_id", source_id)), None
+    )
     if results:
-        return JSONResponse(
+        return FastJSONResponse(
             content={
                 "event": "transaction",
-                "transaction": json.loads(results.json()),
+                "transaction": results,
                 "driver": "razorpay",
             }
         )
@@ -134,7 +137,7 @@ async def make_payment(
     )
     logger.debug(f"result: {result}")
 
-    return JSONResponse(
+    return FastJSONResponse(
         content={
             "client_version": commons["client_version"],
             "response": result,
@@ -190,7 +193,7 @@ async def refund_payment(
         client=commons["client"],
     )
     logger.debug(f"result: {result}")
-    return JSONResponse(
+    return FastJSONResponse(
         content={
             "client_version": commons["client_version"],
             "response": result,
@@ -217,6 +220,10 @@ async def get_payment_status(
 
         transactions = session.exec(statement)
         transaction = transactions.first()
+        archived = False
+        if not transaction:
+            transaction = cold_archive.get_transaction(transaction_id)
+            archived = transaction is not None
 
         if not transaction:
             logger.critical(f"transaction not found: {transaction_id}")
@@ -224,12 +231,13 @@ async def get_payment_status(
 
         driver_id = transaction.driver
         data["driver"] = driver_id
-        if not recheck:
-            data["transaction"] = json.loads(transaction.json())
+        # archived transactions are final, nothing to recheck
+        if not recheck or archived:
+            data["transaction"] = transaction
         else:
             payment_service = PaymentService(session, background_tasks, driver_id)
             transaction = payment_service.get_payment_status(transaction, send_callback=False)
-            data["transaction"] = json.loads(transaction.json())
+            data["transaction"] = transaction
     elif entity == "refund":
         data["entity"] = ["refund"]
         data["event"] = "refund"
@@ -237,6 +245,10 @@ async def get_payment_status(
 
         refund_transactions = session.exec(statement)
         refund_transaction = refund_transactions.first()
+        archived = False
+        if not refund_transaction:
+            refund_transaction = cold_archive.get_refund("refund_id", transaction_id)
+            archived = refund_transaction is not None
 
         if not refund_transaction:
             logger.critical(f"Refund not found for transaction: {transaction_id}")
@@ -244,8 +256,8 @@ async def get_payment_status(
                 message=f"Refund not found for transaction {transaction_id}"
             )
 
-        if not recheck:
-            data["refund"] = json.loads(refund_transaction.json())
+        if not recheck or archived:
+            data["refund"] = refund_transaction
         else:
             payment_service = PaymentService(
                 session, background_tasks, refund_transaction.transaction.driver
@@ -253,8 +265,8 @@ async def get_payment_status(
             refund_transaction = payment_service.get_refund_status(
                 refund_transaction, send_callback=False
             )
-            data["refund"] = json.loads(refund_transaction.json())
-    return JSONResponse(data)
+            data["refund"] = refund_transaction
+    return FastJSONResponse(data)
 
 
 @router_v1.post("/retry_payment")
@@ -279,7 +291,7 @@ async def get_transaction_by_payment_id(
     try:
         payment_service = PaymentService(session, background_tasks, driver_id)
         transaction = payment_service.get_transaction_by_payment_id(payment_id=payment_id)
-        return JSONResponse(json.loads(transaction))
+        return FastJSONResponse(transaction)
     except Exception as ex:
         raise NotFoundException(message=f"{str(ex)}")
 
@@ -1,17 +1,18 @@
-import json
 from loguru import logger
 from fastapi import APIRouter, BackgroundTasks, Depends, Query
 from fastapi.responses import JSONResponse
 import datetime
 from payment_app.configs.db import get_session
 from sqlmodel import Session, select
-from sqlalchemy import desc
 
 from payment_app.dependencies.verify_api_key import verify_api_key
 
 from payment_app.lib.errors import NotFoundException, UnprocessableEntity
+from payment_app.lib.pagination import paginate
+from payment_app.lib.serializer import FastJSONResponse, model_to_dict
+from payment_app.lib.totals import count_total
 from payment_app.models import Dispute, DisputeEvidence, ClientGateway
-from typing import  Literal
+from typing import  Literal, Optional
 from payment_app.models.dispute import DisputDocuments
 
 from payment_app.services.payment_service import PaymentService
@@ -32,20 +33,23 @@ async def get_disputes(
     page: int = 0,
     limit: int = Query(default=10, lte=100),
     ordering: str = Query(default="-created_at"),
+    cursor: Optional[str] = None,
     session: Session = Depends(get_session),
     commons: dict = Depends(verify_api_key)
 ):
-    _number_of_disputes = session.query(Dispute).count()
-    if '-' == ordering[0]:
-        ordering = ordering[1:]
-        disputes = session.exec(select(Dispute).order_by(desc(ordering)).offset((page-1)*limit).limit(limit)).all()
-    else:
-        disputes = session.exec(select(Dispute).order_by(ordering).offset((page-1)*limit).limit(limit)).all()
+    disputes, next_cursor = paginate(
+        session, select(Dispute), Dispute, ordering, limit, cursor=cursor, page=page
+    )
+    total, total_exact = count_total(
+        session, session.query(Dispute), ("disputes",), estimate_table="disputes"
+    )
     results = {
-        "results": [json.loads(dispute.json()) for dispute in disputes],
-        "total": _number_of_disputes
+        "results": disputes,
+        "total": total,
+        "total_exact": total_exact,
+        "next_cursor": next_cursor,
     }
-    return JSONResponse(results)
+    return FastJSONResponse(results)
 
 @router_dispute_v1.get("/disputes/{dispute_id}")
 async def get_dispute(
@@ -60,7 +64,7 @@ async def get_dispute(
     if not dispute:
         raise NotFoundException(message="Dispute not found!")
     
-    results = json.loads(dispute.json())
+    results = model_to_dict(dispute)
     results["dispute_evidence"] = {}
     if dispute.dispute_evidence:
         results["dispute_evidence"]["amount"]= dispute.dispute_evidence.amount
@@ -99,12 +103,12 @@ async def get_dispute(
                 }
                 results["dispute_evidence"]["others"].append(doc)
     
-    return JSONResponse({"results": results})
+    return FastJSONResponse({"results": results})
 
 def get_document(document_id: str, session: Session):
     query = select(DisputDocuments).where(DisputDocuments.document_id == document_id)
     document = session.exec(query).first()
-    return json.loads(document.json())
+    return document
 
 @router_dispute_v1.post("/disputes/accept/{dispute_id}")
 async def accept_dispute(
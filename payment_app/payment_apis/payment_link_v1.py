@@ -13,6 +13,7 @@ from payment_app.schemas.requests.v1.create_payment_link_in import (
 )
 from payment_app.services.payment_service import PaymentService
 from payment_app.lib.errors import NotFoundException,UnprocessableEntity
+from payment_app.lib.serializer import FastJSONResponse
 
 router_payment_link_v1 = APIRouter(
     prefix="/v1",
@@ -69,7 +70,7 @@ async def create_payment_link(
         client_version=commons["client_version"],
     )
     logger.debug(f"result:  =====> {result}")
-    return JSONResponse(
+    return FastJSONResponse(
         content={
             "client_version": commons["client_version"],
             "response": result,
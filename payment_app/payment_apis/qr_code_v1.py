@@ -13,6 +13,7 @@ from payment_app.schemas.requests.v1.qr_code_in import QRCodeIn
 
 from payment_app.services.payment_service import PaymentService
 from payment_app.lib.errors import NotFoundException, UnprocessableEntity
+from payment_app.lib.serializer import FastJSONResponse
 
 router_qr_code_v1 = APIRouter(
     prefix="/v1",
@@ -65,7 +66,7 @@ async def create_qr_code(
         client=commons["client"],
         client_version=commons["client_version"]
     )
-    return JSONResponse(
+    return FastJSONResponse(
         content={
             "client_version": commons["client_version"],
             "response": result,
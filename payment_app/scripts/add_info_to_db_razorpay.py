@@ -1,28 +1,40 @@
 """Module to populate refund transaction details."""
-from sqlmodel import Session, select
+from sqlalchemy import func, or_, update
+from sqlmodel import col
+
+from payment_app.lib.backfill import Backfill, run_backfill
 from payment_app.models.refund_transactions import RefundTransaction
-from payment_app.configs.db import engine
-
-
-def populate_add_info():
-    """Method to populate notes in refund transactions."""
-    with Session(engine) as session:
-        statement = select(RefundTransaction).where(RefundTransaction.additional_info is None)
-        ref_transaction = session.exec(statement)
-        print(ref_transaction)
-        for ref in ref_transaction:
-            req = ref.request
-            print(req)
-            if req and "data" in req:
-                req_data = req["data"]
-                print(req_data)
-                if "notes" in req_data:
-                    notes = req_data["notes"]
-                    if notes:
-                        print(notes)
-                        ref.additional_info = notes
-                        session.add(ref)
-        session.commit()
-
-
-populate_add_info()
+from payment_app.models.types import payload_text
+
+REQUEST_NOTES = func.json_extract(payload_text(RefundTransaction.api_request), "$.data.notes")
+
+
+class PopulateAdditionalInfo(Backfill):
+    """Populate notes of refund requests in refund transactions."""
+    name = "add_info_to_db_razorpay"
+    model = RefundTransaction
+
+    def conditions(self):
+        return [
+            # None is stored as JSON null by the model, older rows have SQL NULL
+            or_(
+                col(RefundTransaction.additional_info).is_(None),
+                func.json_type(RefundTransaction.additional_info) == "NULL",
+            ),
+            func.json_type(REQUEST_NOTES) == "OBJECT",
+            func.json_length(REQUEST_NOTES) > 0,
+        ]
+
+    def apply(self, session, rows):
+        statement = (
+            update(RefundTransaction)
+            .where(col(RefundTransaction.id).in_([row[0] for row in rows]))
+            .where(*self.conditions())
+            .values(additional_info=REQUEST_NOTES)
+            .execution_options(synchronize_session=False)
+        )
+        return session.execute(statement).rowcount
+
+
+if __name__ == "__main__":
+    run_backfill(PopulateAdditionalInfo())
@@ -0,0 +1,30 @@
+"""
+Module to train a zlib preset dictionary from recent transaction callbacks.
+
+usage: python -m payment_app.scripts.train_dictionary --samples 5000 > dictionary.txt
+The printed bytes literal is added to payment_app.models.dictionaries as the next version.
+"""
+import argparse
+
+from sqlmodel import Session, select
+
+from payment_app.configs.db import engine
+from payment_app.models.transaction_callbacks import TransactionCallbacks
+from payment_app.models.types import DICTIONARY_SIZE, json_bytes, train_dictionary
+
+
+def callback_samples(count: int) -> list[bytes]:
+    """Json of the latest count callbacks."""
+    statement = (
+        select(TransactionCallbacks.callback).order_by(TransactionCallbacks.id.desc()).limit(count)
+    )
+    with Session(engine) as session:
+        return [json_bytes(callback) for callback in session.exec(statement) if callback]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument("--size", type=int, default=DICTIONARY_SIZE)
+    args = parser.parse_args()
+    print(repr(train_dictionary(callback_samples(args.samples), args.size)))
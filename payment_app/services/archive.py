@@ -0,0 +1,225 @@
+"""
+retention of transaction callbacks and communications
+
+Rows older than the retention of their table (settings.archive_retention_months) are moved to
+archive storage one calendar month at a time: the rows of the month are streamed to a gzipped
+NDJSON object <table>/<YYYY-MM>/part-<run>.ndjson.gz and then deleted in chunks. A month is
+only archived once it is complete and past the retention, no rows are added to it any more.
+Communications are only archived once done, delivered or out of retries, rows still retried
+by the transaction communication cron stay and are archived by a later run.
+A run stopped between the upload and the delete leaves the rows in place, they are uploaded
+again in another part by the next run, readers drop duplicate ids across parts.
+
+Both tables reference transactions by foreign key, which MySQL partitioned tables do not
+support, so months are archived by created_at range instead of dropping partitions.
+
+Rows are deleted once uploaded, so the scheduled job refuses local storage unless
+settings.allow_local_storage is set, the archive would only be on the replica running it.
+
+usage: python -m payment_app.services.archive [--table transaction_callbacks] [--dry-run]
+       [--allow-local]
+"""
+import argparse
+import datetime
+import time
+from typing import Final, Iterator, Optional
+
+from loguru import logger
+from sqlalchemy import delete, func, or_, select
+from sqlmodel import Session
+
+from payment_app.configs.db import engine
+from payment_app.lib.archive_storage import create_storage, require_shared_storage
+from payment_app.lib.errors.error_handler import UnprocessableEntity
+from payment_app.models.transaction_callbacks import TransactionCallbacks
+from payment_app.models.transaction_communication import TransactionCommunications
+from payment_app.services.export import encode_ndjson, gzip_stream, stream_rows
+from payment_app.services.transaction_communication import MAX_COMMUNICATIONS
+from payment_app.settings import settings
+
+TABLES: Final = {
+    "transaction_callbacks": TransactionCallbacks,
+    "transaction_communications": TransactionCommunications,
+}
+# rows of a table that may be archived, in addition to being past the retention
+ARCHIVABLE: Final = {
+    "transaction_communications": lambda columns: or_(
+        columns.status == "success", columns.communication_count > MAX_COMMUNICATIONS
+    ),
+}
+CHUNK_SIZE: Final = 5000
+DELETE_CHUNK_SIZE: Final = 1000
+
+
+def add_months(day: datetime.date, months: int) -> datetime.date:
+    """First day of the month months after the month of day."""
+    index = day.year * 12 + day.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def retention_cutoff(months: int, today: Optional[datetime.date] = None) -> datetime.date:
+    """First day of the oldest month kept, months before the current month."""
+    return add_months(today or datetime.date.today(), -months)
+
+
+def month_range(month: datetime.date) -> tuple[datetime.datetime, datetime.datetime]:
+    start = datetime.datetime.combine(month, datetime.time())
+    return start, datetime.datetime.combine(add_months(month, 1), datetime.time())
+
+
+class TableArchiver:
+    """Archive the months of table older than its retention to storage."""
+
+    def __init__(self, table: str, storage, retention_months: int, dry_run: bool = False):
+        if table not in TABLES:
+            raise UnprocessableEntity(message=f"table must be one of {', '.join(TABLES)}")
+        self.table = table
+        self.model = TABLES[table]
+        self.storage = storage
+        self.retention_months = retention_months
+        self.dry_run = dry_run
+        self.run_id = int(time.time() * 1000)
+        self.stats = {"months": 0, "rows": 0, "bytes": 0}
+
+    def conditions(
+        self,
+        start: Optional[datetime.datetime],
+        end: datetime.datetime,
+        updated_before: Optional[datetime.datetime] = None,
+    ) -> list:
+        """Conditions of the archivable rows created in [start, end) and not updated since."""
+        columns = self.model.__table__.c
+        conditions = [columns.created_at < end]
+        if start:
+            conditions.append(columns.created_at >= start)
+        if updated_before:
+            conditions.append(columns.updated_at < updated_before)
+        if self.table in ARCHIVABLE:
+            conditions.append(ARCHIVABLE[self.table](columns))
+        return conditions
+
+    def expired_months(
+        self, session: Session, today: Optional[datetime.date] = None
+    ) -> Iterator[datetime.date]:
+        """Months holding rows created before the retention cutoff, oldest first."""
+        columns = self.model.__table__.c
+        cutoff = retention_cutoff(self.retention_months, today)
+        oldest = session.execute(
+            select(func.min(columns.created_at)).where(
+                *self.conditions(None, datetime.datetime.combine(cutoff, datetime.time()))
+            )
+        ).scalar()
+        if oldest is None:
+            return
+        month = oldest.date().replace(day=1)
+        while month < cutoff:
+            yield month
+            month = add_months(month, 1)
+
+    def archive_key(self, month: datetime.date) -> str:
+        return f"{self.table}/{month:%Y-%m}/part-{self.run_id}.ndjson.gz"
+
+    def month_statement(self, month: datetime.date):
+        columns = self.model.__table__.c
+        start, end = month_range(month)
+        return (
+            select(*self.model.__table__.columns)
+            .where(*self.conditions(start, end))
+            .order_by(columns.id)
+        )
+
+    def delete_month(
+        self, session: Session, month: datetime.date, uploaded_at: datetime.datetime
+    ) -> int:
+        """
+        Delete the uploaded rows of month in chunks, one transaction per chunk. Rows updated
+        since the upload started may differ from their archived copy and stay, the conditions
+        are repeated in the delete for rows updated in between.
+        """
+        columns = self.model.__table__.c
+        start, end = month_range(month)
+        # timestamps have second precision, a row updated in the second of the upload stays
+        conditions = self.conditions(start, end, uploaded_at - datetime.timedelta(seconds=1))
+        deleted = 0
+        while True:
+            ids = session.execute(
+                select(columns.id).where(*conditions).limit(DELETE_CHUNK_SIZE)
+            ).scalars().all()
+            if not ids:
+                return deleted
+            result = session.execute(
+                delete(self.model.__table__).where(columns.id.in_(ids), *conditions)
+            )
+            session.commit()
+            deleted += result.rowcount
+
+    def archive_month(self, session: Session, month: datetime.date) -> int:
+        """Upload the rows of month and delete them, return the number of rows archived."""
+        rows = 0
+
+        def counted(chunks):
+            nonlocal rows
+            for chunk in chunks:
+                rows += len(chunk)
+                yield chunk
+
+        columns = self.model.__table__.c
+        start, end = month_range(month)
+        if not session.execute(
+            select(columns.id).where(*self.conditions(start, end)).limit(1)
+        ).first():
+            return 0
+        key = self.archive_key(month)
+        uploaded_at = session.execute(select(func.now())).scalar()
+        chunks = counted(stream_rows(self.month_statement(month), CHUNK_SIZE))
+        size = self.storage.write(key, gzip_stream(encode_ndjson(chunks)))
+        deleted = 0 if self.dry_run else self.delete_month(session, month, uploaded_at)
+        logger.info(f"archive {self.table}: {rows} rows of {month:%Y-%m} to {key}, {deleted} deleted")
+        self.stats["months"] += 1
+        self.stats["rows"] += rows
+        self.stats["bytes"] += size
+        return rows
+
+    def run(self, deadline: Optional[float] = None, today: Optional[datetime.date] = None) -> dict:
+        with Session(engine) as session:
+            for month in list(self.expired_months(session, today)):
+                self.archive_month(session, month)
+                if deadline and time.monotonic() >= deadline:
+                    break
+        return self.stats
+
+
+def archive_tables(
+    deadline: Optional[float] = None,
+    tables: Optional[list] = None,
+    dry_run: bool = False,
+    allow_local: bool = settings.allow_local_storage,
+) -> dict:
+    """Archive every table with a retention, run by the scheduler."""
+    require_shared_storage(settings.archive_storage, allow_local)
+    storage = create_storage()
+    stats = {}
+    for table, months in settings.archive_retention_months.items():
+        if tables and table not in tables:
+            continue
+        stats[table] = TableArchiver(table, storage, months, dry_run).run(deadline=deadline)
+        if deadline and time.monotonic() >= deadline:
+            break
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--table", dest="tables", action="append", choices=TABLES)
+    parser.add_argument("--dry-run", action="store_true", help="upload without deleting rows")
+    parser.add_argument(
+        "--allow-local", action="store_true", help="archive to archive_dir on this host"
+    )
+    args = parser.parse_args()
+    logger.info(
+        archive_tables(
+            tables=args.tables,
+            dry_run=args.dry_run,
+            allow_local=args.allow_local or settings.allow_local_storage,
+        )
+    )
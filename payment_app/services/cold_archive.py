@@ -0,0 +1,414 @@
+"""
+cold archive of finalized transactions
+
+Transactions in a terminal state whose last update is older than settings.cold_archive_months
+are moved with their refunds and refund summary into immutable segment files (see
+lib.segment_store) published to archive storage under cold_archive/, then deleted from the
+database. Every record is indexed by transaction id, source id, gateway order and payment ids
+and by the local and gateway ids of its refunds. Read paths look a row up here when the
+database has none, from local copies of the segments in settings.cold_archive_dir.
+
+Each run ends by merging groups of MERGE_FACTOR segments of about the same size below
+MAX_MERGE_SIZE, so lookups of unknown ids search a few segments instead of one per run.
+
+Replicas list the segments every settings.cold_archive_refresh seconds, the rows of a segment
+are only deleted once it was uploaded, read back and listed for that long, so every replica
+finds them either in the database or in the archive. The scheduled job refuses local storage
+unless settings.allow_local_storage is set, other replicas would never see the segments.
+
+Transactions still referenced by callbacks, communications or payment links are kept until
+those are archived (services.archive), so the cold archive months should be longer than their
+retention. Rollups keep the archived days, a rollup rebuild of archived days would drop them.
+
+usage: python -m payment_app.services.cold_archive [--months 12] [--allow-local]
+"""
+import argparse
+import datetime
+import hashlib
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict, deque
+from decimal import Decimal
+from functools import cached_property
+from typing import Final, Optional
+
+import orjson
+from loguru import logger
+from sqlalchemy import Date, DateTime, Numeric, delete, exists, select
+from sqlmodel import Session
+
+from payment_app.configs.db import engine
+from payment_app.lib.archive_storage import create_storage, require_shared_storage
+from payment_app.lib.segment_store import (
+    Segment,
+    SegmentStore,
+    SegmentWriter,
+    download_segment,
+    merge_segments,
+    publish_segment,
+    published_segments,
+    remove_segment,
+    unpublish_segments,
+)
+from payment_app.models.payment_links import PaymentLink
+from payment_app.models.refund_summary import RefundSummary
+from payment_app.models.refund_transactions import RefundTransaction
+from payment_app.models.transaction import (
+    STATUS_CANCEL,
+    STATUS_FAILED,
+    STATUS_PENDING,
+    STATUS_SUCCESS,
+    Transaction,
+)
+from payment_app.models.transaction_callbacks import TransactionCallbacks
+from payment_app.models.transaction_communication import TransactionCommunications
+from payment_app.services.archive import retention_cutoff
+from payment_app.settings import settings
+
+PREFIX: Final = "cold_archive"
+TERMINAL_STATUSES: Final = (STATUS_SUCCESS, STATUS_FAILED, STATUS_CANCEL)
+TRANSACTION_KEYS: Final = ("id", "source_id", "gateway_order_id", "gateway_payment_id")
+INDEXES: Final = (*TRANSACTION_KEYS, "refund_id", "gateway_refund_id")
+SEGMENT_SIZE: Final = 20000
+DELETE_CHUNK_SIZE: Final = 1000
+MERGE_FACTOR: Final = 4
+# larger segments are not merged again, merging holds the indexes in memory
+MAX_MERGE_SIZE: Final = 128 * 1024 * 1024
+
+
+def _default(value):
+    # amounts are kept exact
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Value {value!r} not serializable")
+
+
+def encode_record(transaction: dict, refunds: list, refund_summary: Optional[dict]) -> bytes:
+    return orjson.dumps(
+        {"transaction": transaction, "refunds": refunds, "refund_summary": refund_summary},
+        default=_default,
+    )
+
+
+def decode_row(model, data: dict):
+    """Detached model instance of an archived row, dates and amounts restored from json."""
+    values = {}
+    for column in model.__table__.columns:
+        value = data.get(column.name)
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.datetime.fromisoformat(value)
+        elif value is not None and isinstance(column.type, Date):
+            value = datetime.date.fromisoformat(value)
+        elif value is not None and isinstance(column.type, Numeric):
+            value = Decimal(value)
+        values[column.name] = value
+    return model(**values)
+
+
+def record_digest(record: bytes) -> bytes:
+    return hashlib.sha256(record).digest()
+
+
+def merge_groups(sizes: dict[str, int]) -> list[list[str]]:
+    """
+    Groups of MERGE_FACTOR segment names to merge, segments are grouped by the power of
+    MERGE_FACTOR of their data size so every record is merged a logarithmic number of times.
+    """
+    tiers = defaultdict(list)
+    for name, size in sorted(sizes.items()):
+        if size < MAX_MERGE_SIZE:
+            tiers[int(math.log(max(size, 1), MERGE_FACTOR))].append(name)
+    return [
+        names[start:start + MERGE_FACTOR]
+        for names in tiers.values()
+        for start in range(0, len(names) - MERGE_FACTOR + 1, MERGE_FACTOR)
+    ]
+
+
+def record_keys(transaction: dict, refunds: list) -> dict:
+    keys = {name: [transaction[name]] for name in TRANSACTION_KEYS}
+    keys["refund_id"] = [refund["id"] for refund in refunds]
+    keys["gateway_refund_id"] = [refund["refund_id"] for refund in refunds]
+    return keys
+
+
+class ColdArchive:
+    """Lookups of archived transactions and refunds, rows are returned detached."""
+
+    def __init__(self, storage=None, directory: str = settings.cold_archive_dir):
+        self.storage = storage
+        self.directory = directory
+
+    @cached_property
+    def store(self) -> SegmentStore:
+        # storage is created on the first lookup, not when the application is imported
+        return SegmentStore(
+            self.storage or create_storage(), PREFIX, self.directory, settings.cold_archive_refresh
+        )
+
+    def _records(self, index_name: str, value) -> list[dict]:
+        if not value:
+            return []
+        return [orjson.loads(record) for record in self.store.find(index_name, value)]
+
+    def transactions_by(self, name: str, value) -> list[Transaction]:
+        """Archived transactions whose column name equals value."""
+        seen, transactions = set(), []
+        for record in self._records(name, value):
+            data = record["transaction"]
+            # truncated index keys and repeated archiving can return extra records
+            if data[name] != value or data["id"] in seen:
+                continue
+            seen.add(data["id"])
+            transactions.append(decode_row(Transaction, data))
+        return transactions
+
+    def get_transaction(self, transaction_id: str) -> Optional[Transaction]:
+        transactions = self.transactions_by("id", transaction_id)
+        return transactions[0] if transactions else None
+
+    def refunds_by(self, name: str, value) -> list[RefundTransaction]:
+        """Archived refunds by local id (name "id") or gateway refund id (name "refund_id")."""
+        index_name = "refund_id" if name == "id" else "gateway_refund_id"
+        seen, refunds = set(), []
+        for record in self._records(index_name, value):
+            for data in record["refunds"]:
+                if data[name] == value and data["id"] not in seen:
+                    seen.add(data["id"])
+                    refunds.append(decode_row(RefundTransaction, data))
+        return refunds
+
+    def get_refund(self, name: str, value) -> Optional[RefundTransaction]:
+        refunds = self.refunds_by(name, value)
+        return refunds[0] if refunds else None
+
+    def refunds_of(self, transaction_id: str) -> list[RefundTransaction]:
+        records = self._records("id", transaction_id)
+        if not records:
+            return []
+        return [decode_row(RefundTransaction, data) for data in records[0]["refunds"]]
+
+
+cold_archive = ColdArchive()
+
+
+class ColdArchiver:
+    """Move finalized transactions older than months into segments."""
+
+    def __init__(self, months: int = settings.cold_archive_months, storage=None):
+        self.months = months
+        self.storage = storage or create_storage()
+        self.refresh = settings.cold_archive_refresh
+        self.directory = None
+        self.run_id = int(time.time() * 1000)
+        self.segments = 0
+        self.stats = {"transactions": 0, "refunds": 0, "changed": 0, "merged": 0}
+
+    def cutoff(self) -> datetime.datetime:
+        return datetime.datetime.combine(retention_cutoff(self.months), datetime.time())
+
+    def archivable(self) -> list:
+        """Conditions of transactions that may move to the cold archive."""
+        return [
+            Transaction.status.in_(TERMINAL_STATUSES),
+            Transaction.updated_at < self.cutoff(),
+            ~exists().where(
+                RefundTransaction.transaction_id == Transaction.id,
+                RefundTransaction.status == STATUS_PENDING,
+            ),
+            ~exists().where(TransactionCallbacks.transaction_id == Transaction.id),
+            ~exists().where(TransactionCommunications.transaction_id == Transaction.id),
+            ~exists().where(PaymentLink.transaction_id == Transaction.id),
+        ]
+
+    def candidates(self, session: Session, after: Optional[str]) -> list[str]:
+        """Ids of the next transactions to archive, ordered by id."""
+        statement = select(Transaction.id).where(*self.archivable())
+        if after:
+            statement = statement.where(Transaction.id > after)
+        return session.execute(
+            statement.order_by(Transaction.id).limit(SEGMENT_SIZE)
+        ).scalars().all()
+
+    def records(self, session: Session, ids: list[str], lock: bool = False) -> dict[str, tuple]:
+        """
+        Encoded record and keys of the given transactions by id. With lock the rows are locked
+        for update and only transactions still archivable are returned.
+        """
+        transactions = select(*Transaction.__table__.columns).where(Transaction.id.in_(ids))
+        refunds = (
+            select(*RefundTransaction.__table__.columns)
+            .where(RefundTransaction.transaction_id.in_(ids))
+            .order_by(RefundTransaction.id)
+        )
+        summaries = select(*RefundSummary.__table__.columns).where(
+            RefundSummary.transaction_id.in_(ids)
+        )
+        if lock:
+            transactions = transactions.where(*self.archivable()).with_for_update()
+            refunds = refunds.with_for_update()
+            summaries = summaries.with_for_update()
+        transaction_rows = session.execute(transactions).mappings().all()
+        refund_rows, summary_rows = {}, {}
+        for row in session.execute(refunds).mappings():
+            refund_rows.setdefault(row["transaction_id"], []).append(dict(row))
+        for row in session.execute(summaries).mappings():
+            summary_rows[row["transaction_id"]] = dict(row)
+        records = {}
+        for row in transaction_rows:
+            transaction = dict(row)
+            transaction_refunds = refund_rows.get(transaction["id"], [])
+            summary = summary_rows.get(transaction["id"])
+            records[transaction["id"]] = (
+                encode_record(transaction, transaction_refunds, summary),
+                record_keys(transaction, transaction_refunds),
+                len(transaction_refunds),
+            )
+        return records
+
+    def write_segment(self, session: Session, ids: list[str]) -> dict[str, bytes]:
+        """
+        Write the transactions to a new segment and publish it, return the digest of every
+        record by id.
+        """
+        records = self.records(session, ids)
+        session.commit()
+        name = f"{self.run_id:013d}-{self.segments:05d}"
+        writer = SegmentWriter(self.directory, name, INDEXES)
+        try:
+            for record, keys, refunds in records.values():
+                writer.add(record, keys)
+                self.stats["refunds"] += refunds
+        except Exception:
+            writer.abort()
+            raise
+        self.stats["transactions"] += writer.close()
+        self.segments += 1
+        publish_segment(self.storage, PREFIX, self.directory, name)
+        remove_segment(self.directory, name)
+        return {
+            transaction_id: record_digest(record)
+            for transaction_id, (record, _, _) in records.items()
+        }
+
+    def delete_rows(self, session: Session, digests: dict[str, bytes]) -> int:
+        """
+        Delete archived rows, children first, one transaction per chunk. The rows are locked and
+        only deleted while still archivable and equal to their archived record, others stay and
+        are archived again by a later run.
+        """
+        ids = list(digests)
+        deleted = 0
+        for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+            records = self.records(session, ids[start:start + DELETE_CHUNK_SIZE], lock=True)
+            chunk = [
+                transaction_id
+                for transaction_id, (record, _, _) in records.items()
+                if record_digest(record) == digests[transaction_id]
+            ]
+            if chunk:
+                session.execute(
+                    delete(RefundSummary).where(RefundSummary.transaction_id.in_(chunk))
+                )
+                session.execute(
+                    delete(RefundTransaction).where(RefundTransaction.transaction_id.in_(chunk))
+                )
+                session.execute(delete(Transaction).where(Transaction.id.in_(chunk)))
+            session.commit()
+            deleted += len(chunk)
+        self.stats["changed"] += len(ids) - deleted
+        return deleted
+
+    def run(self, deadline: Optional[float] = None) -> dict:
+        """
+        Archive segment by segment, the rows of a published segment are deleted once every
+        replica lists it. A run stopped in between archives the rows again, lookups drop the
+        duplicates.
+        """
+        after = None
+        published = deque()
+        self.directory = tempfile.mkdtemp(prefix="cold-archive-")
+        try:
+            with Session(engine) as session:
+                while True:
+                    # the last segment still has to wait for the replicas before the deadline
+                    if deadline and time.monotonic() >= deadline - self.refresh:
+                        break
+                    ids = self.candidates(session, after)
+                    if not ids:
+                        break
+                    published.append((time.monotonic(), self.write_segment(session, ids)))
+                    after = ids[-1]
+                    self.delete_listed(session, published)
+                    logger.info(f"cold archive: {self.stats}")
+                self.delete_listed(session, published, wait=True)
+            self.compact(deadline)
+        finally:
+            shutil.rmtree(self.directory)
+        return self.stats
+
+    def compact(self, deadline: Optional[float] = None):
+        """
+        Merge groups of segments of about the same size. The merged segments are unpublished
+        once every replica lists their merge, lookups drop the duplicates until then.
+        """
+        files = published_segments(self.storage, PREFIX)
+        keys = self.storage.list(PREFIX)
+        sizes = {name: keys.get(f"{PREFIX}/{name}.data", 0) for name in files}
+        merged = []
+        for group in merge_groups(sizes):
+            if deadline and time.monotonic() >= deadline - self.refresh:
+                break
+            cache = os.path.join(self.directory, "merge")
+            segments = []
+            try:
+                for name in group:
+                    download_segment(self.storage, PREFIX, cache, files[name])
+                    segments.append(Segment(cache, name))
+                name = f"{group[-1]}-m{self.run_id}"
+                merge_segments(segments, self.directory, name)
+            finally:
+                for segment in segments:
+                    segment.close()
+                shutil.rmtree(cache)
+            publish_segment(self.storage, PREFIX, self.directory, name)
+            remove_segment(self.directory, name)
+            merged.append(group)
+            self.stats["merged"] += len(group)
+        if merged:
+            time.sleep(self.refresh)
+        for group in merged:
+            unpublish_segments(self.storage, PREFIX, group)
+
+    def delete_listed(self, session: Session, published: deque, wait: bool = False):
+        """Delete the rows of the published segments every replica lists by now."""
+        while published:
+            remaining = published[0][0] + self.refresh - time.monotonic()
+            if remaining > 0:
+                if not wait:
+                    return
+                time.sleep(remaining)
+            self.delete_rows(session, published.popleft()[1])
+
+
+def archive_transactions(
+    deadline: Optional[float] = None, allow_local: bool = settings.allow_local_storage
+) -> dict:
+    """Cold archive run of the scheduler, local storage only when allow_local is set."""
+    require_shared_storage(settings.archive_storage, allow_local)
+    return ColdArchiver().run(deadline=deadline)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--months", type=int, default=settings.cold_archive_months)
+    parser.add_argument(
+        "--allow-local", action="store_true", help="archive to archive_dir on this host"
+    )
+    args = parser.parse_args()
+    allow_local = args.allow_local or settings.allow_local_storage
+    require_shared_storage(settings.archive_storage, allow_local)
+    logger.info(ColdArchiver(args.months).run())
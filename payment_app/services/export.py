@@ -0,0 +1,190 @@
+"""
+streaming export of transactions, refund transactions and payment analytics
+
+Rows are read in a single pass through a server side cursor as plain rows, no ORM objects or
+identity map, and encoded chunk by chunk as NDJSON or CSV, optionally gzipped, so memory stays
+at one chunk whatever the size of the export.
+
+usage: python -m payment_app.services.export transactions --from 2022-03-01 --to 2022-04-01 \
+    --format csv --gzip -o transactions-2022-03.csv.gz
+"""
+import argparse
+import csv
+import datetime
+import io
+import sys
+import zlib
+from typing import Final, Iterable, Iterator, Optional
+
+from sqlalchemy import select
+
+from payment_app.configs.db import engine
+from payment_app.lib.errors.error_handler import UnprocessableEntity
+from payment_app.lib.serializer import dumps
+from payment_app.models.payment_analytic import PaymentAnalytic
+from payment_app.models.refund_transactions import RefundTransaction
+from payment_app.models.transaction import Transaction
+
+CHUNK_SIZE: Final = 1000
+ENTITIES: Final = {
+    "transactions": Transaction,
+    "refund_transactions": RefundTransaction,
+    "payment_analytics": PaymentAnalytic,
+}
+FORMATS: Final = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+# filters accepted per entity, refund transactions are filtered on their transaction
+FILTERS: Final = {
+    "transactions": ("status", "client_id", "store_id", "driver", "payment_type"),
+    "refund_transactions": ("status", "client_id", "store_id"),
+    "payment_analytics": ("status", "payment_method"),
+}
+CROCKFORD: Final = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+
+def ulid_floor(moment: datetime.datetime) -> str:
+    """Smallest ULID generated at moment, naive datetimes are taken as UTC."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    millis = int(moment.timestamp() * 1000)
+    encoded = ""
+    for _ in range(10):
+        millis, index = divmod(millis, 32)
+        encoded = CROCKFORD[index] + encoded
+    return encoded + "0" * 16
+
+
+def export_statement(
+    entity: str,
+    from_time: datetime.datetime,
+    to_time: datetime.datetime,
+    **filters,
+):
+    """Select the rows of entity created in [from_time, to_time) matching filters, by id."""
+    if entity not in ENTITIES:
+        raise UnprocessableEntity(message=f"entity must be one of {', '.join(ENTITIES)}")
+    if from_time >= to_time:
+        raise UnprocessableEntity(message="from must be before to")
+    unknown = {name for name, value in filters.items() if value is not None} - set(FILTERS[entity])
+    if unknown:
+        raise UnprocessableEntity(
+            message=f"{entity} can not be filtered by {', '.join(sorted(unknown))}"
+        )
+    model = ENTITIES[entity]
+    table = model.__table__
+    statement = select(*table.columns)
+    if entity == "payment_analytics":
+        # analytics have no timestamps, ids are ULIDs ordered by creation time
+        statement = statement.where(
+            table.c.id >= ulid_floor(from_time), table.c.id < ulid_floor(to_time)
+        )
+    else:
+        statement = statement.where(table.c.created_at >= from_time, table.c.created_at < to_time)
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if entity == "refund_transactions" and name != "status":
+            statement = statement.where(
+                table.c.transaction_id.in_(
+                    select(Transaction.id).where(getattr(Transaction, name) == value)
+                )
+            )
+        else:
+            statement = statement.where(table.c[name] == value)
+    return statement.order_by(table.c.id)
+
+
+def stream_rows(statement, chunk_size: int = CHUNK_SIZE) -> Iterator[list]:
+    """Yield chunks of row mappings read through a server side cursor."""
+    with engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, max_row_buffer=chunk_size
+        ).execute(statement)
+        for partition in result.mappings().partitions(chunk_size):
+            yield partition
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return dumps(value).decode()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def encode_ndjson(chunks: Iterable[list]) -> Iterator[bytes]:
+    """One json object per line."""
+    for rows in chunks:
+        yield b"".join(dumps(dict(row)) + b"\n" for row in rows)
+
+
+def encode_csv(chunks: Iterable[list], columns: list[str]) -> Iterator[bytes]:
+    """Csv with a header row, JSON columns are written as json text."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows([_csv_value(row[name]) for name in columns] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Gzip a byte stream incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(statement, output_format: str = "ndjson", compress: bool = False) -> Iterator[bytes]:
+    """Encoded byte chunks of the rows of statement."""
+    if output_format not in FORMATS:
+        raise UnprocessableEntity(message=f"format must be one of {', '.join(FORMATS)}")
+    chunks = stream_rows(statement)
+    if output_format == "csv":
+        data = encode_csv(chunks, [column.name for column in statement.selected_columns])
+    else:
+        data = encode_ndjson(chunks)
+    return gzip_stream(data) if compress else data
+
+
+def export_filename(
+    entity: str,
+    from_time: datetime.datetime,
+    to_time: datetime.datetime,
+    output_format: str,
+    compress: bool,
+) -> str:
+    name = f"{entity}-{from_time:%Y%m%d}-{to_time:%Y%m%d}.{output_format}"
+    return f"{name}.gz" if compress else name
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("entity", choices=ENTITIES)
+    parser.add_argument("--from", dest="from_time", type=datetime.datetime.fromisoformat, required=True)
+    parser.add_argument("--to", dest="to_time", type=datetime.datetime.fromisoformat, required=True)
+    parser.add_argument("--format", dest="output_format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--gzip", dest="compress", action="store_true")
+    parser.add_argument("--status")
+    parser.add_argument("--client", dest="client_id", type=int)
+    parser.add_argument("--store", dest="store_id")
+    parser.add_argument("--driver", type=int)
+    parser.add_argument("--payment-type")
+    parser.add_argument("--payment-method")
+    parser.add_argument("-o", "--output", help="file to write, stdout by default")
+    args = vars(parser.parse_args())
+    output_format, compress, output = args.pop("output_format"), args.pop("compress"), args.pop("output")
+    export_chunks = export(export_statement(**args), output_format, compress)
+    if output:
+        with open(output, "wb") as file:
+            file.writelines(export_chunks)
+    else:
+        sys.stdout.buffer.writelines(export_chunks)
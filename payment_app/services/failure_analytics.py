@@ -0,0 +1,224 @@
+"""
+payment success and failure analytics over payment_analytics
+
+The payments created at the gateway in a time window (payment_created_at, rows backfilled later
+keep the gateway time) are read once in chunks into integer coded columns (one code per
+distinct method, network, issuer, store, reason) and kept in a short lived cache per window.
+Rates, top reasons and trends are then computed with numpy bincounts over the codes, so
+every report is a few vector passes whatever the number of payments.
+"""
+import datetime
+import threading
+import time
+from typing import Final, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from payment_app.lib.errors.error_handler import UnprocessableEntity
+from payment_app.models.payment_analytic import PaymentAnalytic
+from payment_app.models.transaction import Transaction
+from payment_app.services.export import stream_rows
+from payment_app.settings import settings
+
+DIMENSIONS: Final = ("payment_method", "card_network", "issuer", "store_id", "step")
+SUCCESS_STATUSES: Final = ("captured", "refunded")
+FAILED_STATUS: Final = "failed"
+BUCKETS: Final = {"hour": 3600, "day": 86400}
+CHUNK_SIZE: Final = 10000
+MAX_ENTRIES: Final = 16
+
+_cache: dict = {}
+_lock = threading.Lock()
+
+
+class PaymentColumns:
+    """Integer coded columns of the payments of a window, labels[name][code] is the value."""
+
+    def __init__(self):
+        self.labels = {name: [] for name in (*DIMENSIONS, "reason")}
+        self._codes = {name: {} for name in self.labels}
+        self._chunks = {name: [] for name in self.labels}
+        self._created = []
+        self._success = []
+        self._failed = []
+        self.columns: dict[str, np.ndarray] = {}
+
+    def _code(self, name: str, value) -> int:
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+            self.labels[name].append(value if value is not None else "unknown")
+        return code
+
+    def add(self, rows: list):
+        """Append a chunk of rows."""
+        for name in self.labels:
+            self._chunks[name].append(
+                np.fromiter((self._code(name, row[name]) for row in rows), np.int32, len(rows))
+            )
+        self._created.append(
+            np.array([row["payment_created_at"] for row in rows], dtype="datetime64[ms]")
+        )
+        self._success.append(
+            np.fromiter((row["razorpay_status"] in SUCCESS_STATUSES for row in rows), bool, len(rows))
+        )
+        self._failed.append(
+            np.fromiter((row["razorpay_status"] == FAILED_STATUS for row in rows), bool, len(rows))
+        )
+
+    def finish(self) -> "PaymentColumns":
+        """Concatenate the chunks into the final columns."""
+        for name, chunks in self._chunks.items():
+            self.columns[name] = np.concatenate(chunks) if chunks else np.zeros(0, np.int32)
+        for name, chunks in (("success", self._success), ("failed", self._failed)):
+            self.columns[name] = np.concatenate(chunks) if chunks else np.zeros(0, bool)
+        created = np.concatenate(self._created) if self._created else np.zeros(0, "datetime64[ms]")
+        self.columns["millis"] = created.astype(np.int64)
+        self._chunks, self._created, self._success, self._failed, self._codes = {}, [], [], [], {}
+        return self
+
+    def __len__(self):
+        return len(self.columns["millis"])
+
+
+def _utc(moment: datetime.datetime) -> datetime.datetime:
+    """Naive UTC datetime of moment, naive datetimes are taken as UTC."""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def load_payments(from_time: datetime.datetime, to_time: datetime.datetime) -> PaymentColumns:
+    """Read the payments created at the gateway in [from_time, to_time) into coded columns."""
+    statement = (
+        select(
+            PaymentAnalytic.payment_created_at,
+            PaymentAnalytic.razorpay_status,
+            PaymentAnalytic.payment_method,
+            PaymentAnalytic.card_network,
+            PaymentAnalytic.issuer,
+            PaymentAnalytic.step,
+            PaymentAnalytic.reason,
+            Transaction.store_id,
+        )
+        .outerjoin(Transaction, Transaction.id == PaymentAnalytic.transaction_id)
+        .where(
+            PaymentAnalytic.payment_created_at >= _utc(from_time),
+            PaymentAnalytic.payment_created_at < _utc(to_time),
+        )
+    )
+    payments = PaymentColumns()
+    for rows in stream_rows(statement, CHUNK_SIZE):
+        payments.add(rows)
+    return payments.finish()
+
+
+def cached_payments(from_time: datetime.datetime, to_time: datetime.datetime) -> PaymentColumns:
+    """Payments of the window, reused for failure_analytics_cache_ttl seconds."""
+    if to_time <= from_time:
+        raise UnprocessableEntity(message="from_time must be before to_time")
+    if to_time - from_time > datetime.timedelta(days=settings.search_max_range_days):
+        raise UnprocessableEntity(
+            message=f"window is limited to {settings.search_max_range_days} days"
+        )
+    key = (from_time, to_time)
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(key)
+    if cached and cached[1] > now:
+        return cached[0]
+    payments = load_payments(from_time, to_time)
+    with _lock:
+        if len(_cache) >= MAX_ENTRIES:
+            _cache.clear()
+        _cache[key] = (payments, now + settings.failure_analytics_cache_ttl)
+    return payments
+
+
+def _rate(part: np.ndarray, whole: np.ndarray) -> np.ndarray:
+    return np.round(np.divide(part, whole, out=np.zeros(len(part)), where=whole > 0), 4)
+
+
+def rates_by(payments: PaymentColumns, dimension: str, limit: int = 50) -> list[dict]:
+    """Payments, successes, failures and rates per value of dimension, largest first."""
+    if dimension not in DIMENSIONS:
+        raise UnprocessableEntity(message=f"dimension must be one of {', '.join(DIMENSIONS)}")
+    codes = payments.columns[dimension]
+    size = len(payments.labels[dimension])
+    total = np.bincount(codes, minlength=size)
+    success = np.bincount(codes, weights=payments.columns["success"], minlength=size)
+    failed = np.bincount(codes, weights=payments.columns["failed"], minlength=size)
+    settled = success + failed
+    success_rate, failure_rate = _rate(success, settled), _rate(failed, settled)
+    labels = payments.labels[dimension]
+    return [
+        {
+            "value": labels[code],
+            "payments": int(total[code]),
+            "success": int(success[code]),
+            "failed": int(failed[code]),
+            "success_rate": float(success_rate[code]),
+            "failure_rate": float(failure_rate[code]),
+        }
+        for code in np.argsort(-total, kind="stable")[:limit]
+        if total[code]
+    ]
+
+
+def top_failure_reasons(payments: PaymentColumns, limit: int = 10) -> list[dict]:
+    """Most frequent failure reasons with their share of failures."""
+    failed = payments.columns["failed"]
+    counts = np.bincount(
+        payments.columns["reason"][failed], minlength=len(payments.labels["reason"])
+    )
+    failures = int(failed.sum())
+    labels = payments.labels["reason"]
+    return [
+        {
+            "reason": labels[code],
+            "count": int(counts[code]),
+            "share": round(int(counts[code]) / failures, 4),
+        }
+        for code in np.argsort(-counts, kind="stable")[:limit]
+        if counts[code]
+    ]
+
+
+def trend(payments: PaymentColumns, bucket: str = "hour") -> list[dict]:
+    """Payments, failures and failure rate per time bucket."""
+    if bucket not in BUCKETS:
+        raise UnprocessableEntity(message=f"bucket must be one of {', '.join(BUCKETS)}")
+    if not len(payments):
+        return []
+    seconds = BUCKETS[bucket]
+    buckets = payments.columns["millis"] // (seconds * 1000)
+    first = int(buckets.min())
+    offsets = buckets - first
+    total = np.bincount(offsets)
+    success = np.bincount(offsets, weights=payments.columns["success"])
+    failed = np.bincount(offsets, weights=payments.columns["failed"])
+    failure_rate = _rate(failed, success + failed)
+    return [
+        {
+            "bucket_start": datetime.datetime.utcfromtimestamp(
+                (first + int(offset)) * seconds
+            ).isoformat(),
+            "payments": int(total[offset]),
+            "failed": int(failed[offset]),
+            "failure_rate": float(failure_rate[offset]),
+        }
+        for offset in np.flatnonzero(total)
+    ]
+
+
+def summary(payments: PaymentColumns) -> dict:
+    success, failed = int(payments.columns["success"].sum()), int(payments.columns["failed"].sum())
+    settled = success + failed
+    return {
+        "payments": len(payments),
+        "success": success,
+        "failed": failed,
+        "success_rate": round(success / settled, 4) if settled else 0.0,
+    }
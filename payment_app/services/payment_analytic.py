@@ -0,0 +1,202 @@
+"""
+cron job for backfilling payment analytics from the gateway payments of transactions
+
+Analytics are kept current from payment webhooks (see CallbackEventHandler), this job only
+repairs rows missed by webhooks.
+
+Settled transactions without analytics are scanned by keyset on id, their gateway payments are
+fetched through a bounded worker pool with one cached gateway client per driver and thread, paced
+by a per driver token bucket and backing off when the gateway rejects calls. Every batch is written
+with one INSERT ... ON DUPLICATE KEY UPDATE on payment_id and the scan position is checkpointed.
+"""
+import datetime
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final, Optional
+
+import razorpay
+import requests
+import toml
+import ulid
+from loguru import logger
+from razorpay.errors import BadRequestError, ServerError
+from sqlalchemy import exists
+from sqlalchemy.dialects.mysql import insert
+from sqlmodel import Session, col, select
+
+from payment_app.configs.db import engine
+from payment_app.lib.checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from payment_app.lib.rate_limiter import RateLimiterRegistry
+from payment_app.models import Transaction
+from payment_app.models.payment_analytic import PaymentAnalytic
+from payment_app.models.transaction import STATUS_PENDING
+from payment_app.settings import settings
+
+CHECKPOINT_NAME: Final = "payment_analytic"
+MAX_RETRIES: Final = 5
+# columns refreshed when a payment is already stored
+UPDATE_COLUMNS: Final = (
+    "razorpay_status", "status", "payment_method", "card_name", "card_id",
+    "card_type", "card_network", "issuer", "step", "reason", "payment_created_at",
+)
+
+
+def analytic_row(transaction_id: str, status: str, item: dict) -> dict:
+    """payment_analytics row of a gateway payment entity."""
+    card = (item.get("card") or {}) if item.get("method") == "card" else {}
+    created_at = item.get("created_at")
+    return {
+        "id": ulid.ulid(),
+        "transaction_id": transaction_id,
+        "order_id": item.get("order_id"),
+        "payment_id": item["id"],
+        "razorpay_status": item.get("status"),
+        "status": status,
+        "step": item.get("error_step"),
+        "payment_method": item.get("method"),
+        "reason": item.get("error_description"),
+        "card_id": card.get("id", ""),
+        "card_name": card.get("name", ""),
+        "card_type": card.get("type", ""),
+        "card_network": card.get("network", ""),
+        "issuer": card.get("issuer", ""),
+        "payment_created_at": (
+            datetime.datetime.utcfromtimestamp(created_at) if created_at is not None else None
+        ),
+    }
+
+
+def is_transient(ex: Exception) -> bool:
+    """
+    True for errors worth retrying: gateway server errors, timeouts and rate limiting.
+    The razorpay client raises every 4xx as BadRequestError, 429 is told apart by its message.
+    """
+    if isinstance(ex, (ServerError, requests.ConnectionError, requests.Timeout)):
+        return True
+    return isinstance(ex, BadRequestError) and "too many requests" in str(ex).lower()
+
+
+def upsert_payment_analytics(session: Session, rows: list[dict]):
+    """Insert or refresh analytics rows by payment_id in one statement, caller commits."""
+    if not rows:
+        return
+    statement = insert(PaymentAnalytic.__table__).values(rows)
+    session.execute(
+        statement.on_duplicate_key_update(
+            {name: statement.inserted[name] for name in UPDATE_COLUMNS}
+        )
+    )
+
+
+class PaymentAnalyticBackfill:
+    """Backfill payment analytics of settled transactions concurrently."""
+
+    def __init__(
+        self,
+        workers: int = settings.reconcile_workers,
+        batch_size: int = settings.reconcile_batch_size,
+        rate_limit: float = settings.gateway_rate_limit,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.rate_limiters = RateLimiterRegistry(rate_limit)
+        self.gateways = {
+            gateway["id"]: gateway
+            for gateway in toml.load(
+                os.environ.get("PAYMENT_CONFIG_PATH", "config.toml")
+            )["gateway"]
+        }
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"transactions": 0, "payments": 0, "errors": 0}
+
+    def _client(self, driver_id: int) -> razorpay.Client:
+        """Gateway client per driver and thread, built once instead of per row."""
+        if not hasattr(self._local, "clients"):
+            self._local.clients = {}
+        if driver_id not in self._local.clients:
+            config = self.gateways[driver_id]
+            self._local.clients[driver_id] = razorpay.Client(
+                auth=(config["key_id"], config["key_secret"])
+            )
+        return self._local.clients[driver_id]
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self.stats[key] += value
+
+    def fetch_payments(self, transaction_id, status, gateway_order_id, driver_id) -> list[dict]:
+        """Analytics rows of one transaction, transient errors retried with exponential backoff."""
+        client = self._client(driver_id)
+        for attempt in range(MAX_RETRIES):
+            self.rate_limiters.acquire(driver_id)
+            try:
+                if str(gateway_order_id).startswith("qr_"):
+                    resp = client.qrcode.fetch_all_payments(gateway_order_id, {})
+                else:
+                    resp = client.order.payments(gateway_order_id)
+                self._count("transactions")
+                return [analytic_row(transaction_id, status, item) for item in resp["items"]]
+            except Exception as ex:
+                logger.warning(f"Error while fetching payments of {transaction_id}: {ex}")
+                if not is_transient(ex) or attempt == MAX_RETRIES - 1:
+                    break
+                time.sleep(2 ** attempt)
+        self._count("errors")
+        return []
+
+    def pick_transactions(self, session: Session, cursor: Optional[dict]):
+        """Next batch of settled transactions with a gateway order but no analytics, by id."""
+        statement = (
+            select(Transaction.id, Transaction.status, Transaction.gateway_order_id, Transaction.driver)
+            .where(Transaction.status != STATUS_PENDING)
+            .where(col(Transaction.gateway_order_id).is_not(None))
+            .where(~exists().where(PaymentAnalytic.transaction_id == Transaction.id))
+        )
+        if cursor:
+            statement = statement.where(Transaction.id > cursor["id"])
+        statement = statement.order_by(Transaction.id).limit(self.batch_size)
+        return session.exec(statement).all()
+
+    def run(self, deadline: Optional[float] = None) -> dict:
+        """
+        Backfill analytics, resuming from the saved checkpoint.
+        Stops once time.monotonic() passes deadline.
+        """
+        started_at = time.monotonic()
+        with Session(engine) as session, ThreadPoolExecutor(self.workers) as executor:
+            cursor = load_checkpoint(session, CHECKPOINT_NAME)
+            while True:
+                transactions = self.pick_transactions(session, cursor)
+                if not transactions:
+                    clear_checkpoint(session, CHECKPOINT_NAME)
+                    break
+                rows = [
+                    row
+                    for payments in executor.map(lambda args: self.fetch_payments(*args), transactions)
+                    for row in payments
+                ]
+                upsert_payment_analytics(session, rows)
+                session.commit()
+                self._count("payments", len(rows))
+                cursor = {"id": transactions[-1][0]}
+                save_checkpoint(session, CHECKPOINT_NAME, cursor)
+                elapsed = time.monotonic() - started_at
+                logger.info(
+                    f"payment analytic: {self.stats} in {elapsed:.1f}s "
+                    f"({self.stats['transactions'] / elapsed:.1f} transactions/s)"
+                )
+                if deadline and time.monotonic() >= deadline:
+                    break
+        return self.stats
+
+
+def populate_payment_analytics(deadline: Optional[float] = None):
+    """Backfill payment analytics of settled transactions."""
+    return PaymentAnalyticBackfill().run(deadline=deadline)
+
+
+if __name__ == "__main__":
+    populate_payment_analytics()
@@ -1,6 +1,5 @@
 
 """Module with payment services."""
-import json
 import os
 from typing import Union
 
@@ -103,7 +102,7 @@ class PaymentService:
                 logger.info("transaction already exists")
                 return {
                     "entity": "transaction",
-                    "transaction": json.loads(transaction.json()),
+                    "transaction": transaction,
                     "driver": self.__driver_name,
                 }
         if make_payment_in.payment_type == 'link':
@@ -133,19 +132,39 @@ class PaymentService:
 
         return {
             "entity": "transaction",
-            "transaction": json.loads(transaction.json()),
+            "transaction": transaction,
             "driver": self.__driver_name,
         }
 
 
+    def supports(self, capability: str) -> bool:
+        """Whether the driver implements an optional operation, see BaseDriver.capabilities."""
+        return capability in self.__driver.capabilities
+
     def get_payment_status(self, transaction, send_callback=False):
         """Return payment status."""
         return self.__driver.get_payment_status(transaction, send_callback)
 
+    def list_payments(self, from_timestamp: int, to_timestamp: int, skip: int, count: int):
+        """Return one page of gateway payments created in the time window."""
+        return self.__driver.list_payments(from_timestamp, to_timestamp, skip, count)
+
+    def list_settlement_items(self, day, skip: int, count: int):
+        """Return one page of the settlement reconciliation items of a day."""
+        return self.__driver.list_settlement_items(day, skip, count)
+
     def get_refund_status(self, refund, send_callback=True):
         """Return refund status."""
         return self.__driver.get_refund_status(refund, send_callback)
 
+    def fetch_refund(self, refund, transaction):
+        """Return the gateway state of a refund, network only."""
+        return self.__driver.fetch_refund(refund, transaction)
+
+    def apply_refund_response(self, refund, data):
+        """Apply a fetched gateway refund state, caller commits."""
+        return self.__driver.apply_refund_response(refund, data)
+
     def retry_refund(self, refund):
         """Retry refund."""
         return self.__driver.retry_refund(refund)
@@ -170,7 +189,7 @@ class PaymentService:
             client,
         )
 
-        return json.loads(refund.json())
+        return refund
 
     def create_payment_link(
         self, create_payment_link_in: CreatePaymentLinkIn, client, client_version
@@ -196,7 +215,9 @@ class PaymentService:
             type=create_qr_code_in.type,
             payment_amount=create_qr_code_in.payment_amount,
             is_fixed_amount=create_qr_code_in.is_fixed_amount,
-            driver=self.gateway_id
+            driver=self.gateway_id,
+            store_id=create_qr_code_in.store_id,
+            store_type=create_qr_code_in.store_type,
         )
         self.session.add(qr_code)
         self.session.commit()
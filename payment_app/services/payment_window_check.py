@@ -0,0 +1,151 @@
+"""
+cron job for reconciling a time window of payments with the gateway
+
+Pages through the gateway listing of all payments created in [from, to] at the maximum
+page size, matches every page in memory against local transactions by gateway payment id
+and gateway order id and only writes transactions whose status or payment differs.
+One listing call covers up to PAGE_SIZE payments instead of one order lookup per transaction.
+
+usage: python -m payment_app.services.payment_window_check --driver 1 --from 2022-03-01 --to 2022-03-02
+"""
+import argparse
+import datetime
+from typing import Final, Optional
+
+from fastapi import BackgroundTasks
+from loguru import logger
+from sqlalchemy import or_
+from sqlmodel import Session, col, select
+
+from payment_app.configs.db import engine
+from payment_app.drivers.base_driver import CAPABILITY_LIST_PAYMENTS
+from payment_app.handlers.client_callback_handler import enqueue_client_callback
+from payment_app.lib.checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from payment_app.lib.rate_limiter import TokenBucket
+from payment_app.models.transaction import STATUS_FAILED, STATUS_SUCCESS, Transaction
+from payment_app.services.payment_service import PaymentService
+from payment_app.settings import settings
+
+CHECKPOINT_NAME: Final = "payment_window_check"
+# maximum count accepted by the gateway payment listing
+PAGE_SIZE: Final = 100
+# payments in these states are still in flight at the gateway
+IN_FLIGHT_STATUSES: Final = ("created", "authorized")
+
+
+def gateway_status(item: dict) -> str:
+    """Local transaction status of a settled gateway payment."""
+    return STATUS_SUCCESS if item["captured"] else STATUS_FAILED
+
+
+class PaymentWindowReconciler:
+    """Reconcile local transactions with one gateway listing page at a time."""
+
+    def __init__(self, driver_id: int, rate_limit: float = settings.gateway_rate_limit):
+        self.driver_id = driver_id
+        self.rate_limiter = TokenBucket(rate_limit)
+        self.stats = {"pages": 0, "payments": 0, "matched": 0, "updated": 0}
+
+    def _match_transactions(self, session: Session, items: list) -> tuple[dict, dict]:
+        """Load local transactions of a page with one query, keyed by payment and order id."""
+        payment_ids = {item["id"] for item in items}
+        order_ids = {item["order_id"] for item in items if item.get("order_id")}
+        conditions = [col(Transaction.gateway_payment_id).in_(payment_ids)]
+        if order_ids:
+            conditions.append(col(Transaction.gateway_order_id).in_(order_ids))
+        statement = (
+            select(Transaction)
+            .where(Transaction.driver == self.driver_id)
+            .where(or_(*conditions))
+        )
+        by_payment_id, by_order_id = {}, {}
+        for transaction in session.exec(statement):
+            if transaction.gateway_payment_id:
+                by_payment_id[transaction.gateway_payment_id] = transaction
+            if transaction.gateway_order_id:
+                by_order_id[transaction.gateway_order_id] = transaction
+        return by_payment_id, by_order_id
+
+    def apply_page(self, session: Session, items: list) -> int:
+        """Apply the differences of one listing page, return number of updated transactions."""
+        items = [item for item in items if item["status"] not in IN_FLIGHT_STATUSES]
+        if not items:
+            return 0
+        by_payment_id, by_order_id = self._match_transactions(session, items)
+        updated = set()
+        # the listing is newest first, apply attempts of an order in the order they happened
+        for item in sorted(items, key=lambda item: item["created_at"]):
+            transaction = by_payment_id.get(item["id"]) or by_order_id.get(item.get("order_id"))
+            if not transaction:
+                continue
+            self.stats["matched"] += 1
+            status = gateway_status(item)
+            if transaction.status == STATUS_SUCCESS and status != STATUS_SUCCESS:
+                # a failed attempt never overrides a captured one
+                continue
+            if transaction.status == status and transaction.gateway_payment_id == item["id"]:
+                continue
+            transaction.status = status
+            transaction.gateway_payment_id = item["id"]
+            transaction.callback_response = item
+            session.add(transaction)
+            updated.add(transaction.id)
+        for transaction_id in updated:
+            enqueue_client_callback(session, transaction_id, "transaction")
+        session.commit()
+        return len(updated)
+
+    def run(self, from_time: datetime.datetime, to_time: datetime.datetime) -> dict:
+        """Reconcile payments created in [from_time, to_time], resuming a checkpoint of the same window."""
+        from_timestamp, to_timestamp = int(from_time.timestamp()), int(to_time.timestamp())
+        with Session(engine) as session:
+            payment_service = PaymentService(session, BackgroundTasks(), self.driver_id)
+            if not payment_service.supports(CAPABILITY_LIST_PAYMENTS):
+                logger.info(f"payment window check: driver {self.driver_id} can not list payments")
+                return self.stats
+            skip = 0
+            cursor = load_checkpoint(session, CHECKPOINT_NAME)
+            if cursor and (cursor["driver"], cursor["from"], cursor["to"]) == (
+                self.driver_id, from_timestamp, to_timestamp
+            ):
+                skip = cursor["skip"]
+            while True:
+                self.rate_limiter.acquire()
+                items = payment_service.list_payments(from_timestamp, to_timestamp, skip, PAGE_SIZE)
+                self.stats["pages"] += 1
+                self.stats["payments"] += len(items)
+                self.stats["updated"] += self.apply_page(session, items)
+                skip += len(items)
+                if len(items) < PAGE_SIZE:
+                    clear_checkpoint(session, CHECKPOINT_NAME)
+                    break
+                save_checkpoint(
+                    session,
+                    CHECKPOINT_NAME,
+                    {"driver": self.driver_id, "from": from_timestamp, "to": to_timestamp, "skip": skip},
+                )
+                logger.info(f"payment window check: {self.stats}")
+        logger.info(f"payment window check done: {self.stats}")
+        return self.stats
+
+
+def payment_window_check(
+    driver_id: int,
+    from_time: Optional[datetime.datetime] = None,
+    to_time: Optional[datetime.datetime] = None,
+):
+    """Reconcile a window of payments, the previous day by default."""
+    if to_time is None:
+        to_time = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+    if from_time is None:
+        from_time = to_time - datetime.timedelta(days=1)
+    return PaymentWindowReconciler(driver_id).run(from_time, to_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--driver", type=int, required=True)
+    parser.add_argument("--from", dest="from_time", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--to", dest="to_time", type=datetime.datetime.fromisoformat)
+    args = parser.parse_args()
+    payment_window_check(args.driver, args.from_time, args.to_time)
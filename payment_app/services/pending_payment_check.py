@@ -1,35 +1,185 @@
 """
-cron job for getting status of pending payments once every 24 hours
+cron job for reconciling pending payments with the gateway
+
+Pending transactions are scanned oldest first by keyset on (status, created_at, id),
+checked through a bounded worker pool under a per gateway rate limit and the scan
+position is checkpointed after every batch. Batches are claimed through work_claims so
+concurrent instances split the pending rows between them, the shared checkpoint only moves
+forward and is cleared once no pending row is left after it, claimed or not. Client
+callbacks for changed transactions are queued for the transaction communication cron
+instead of being sent inline.
 """
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final, Optional
 
 from fastapi import BackgroundTasks
 from loguru import logger
+from sqlalchemy import and_, or_
 from sqlmodel import Session, select
 
 from payment_app.configs.db import engine
-from payment_app.models.transaction import STATUS_SUCCESS, Transaction
+from payment_app.handlers.client_callback_handler import enqueue_client_callback
+from payment_app.lib.checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from payment_app.lib.rate_limiter import RateLimiterRegistry
+from payment_app.lib.work_claim import claim_batch, default_owner, release_claims
+from payment_app.models.transaction import STATUS_PENDING, Transaction
 from payment_app.services.payment_service import PaymentService
+from payment_app.settings import settings
+
+CHECKPOINT_NAME: Final = "pending_payment_check"
+CLAIM_ENTITY: Final = "transaction"
+# payments younger than this are most likely still on the checkout page
+MIN_PENDING_AGE: Final = datetime.timedelta(minutes=15)
+
+
+class PendingPaymentReconciler:
+    """Check pending transactions against the gateway concurrently."""
+
+    def __init__(
+        self,
+        workers: int = settings.reconcile_workers,
+        batch_size: int = settings.reconcile_batch_size,
+        rate_limit: float = settings.gateway_rate_limit,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.rate_limiters = RateLimiterRegistry(rate_limit)
+        self.owner = default_owner()
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self.stats = {"checked": 0, "updated": 0, "errors": 0}
+
+    def _session(self) -> Session:
+        """Each worker thread gets its own session."""
+        if not hasattr(self._local, "session"):
+            self._local.session = Session(engine)
+            self._local.services = {}
+            with self._lock:
+                self._sessions.append(self._local.session)
+        return self._local.session
+
+    def _payment_service(self, driver_id) -> PaymentService:
+        """PaymentService per driver and thread, built once instead of per row."""
+        session = self._session()
+        if driver_id not in self._local.services:
+            self._local.services[driver_id] = PaymentService(
+                session, BackgroundTasks(), driver_id
+            )
+        return self._local.services[driver_id]
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def check_transaction(self, transaction_id: str, driver_id: int):
+        """Fetch the gateway status of one transaction and queue a callback on change."""
+        session = self._session()
+        try:
+            transaction = session.get(Transaction, transaction_id, populate_existing=True)
+            if not transaction or transaction.status != STATUS_PENDING:
+                return
+            payment_service = self._payment_service(driver_id)
+            self.rate_limiters.acquire(driver_id)
+            updated = payment_service.get_payment_status(transaction, send_callback=False)
+            self._count("checked")
+            if updated is not None and updated.status != STATUS_PENDING:
+                enqueue_client_callback(session, updated.id, "transaction")
+                session.commit()
+                self._count("updated")
+        except Exception as ex:
+            session.rollback()
+            self._count("errors")
+            logger.error(f"Error while checking transaction {transaction_id}: {ex}")
+
+    def pending_statement(self, columns, cursor: Optional[dict]):
+        """Pending transactions old enough to check after the cursor, by keyset."""
+        statement = (
+            select(*columns)
+            .where(Transaction.status == STATUS_PENDING)
+            .where(Transaction.created_at <= datetime.datetime.now() - MIN_PENDING_AGE)
+        )
+        if cursor:
+            created_at = datetime.datetime.fromisoformat(cursor["created_at"])
+            statement = statement.where(
+                or_(
+                    Transaction.created_at > created_at,
+                    and_(Transaction.created_at == created_at, Transaction.id > cursor["id"]),
+                )
+            )
+        return statement
+
+    def pick_pending_transactions(self, session: Session, cursor: Optional[dict]):
+        """
+        Claim the next batch of pending transactions by keyset on (status, created_at, id),
+        rows claimed by another instance are skipped.
+        """
+        statement = self.pending_statement(
+            (Transaction.id, Transaction.driver, Transaction.created_at), cursor
+        )
+        statement = statement.order_by(Transaction.created_at, Transaction.id).limit(
+            self.batch_size
+        )
+        return claim_batch(session, CLAIM_ENTITY, statement, Transaction, self.owner)
+
+    def has_pending(self, session: Session, cursor: Optional[dict]) -> bool:
+        """True if pending rows are left after the cursor, including rows claimed elsewhere."""
+        statement = self.pending_statement((Transaction.id,), cursor).limit(1)
+        return session.exec(statement).first() is not None
+
+    def save_cursor(self, session: Session, cursor: dict):
+        """Move the shared checkpoint to cursor unless another instance is already past it."""
+        saved = load_checkpoint(session, CHECKPOINT_NAME)
+        if saved and _position(saved) >= _position(cursor):
+            return
+        save_checkpoint(session, CHECKPOINT_NAME, cursor)
+
+    def run(self, max_batches: Optional[int] = None, deadline: Optional[float] = None) -> dict:
+        """
+        Reconcile pending transactions, resuming from the saved checkpoint.
+        Stops after max_batches or once time.monotonic() passes deadline.
+        """
+        started_at = time.monotonic()
+        batches = 0
+        with Session(engine) as session, ThreadPoolExecutor(self.workers) as executor:
+            cursor = load_checkpoint(session, CHECKPOINT_NAME)
+            while True:
+                rows = self.pick_pending_transactions(session, cursor)
+                if not rows:
+                    # rows claimed by other instances are still ahead of their shared cursor
+                    if not self.has_pending(session, cursor):
+                        clear_checkpoint(session, CHECKPOINT_NAME)
+                    break
+                list(executor.map(lambda row: self.check_transaction(row[0], row[1]), rows))
+                release_claims(session, CLAIM_ENTITY, (row[0] for row in rows), self.owner)
+                last = rows[-1]
+                cursor = {"created_at": last[2].isoformat(), "id": last[0]}
+                self.save_cursor(session, cursor)
+                batches += 1
+                elapsed = time.monotonic() - started_at
+                logger.info(
+                    f"pending payment check: {self.stats} in {elapsed:.1f}s "
+                    f"({self.stats['checked'] / elapsed:.1f} checks/s)"
+                )
+                if max_batches and batches >= max_batches:
+                    break
+                if deadline and time.monotonic() >= deadline:
+                    break
+        for worker_session in self._sessions:
+            worker_session.close()
+        return self.stats
 
 
-def pick_pending_transactions(session, background_tasks: BackgroundTasks):
-    """Pick pending transactions."""
-    statement = (
-        select(Transaction)
-        .where(Transaction.status != STATUS_SUCCESS)
-    ).limit(200)
-    transactions = session.exec(statement)
-    for transaction in transactions:
-        logger.info(f"Checking transaction {transaction.id}")
-        driver_id = transaction.driver
-        payment_service = PaymentService(session, background_tasks, driver_id)
-        payment_service.get_payment_status(transaction, send_callback=True)
+def _position(cursor: dict) -> tuple:
+    return datetime.datetime.fromisoformat(cursor["created_at"]), cursor["id"]
 
 
 def pending_payment_check():
     """Get pending transactions."""
-    _bg = BackgroundTasks()
-    with Session(engine) as session:
-        pick_pending_transactions(session, _bg)
+    return PendingPaymentReconciler().run()
 
 
 if __name__ == "__main__":
@@ -1,33 +1,264 @@
 """
-cron job for getting status of pending redunds once every 24 hours
+cron job for syncing the status of pending refunds with the gateway
+
+Pending refunds are scanned oldest first by keyset on (status, created_at, id) together with
+their transactions, grouped by gateway and their gateway state is fetched through a bounded
+worker pool under a per gateway rate limit. Refunds known to the gateway are only fetched, the
+fetched states of a batch are applied and committed together. A run stops after
+refund_sync_max_refunds refunds and resumes from its checkpoint, which only moves past a batch
+once it is committed. Batches are claimed through work_claims so concurrent instances never
+sync the same refund.
+
+Refunds the gateway does not know never reached it: they are issued again once older than
+refund_retry_after seconds, and failed once older than refund_fail_after_days or when they
+can not be issued again.
 """
+import datetime
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final, Optional
+
 from fastapi import BackgroundTasks
 from loguru import logger
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Load
 from sqlmodel import Session, select
+
 from payment_app.configs.db import engine
+from payment_app.drivers.base_driver import CAPABILITY_REFUND_SYNC
+from payment_app.handlers.client_callback_handler import enqueue_client_callback
+from payment_app.lib.checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from payment_app.lib.rate_limiter import RateLimiterRegistry
+from payment_app.lib.work_claim import claim_batch, default_owner, release_claims
 from payment_app.models.refund_transactions import RefundTransaction
+from payment_app.models.transaction import STATUS_FAILED, STATUS_PENDING, Transaction
+from payment_app.models.types import PAYLOAD_GROUP
 from payment_app.services.payment_service import PaymentService
+from payment_app.services.refund_summary import apply_refund_change
+from payment_app.settings import settings
+
+CHECKPOINT_NAME: Final = "refund_sync"
+CLAIM_ENTITY: Final = "refund_transaction"
+# fetch result of a refund the gateway does not know, None is a failed fetch
+NOT_FOUND: Final = object()
+
+
+class RefundSynchroniser:
+    """Sync pending refunds with their gateway in batches."""
+
+    def __init__(
+        self,
+        workers: int = settings.reconcile_workers,
+        batch_size: int = settings.reconcile_batch_size,
+        max_refunds: int = settings.refund_sync_max_refunds,
+        rate_limit: float = settings.gateway_rate_limit,
+    ):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_refunds = max_refunds
+        self.rate_limiters = RateLimiterRegistry(rate_limit)
+        self.owner = default_owner()
+        self._services = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "checked": 0,
+            "updated": 0,
+            "not_found": 0,
+            "retried": 0,
+            "failed": 0,
+            "errors": 0,
+            "unsupported": 0,
+        }
+
+    def _payment_service(self, session: Session, driver_id) -> PaymentService:
+        """PaymentService per driver, built once per run."""
+        if driver_id not in self._services:
+            self._services[driver_id] = PaymentService(session, BackgroundTasks(), driver_id)
+        return self._services[driver_id]
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def pending_statement(self, columns, cursor: Optional[dict]):
+        """Pending refunds after the cursor, by keyset."""
+        statement = select(*columns).where(RefundTransaction.status == STATUS_PENDING)
+        if cursor:
+            created_at = datetime.datetime.fromisoformat(cursor["created_at"])
+            statement = statement.where(
+                or_(
+                    RefundTransaction.created_at > created_at,
+                    and_(
+                        RefundTransaction.created_at == created_at,
+                        RefundTransaction.id > cursor["id"],
+                    ),
+                )
+            )
+        return statement
+
+    def pick_pending_refunds(self, session: Session, cursor: Optional[dict]):
+        """
+        Claim the next batch of (refund, transaction) by keyset on (status, created_at, id),
+        refunds claimed by another instance are skipped. Refund payloads are loaded with the
+        batch, the fetch workers share the session and must not lazy load them.
+        """
+        statement = (
+            self.pending_statement((RefundTransaction, Transaction), cursor)
+            .join(Transaction, RefundTransaction.transaction_id == Transaction.id)
+            .options(Load(RefundTransaction).undefer_group(PAYLOAD_GROUP))
+        )
+        statement = statement.order_by(
+            RefundTransaction.created_at, RefundTransaction.id
+        ).limit(self.batch_size)
+        return claim_batch(session, CLAIM_ENTITY, statement, RefundTransaction, self.owner)
+
+    def has_pending(self, session: Session, cursor: Optional[dict]) -> bool:
+        """True if pending refunds are left after the cursor, including claimed ones."""
+        statement = self.pending_statement((RefundTransaction.id,), cursor).limit(1)
+        return session.exec(statement).first() is not None
+
+    def save_cursor(self, session: Session, cursor: dict):
+        """Move the shared checkpoint to cursor unless another instance is already past it."""
+        saved = load_checkpoint(session, CHECKPOINT_NAME)
+        if saved and _position(saved) >= _position(cursor):
+            return
+        save_checkpoint(session, CHECKPOINT_NAME, cursor)
+
+    def fetch_refund(self, payment_service: PaymentService, driver_id, refund, transaction):
+        """Fetch the gateway state of one refund, network only, NOT_FOUND when it has none."""
+        try:
+            self.rate_limiters.acquire(driver_id)
+            data = payment_service.fetch_refund(refund, transaction)
+            self._count("checked")
+            if data is None:
+                self._count("not_found")
+                return NOT_FOUND
+            return data
+        except Exception as ex:
+            self._count("errors")
+            logger.error(f"Error while fetching refund {refund.id}: {ex}")
+            return None
+
+    def fail_refund(self, session: Session, refund: RefundTransaction):
+        """Mark a refund the gateway never received as failed, caller commits."""
+        previous_status = refund.status
+        refund.status = STATUS_FAILED
+        session.add(refund)
+        apply_refund_change(session, refund, previous_status, refund.amount)
+        enqueue_client_callback(session, refund.transaction_id, "refund")
+        self.stats["failed"] += 1
+
+    def unknown_refunds(self, session: Session, unknown: list) -> list:
+        """Fail the unknown refunds past refund_fail_after_days, return those to issue again."""
+        now = datetime.datetime.now()
+        retry_before = now - datetime.timedelta(seconds=settings.refund_retry_after)
+        fail_before = now - datetime.timedelta(days=settings.refund_fail_after_days)
+        retries = []
+        for payment_service, refund in unknown:
+            if refund.created_at >= retry_before:
+                # the gateway may still be creating it
+                continue
+            if refund.created_at < fail_before or not (refund.api_request or {}).get("payment_id"):
+                self.fail_refund(session, refund)
+            else:
+                retries.append((payment_service, refund))
+        return retries
+
+    def retry_refunds(self, retries: list):
+        """Issue unknown refunds again, each is committed by the driver."""
+        for payment_service, refund in retries:
+            self.rate_limiters.acquire(payment_service.gateway_id)
+            if payment_service.retry_refund(refund):
+                self.stats["retried"] += 1
+                self.stats["updated"] += 1
+            else:
+                self.stats["errors"] += 1
+
+    def sync_batch(self, session: Session, executor: ThreadPoolExecutor, rows) -> bool:
+        """
+        Fetch the states of a batch grouped by gateway and apply them in one commit,
+        return False when the batch was rolled back.
+        """
+        by_driver = defaultdict(list)
+        for refund, transaction in rows:
+            by_driver[transaction.driver].append((refund, transaction))
+
+        fetched = []
+        for driver_id, refunds in by_driver.items():
+            payment_service = self._payment_service(session, driver_id)
+            if not payment_service.supports(CAPABILITY_REFUND_SYNC):
+                self.stats["unsupported"] += len(refunds)
+                continue
+            results = executor.map(
+                lambda row: self.fetch_refund(payment_service, driver_id, *row), refunds
+            )
+            fetched.extend(
+                (payment_service, refund, data)
+                for (refund, _), data in zip(refunds, results)
+                if data is not None
+            )
+
+        try:
+            unknown = []
+            for payment_service, refund, data in fetched:
+                if data is NOT_FOUND:
+                    unknown.append((payment_service, refund))
+                    continue
+                previous = (refund.status, refund.refund_id)
+                payment_service.apply_refund_response(refund, data)
+                if (refund.status, refund.refund_id) != previous:
+                    enqueue_client_callback(session, refund.transaction_id, "refund")
+                    self.stats["updated"] += 1
+            retries = self.unknown_refunds(session, unknown)
+            session.commit()
+        except Exception as ex:
+            session.rollback()
+            self.stats["errors"] += 1
+            logger.error(f"Error while applying refund batch: {ex}")
+            return False
+        self.retry_refunds(retries)
+        return True
+
+    def run(self, deadline: Optional[float] = None) -> dict:
+        """
+        Sync pending refunds, resuming from the saved checkpoint.
+        Stops once time.monotonic() passes deadline.
+        """
+        synced = 0
+        with Session(engine) as session, ThreadPoolExecutor(self.workers) as executor:
+            cursor = load_checkpoint(session, CHECKPOINT_NAME)
+            while synced < self.max_refunds:
+                rows = self.pick_pending_refunds(session, cursor)
+                if not rows:
+                    # refunds claimed by other instances are still ahead of their shared cursor
+                    if not self.has_pending(session, cursor):
+                        clear_checkpoint(session, CHECKPOINT_NAME)
+                    break
+                last = rows[-1][0]
+                cursor = {"created_at": last.created_at.isoformat(), "id": last.id}
+                refund_ids = [refund.id for refund, _ in rows]
+                committed = self.sync_batch(session, executor, rows)
+                release_claims(session, CLAIM_ENTITY, refund_ids, self.owner)
+                if not committed:
+                    # the next run starts again at this batch
+                    break
+                self.save_cursor(session, cursor)
+                synced += len(rows)
+                logger.info(f"refund sync: {self.stats}")
+                if deadline and time.monotonic() >= deadline:
+                    break
+        return self.stats
 
 
-def pick_pending_refund_transactions(session, background_tasks: BackgroundTasks):
-    """Pick pending refund transactions."""
-    statement = (
-        select(RefundTransaction)
-        .where(RefundTransaction.status == "pending")
-    )
-    refunds = session.exec(statement)
-    for refund in refunds:
-        logger.info(f"Checking refund {refund.id}")
-        driver_id = refund.transaction.driver
-        payment_service = PaymentService(session, background_tasks, driver_id)
-        payment_service.retry_refund(refund)
+def _position(cursor: dict) -> tuple:
+    return datetime.datetime.fromisoformat(cursor["created_at"]), cursor["id"]
 
 
 def pending_refund_check():
     """Get pending refund transactions."""
-    _bg = BackgroundTasks()
-    with Session(engine) as session:
-        pick_pending_refund_transactions(session, _bg)
+    return RefundSynchroniser().run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,122 @@
+"""
+Maintain the per transaction refund summary sent in client refund callbacks.
+"""
+from decimal import Decimal
+from typing import Optional
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from payment_app.models.refund_summary import LATEST_REFUNDS_LIMIT, RefundSummary
+from payment_app.models.refund_transactions import RefundTransaction
+from payment_app.models.transaction import STATUS_PENDING, STATUS_SUCCESS, Transaction
+
+
+def _to_decimal(amount) -> Decimal:
+    return Decimal(str(amount or 0))
+
+
+def _contribution(status: Optional[str], amount) -> tuple[Decimal, Decimal]:
+    """Return (refunded, pending) amounts a refund adds to the summary."""
+    if status == STATUS_SUCCESS:
+        return _to_decimal(amount), Decimal(0)
+    if status == STATUS_PENDING:
+        return Decimal(0), _to_decimal(amount)
+    return Decimal(0), Decimal(0)
+
+
+def _refund_entry(refund: RefundTransaction) -> dict:
+    return {
+        "id": refund.id,
+        "refund_id": refund.refund_id,
+        "amount": float(_to_decimal(refund.amount)),
+        "status": refund.status,
+    }
+
+
+def _build_refund_summary(session: Session, transaction_id: str) -> RefundSummary:
+    """Create the summary from existing refund rows, used once per transaction."""
+    statement = (
+        select(
+            RefundTransaction.status,
+            func.count(RefundTransaction.id),
+            func.sum(RefundTransaction.amount),
+        )
+        .where(RefundTransaction.transaction_id == transaction_id)
+        .group_by(RefundTransaction.status)
+    )
+    summary = RefundSummary(
+        transaction_id=transaction_id,
+        refund_count=0,
+        refunded_amount=Decimal(0),
+        pending_amount=Decimal(0),
+    )
+    for status, count, amount in session.exec(statement):
+        refunded, pending = _contribution(status, amount)
+        summary.refund_count += count
+        summary.refunded_amount += refunded
+        summary.pending_amount += pending
+
+    statement = (
+        select(RefundTransaction)
+        .where(RefundTransaction.transaction_id == transaction_id)
+        .order_by(RefundTransaction.created_at.desc(), RefundTransaction.id.desc())
+        .limit(LATEST_REFUNDS_LIMIT)
+    )
+    summary.latest_refunds = [_refund_entry(refund) for refund in session.exec(statement)]
+    session.add(summary)
+    return summary
+
+
+def get_refund_summary(session: Session, transaction_id: str) -> tuple[RefundSummary, bool]:
+    """
+    Return (summary, created) for a transaction, locked for the rest of the session transaction.
+    The parent transaction row is locked first so concurrent refund events of the same
+    transaction apply their deltas one after another, and the summary is read with FOR UPDATE,
+    a plain read would return the REPEATABLE READ snapshot from before the lock was granted.
+    """
+    session.exec(
+        select(Transaction.id).where(Transaction.id == transaction_id).with_for_update()
+    ).first()
+    summary = session.get(
+        RefundSummary, transaction_id, populate_existing=True, with_for_update=True
+    )
+    if summary:
+        return summary, False
+    return _build_refund_summary(session, transaction_id), True
+
+
+def find_refund_summary(session: Session, transaction_id: str) -> Optional[RefundSummary]:
+    """Read the summary of a transaction without locking, None before its first refund change."""
+    return session.get(RefundSummary, transaction_id)
+
+
+def apply_refund_change(
+    session: Session,
+    refund: RefundTransaction,
+    previous_status: Optional[str] = None,
+    previous_amount=None,
+) -> RefundSummary:
+    """
+    Apply a refund state change to the summary of its transaction.
+    Call after session.add(refund) and before commit so both are written together,
+    previous_status is None for a newly created refund.
+    """
+    summary, created = get_refund_summary(session, refund.transaction_id)
+    if not created:
+        if previous_status is None:
+            summary.refund_count += 1
+        else:
+            refunded, pending = _contribution(previous_status, previous_amount)
+            summary.refunded_amount -= refunded
+            summary.pending_amount -= pending
+        refunded, pending = _contribution(refund.status, refund.amount)
+        summary.refunded_amount += refunded
+        summary.pending_amount += pending
+
+        latest = [
+            entry for entry in (summary.latest_refunds or []) if entry["id"] != refund.id
+        ]
+        summary.latest_refunds = [_refund_entry(refund)] + latest[:LATEST_REFUNDS_LIMIT - 1]
+    session.add(summary)
+    return summary
@@ -1,32 +1,13 @@
 """Module for payment services"""
-from loguru import logger
-from sqlmodel import Session, select
-from payment_app.configs.db import engine
-from payment_app.handlers.client_callback_handler import (
-    client_callback_transaction_handler,
-)
-from payment_app.models.transaction import STATUS_SUCCESS, Transaction
+from typing import Optional
 
-def pick_success_transactions(session):
-    """Pick successful transactions."""
-    statement = select(Transaction).where(Transaction.status == STATUS_SUCCESS)
-    transactions = session.exec(statement)
-    for transaction in transactions:
-        logger.info(f"resending success transaction {transaction.id}")
-        client_callback_transaction_handler(
-            session,
-            {
-                "entity": "transaction",
-                "transaction": transaction,
-                "driver": "razorpay",
-            },
-        )
+from payment_app.models.transaction import STATUS_SUCCESS
+from payment_app.services.resend_callbacks import CallbackResender
 
 
-def success_payment_check():
-    """Get successful transactions."""
-    with Session(engine) as session:
-        pick_success_transactions(session)
+def success_payment_check(deadline: Optional[float] = None):
+    """Resend callbacks of successful transactions, a run stopped at the deadline is resumed."""
+    return CallbackResender(status=STATUS_SUCCESS).run(deadline=deadline)
 
 
 if __name__ == "__main__":
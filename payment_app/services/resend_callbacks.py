@@ -0,0 +1,205 @@
+"""
+tool for resending client callbacks of transactions in bulk
+
+Matching transactions are streamed by id through a server side cursor and expunged once read,
+clients are loaded once and callbacks are delivered through a bounded worker pool under a per
+client rate limit. Progress is checkpointed per chunk under a name derived from the filters,
+so runs with other filters do not share a cursor and a rerun with the same filters resumes
+after the last delivered chunk.
+
+usage: python -m payment_app.services.resend_callbacks --client 3 --from 2022-03-01 --to 2022-04-01
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Final, Optional
+
+import toml
+from loguru import logger
+from sqlalchemy.orm import undefer_group
+from sqlmodel import Session, col, select
+
+from payment_app.configs.db import engine
+from payment_app.handlers.client_callback_handler import client_callback_transaction_handler
+from payment_app.lib.checkpoint import clear_checkpoint, load_checkpoint, save_checkpoint
+from payment_app.lib.rate_limiter import RateLimiterRegistry
+from payment_app.models import Client
+from payment_app.models.transaction import STATUS_SUCCESS, Transaction
+from payment_app.models.types import PAYLOAD_GROUP
+from payment_app.settings import settings
+
+CHECKPOINT_NAME: Final = "resend_callbacks"
+CHUNK_SIZE: Final = 500
+
+
+def checkpoint_name(filters: dict) -> str:
+    """Checkpoint name of a resend with the given filters."""
+    digest = hashlib.sha1(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+    return f"{CHECKPOINT_NAME}:{digest}"
+
+
+class CallbackResender:
+    """Resend client callbacks of the transactions matching the filters."""
+
+    def __init__(
+        self,
+        client_id: Optional[int] = None,
+        from_time: Optional[datetime.datetime] = None,
+        to_time: Optional[datetime.datetime] = None,
+        status: Optional[str] = STATUS_SUCCESS,
+        transaction_ids: Optional[list[str]] = None,
+        event: str = "transaction",
+        workers: int = settings.reconcile_workers,
+        rate_limit: float = settings.client_callback_rate_limit,
+    ):
+        self.filters = {
+            "client_id": client_id,
+            "from": from_time.isoformat() if from_time else None,
+            "to": to_time.isoformat() if to_time else None,
+            "status": status,
+            "ids": sorted(transaction_ids) if transaction_ids else None,
+            "event": event,
+        }
+        self.checkpoint_name = checkpoint_name(self.filters)
+        self.event = event
+        self.workers = workers
+        self.rate_limiters = RateLimiterRegistry(rate_limit)
+        self.drivers = {
+            gateway["id"]: gateway["driver"]
+            for gateway in toml.load(
+                os.environ.get("PAYMENT_CONFIG_PATH", "config.toml")
+            )["gateway"]
+        }
+        self.clients = {}
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self.stats = {"sent": 0, "errors": 0}
+
+    def _session(self) -> Session:
+        """Each delivery thread gets its own session."""
+        if not hasattr(self._local, "session"):
+            self._local.session = Session(engine)
+            with self._lock:
+                self._sessions.append(self._local.session)
+        return self._local.session
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def load_clients(self, session: Session):
+        """Load all clients once instead of lazy loading the client of every transaction."""
+        for client in session.exec(select(Client)).all():
+            session.expunge(client)
+            self.clients[client.id] = client
+
+    def statement(self, cursor: Optional[dict]):
+        """Select matching transactions ordered by id, after the cursor."""
+        # rows are detached before use, the callback payloads are loaded with them
+        statement = select(Transaction).options(undefer_group(PAYLOAD_GROUP))
+        if self.filters["client_id"]:
+            statement = statement.where(Transaction.client_id == self.filters["client_id"])
+        if self.filters["from"]:
+            statement = statement.where(
+                Transaction.created_at >= datetime.datetime.fromisoformat(self.filters["from"])
+            )
+        if self.filters["to"]:
+            statement = statement.where(
+                Transaction.created_at < datetime.datetime.fromisoformat(self.filters["to"])
+            )
+        if self.filters["status"]:
+            statement = statement.where(Transaction.status == self.filters["status"])
+        if self.filters["ids"]:
+            statement = statement.where(col(Transaction.id).in_(self.filters["ids"]))
+        if cursor:
+            statement = statement.where(Transaction.id > cursor["id"])
+        return statement.order_by(Transaction.id).execution_options(
+            stream_results=True, yield_per=CHUNK_SIZE
+        )
+
+    def stream_chunks(self, session: Session, cursor: Optional[dict]):
+        """Yield chunks of detached transactions, rows are not kept in the identity map."""
+        chunk = []
+        for transaction in session.exec(self.statement(cursor)):
+            session.expunge(transaction)
+            chunk.append(transaction)
+            if len(chunk) == CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def deliver(self, transaction: Transaction):
+        """Send the callback of one transaction."""
+        client = self.clients.get(transaction.client_id)
+        if not client:
+            return
+        session = self._session()
+        try:
+            self.rate_limiters.acquire(client.id)
+            client_callback_transaction_handler(
+                session,
+                {
+                    "event": self.event,
+                    "transaction": transaction,
+                    "client": client,
+                    "driver": self.drivers.get(transaction.driver),
+                },
+            )
+            self._count("sent")
+        except Exception as ex:
+            session.rollback()
+            self._count("errors")
+            logger.error(f"Error while resending callback of {transaction.id}: {ex}")
+
+    def run(self, resume: bool = True, deadline: Optional[float] = None) -> dict:
+        """
+        Resend callbacks, resuming a checkpoint saved with the same filters. A run stopped at
+        the time.monotonic() deadline keeps its checkpoint for the next run.
+        """
+        with Session(engine) as session, Session(engine) as stream_session, \
+                ThreadPoolExecutor(self.workers) as executor:
+            self.load_clients(session)
+            cursor = load_checkpoint(session, self.checkpoint_name) if resume else None
+            if cursor and cursor["filters"] != self.filters:
+                cursor = None
+            for chunk in self.stream_chunks(stream_session, cursor):
+                list(executor.map(self.deliver, chunk))
+                save_checkpoint(
+                    session, self.checkpoint_name, {"filters": self.filters, "id": chunk[-1].id}
+                )
+                logger.info(f"resend callbacks: {self.stats}, last id {chunk[-1].id}")
+                if deadline and time.monotonic() >= deadline:
+                    break
+            else:
+                clear_checkpoint(session, self.checkpoint_name)
+        for worker_session in self._sessions:
+            worker_session.close()
+        return self.stats
+
+
+def resend_callbacks(**filters) -> dict:
+    """Resend client callbacks of the transactions matching the filters."""
+    return CallbackResender(**filters).run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--client", dest="client_id", type=int)
+    parser.add_argument("--from", dest="from_time", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--to", dest="to_time", type=datetime.datetime.fromisoformat)
+    parser.add_argument("--status", default=STATUS_SUCCESS, help="empty for any status")
+    parser.add_argument("--id", dest="transaction_ids", action="append")
+    parser.add_argument("--event", default="transaction", choices=("transaction", "refund"))
+    parser.add_argument("--no-resume", dest="resume", action="store_false")
+    args = parser.parse_args()
+    resume = args.resume
+    del args.resume
+    args.status = args.status or None
+    CallbackResender(**vars(args)).run(resume=resume)
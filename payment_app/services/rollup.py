@@ -0,0 +1,147 @@
+"""
+rebuild and query the daily transaction and refund rollups
+
+Rollups are kept current by the after_flush listener in payment_app.models.rollup, the rebuild
+recomputes whole days from the source tables to repair changes the listener can not see (bulk
+updates, deleted rows, changed amounts). Each day is rebuilt in its own transaction. Days before
+the cold archive cutoff are never rebuilt, their transactions may have left the source tables.
+
+usage: python -m payment_app.services.rollup --from 2022-03-01 --to 2022-03-31
+"""
+import argparse
+import datetime
+import time
+from typing import Final, Optional
+
+from loguru import logger
+from sqlalchemy import delete, func, select
+from sqlmodel import Session
+
+from payment_app.configs.db import engine
+from payment_app.lib.errors.error_handler import UnprocessableEntity
+from payment_app.models.refund_transactions import RefundTransaction
+from payment_app.models.rollup import (
+    REFUND_DIMENSIONS,
+    TRANSACTION_DIMENSIONS,
+    RefundRollup,
+    TransactionRollup,
+    add_to_rollup,
+    refund_rollup_rows,
+    transaction_rollup_rows,
+)
+from payment_app.models.transaction import Transaction
+from payment_app.services.archive import retention_cutoff
+from payment_app.settings import settings
+
+ROLLUPS: Final = {
+    "transactions": (TransactionRollup, TRANSACTION_DIMENSIONS, "payment_count"),
+    "refunds": (RefundRollup, REFUND_DIMENSIONS, "refund_count"),
+}
+
+
+def _day_rows(model, day: datetime.date):
+    """Rollup rows of the source rows created on day, grouped by dimensions."""
+    start = datetime.datetime.combine(day, datetime.time())
+    end = start + datetime.timedelta(days=1)
+    if model is TransactionRollup:
+        rows = transaction_rollup_rows().where(
+            Transaction.created_at >= start, Transaction.created_at < end
+        )
+    else:
+        rows = refund_rollup_rows().where(
+            RefundTransaction.created_at >= start, RefundTransaction.created_at < end
+        )
+    # group on the dimension columns, sum the sign and amount columns
+    columns = list(rows.selected_columns)
+    dimensions = columns[:-2]
+    return rows.with_only_columns(
+        *dimensions, func.sum(columns[-2]), func.sum(columns[-1])
+    ).group_by(*dimensions)
+
+
+def rebuild_cutoff() -> datetime.date:
+    """First day that may be rebuilt, older transactions may be in the cold archive."""
+    return retention_cutoff(settings.cold_archive_months)
+
+
+def _check_rebuild_day(day: datetime.date):
+    cutoff = rebuild_cutoff()
+    if day < cutoff:
+        raise UnprocessableEntity(
+            message=f"rollups before {cutoff} can not be rebuilt, their rows may be archived"
+        )
+
+
+def rebuild_day(session: Session, day: datetime.date):
+    """Replace the rollups of day with totals computed from the source tables."""
+    _check_rebuild_day(day)
+    for model in (TransactionRollup, RefundRollup):
+        session.execute(delete(model).where(model.day == day))
+        session.execute(add_to_rollup(model, _day_rows(model, day), accumulate=False))
+    session.commit()
+
+
+def rebuild_rollups(
+    from_day: datetime.date, to_day: datetime.date, deadline: Optional[float] = None
+) -> int:
+    """Rebuild every day in [from_day, to_day], return the number of days rebuilt."""
+    _check_rebuild_day(from_day)
+    days = 0
+    with Session(engine) as session:
+        day = from_day
+        while day <= to_day:
+            rebuild_day(session, day)
+            days += 1
+            day += datetime.timedelta(days=1)
+            if deadline and time.monotonic() >= deadline:
+                break
+    logger.info(f"rollups rebuilt for {days} days from {from_day}")
+    return days
+
+
+def rebuild_recent_rollups(deadline: Optional[float] = None) -> int:
+    """Rebuild the last settings.rollup_rebuild_days days, run by the scheduler."""
+    today = datetime.date.today()
+    from_day = max(today - datetime.timedelta(days=settings.rollup_rebuild_days), rebuild_cutoff())
+    return rebuild_rollups(from_day, today, deadline=deadline)
+
+
+def summarize(
+    session: Session,
+    rollup: str,
+    from_day: datetime.date,
+    to_day: datetime.date,
+    group_by: list[str],
+    filters: dict,
+) -> list[dict]:
+    """Sum rollup rows of [from_day, to_day] matching filters per group_by dimensions."""
+    model, dimensions, count_column = ROLLUPS[rollup]
+    names = set(group_by) | {name for name, value in filters.items() if value is not None}
+    unknown = names - set(dimensions)
+    if unknown:
+        raise UnprocessableEntity(
+            message=f"{rollup} summaries have no dimension {', '.join(sorted(unknown))}"
+        )
+    group_columns = [getattr(model, name) for name in group_by]
+    statement = select(
+        *group_columns,
+        func.sum(getattr(model, count_column)).label("count"),
+        func.sum(model.amount).label("amount"),
+    ).where(model.day >= from_day, model.day <= to_day)
+    for name, value in filters.items():
+        if value is not None:
+            statement = statement.where(getattr(model, name) == value)
+    if group_columns:
+        statement = statement.group_by(*group_columns).order_by(*group_columns)
+    return [
+        {**dict(row), "count": int(row["count"] or 0), "amount": row["amount"] or 0}
+        for row in session.execute(statement).mappings()
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--from", dest="from_day", type=datetime.date.fromisoformat, required=True)
+    parser.add_argument("--to", dest="to_day", type=datetime.date.fromisoformat, required=True)
+    args = parser.parse_args()
+    rebuild_rollups(args.from_day, args.to_day)
@@ -0,0 +1,78 @@
+"""
+Jobs run by the embedded scheduler when settings.scheduler_enabled is set.
+Intervals and max runtimes are in seconds, each job receives its deadline.
+Bulk callback resends (resend_all_success, resend_callbacks) are run by hand only, client
+callbacks are delivered by the transaction_communication job.
+"""
+from payment_app.lib.scheduler import Job, Scheduler
+from payment_app.services.archive import archive_tables
+from payment_app.services.cold_archive import archive_transactions
+from payment_app.services.payment_analytic import populate_payment_analytics
+from payment_app.services.pending_payment_check import PendingPaymentReconciler
+from payment_app.services.refund_retry import RefundSynchroniser
+from payment_app.services.rollup import rebuild_recent_rollups
+from payment_app.services.snapshot import snapshot_tables
+from payment_app.services.transaction_communication import communicate_with_client
+
+JOBS = [
+    Job(
+        "pending_payment_check",
+        lambda deadline: PendingPaymentReconciler().run(deadline=deadline),
+        interval=300,
+        jitter=30,
+        max_runtime=240,
+    ),
+    Job(
+        "refund_sync",
+        lambda deadline: RefundSynchroniser().run(deadline=deadline),
+        interval=3600,
+        jitter=120,
+        max_runtime=1800,
+    ),
+    Job(
+        "transaction_communication",
+        communicate_with_client,
+        interval=60,
+        jitter=10,
+        max_runtime=300,
+    ),
+    Job(
+        "payment_analytic",
+        populate_payment_analytics,
+        interval=86400,
+        jitter=600,
+        max_runtime=3600,
+    ),
+    Job(
+        "analytics_snapshot",
+        snapshot_tables,
+        interval=3600,
+        jitter=120,
+        max_runtime=1800,
+    ),
+    Job(
+        "rollup_rebuild",
+        rebuild_recent_rollups,
+        interval=86400,
+        jitter=600,
+        max_runtime=1800,
+    ),
+    Job(
+        "archive",
+        archive_tables,
+        interval=86400,
+        jitter=1800,
+        max_runtime=3600,
+    ),
+    Job(
+        "cold_archive",
+        archive_transactions,
+        interval=86400,
+        jitter=1800,
+        max_runtime=3600,
+    ),
+]
+
+
+def create_scheduler() -> Scheduler:
+    return Scheduler(JOBS)
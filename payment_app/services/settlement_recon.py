@@ -0,0 +1,282 @@
+"""
+settlement reconciliation of gateway settlements against local transactions and refunds
+
+Settlement items (payments, refunds, adjustments) of a range of settlement days are streamed
+from the gateway reconciliation listing, or a local NDJSON file, in batches. Every batch is
+held as numpy arrays, its local rows are loaded with one query per kind by gateway id and
+amounts, net credits and fees are compared as vectors. Payment ids of the settlements are
+kept as a compact sorted byte array, local successful payments that were never settled are
+reported after the settlements are read. Mismatches are written as NDJSON.
+
+usage: python -m payment_app.services.settlement_recon --driver 1 --from 2022-03-01 \
+    --to 2022-03-31 -o settlement-2022-03.ndjson [--file settlements.ndjson]
+"""
+import argparse
+import datetime
+import gzip
+from decimal import Decimal
+from typing import Final, Iterator
+
+import numpy as np
+from fastapi import BackgroundTasks
+from loguru import logger
+from sqlmodel import Session, col, select
+
+from payment_app.configs.db import engine
+from payment_app.drivers.base_driver import CAPABILITY_SETTLEMENTS
+from payment_app.lib.errors.error_handler import UnprocessableEntity
+from payment_app.lib.rate_limiter import TokenBucket
+from payment_app.lib.serializer import dumps, loads
+from payment_app.models.payment_analytic import PaymentAnalytic
+from payment_app.models.refund_transactions import RefundTransaction
+from payment_app.models.transaction import STATUS_SUCCESS, Transaction
+from payment_app.services.export import stream_rows
+from payment_app.services.payment_service import PaymentService
+from payment_app.settings import settings
+
+# maximum count accepted by the gateway settlement reconciliation listing
+PAGE_SIZE: Final = 1000
+BATCH_SIZE: Final = 5000
+KIND_OTHER, KIND_PAYMENT, KIND_REFUND = 0, 1, 2
+KINDS: Final = {"payment": KIND_PAYMENT, "refund": KIND_REFUND}
+# gateway payment ids are stored fixed width in the settled id array
+ID_WIDTH: Final = 40
+
+
+def to_paise(amount) -> int:
+    return int((Decimal(str(amount or 0)) * 100).to_integral_value())
+
+
+class GatewaySettlementSource:
+    """Settlement items of each day in [from_day, to_day] from the gateway listing."""
+
+    def __init__(self, driver_id: int, rate_limit: float = settings.gateway_rate_limit):
+        self.driver_id = driver_id
+        self.rate_limiter = TokenBucket(rate_limit)
+
+    def items(self, from_day: datetime.date, to_day: datetime.date) -> Iterator[dict]:
+        with Session(engine) as session:
+            payment_service = PaymentService(session, BackgroundTasks(), self.driver_id)
+            if not payment_service.supports(CAPABILITY_SETTLEMENTS):
+                raise UnprocessableEntity(
+                    message=f"driver {self.driver_id} has no settlement reconciliation listing"
+                )
+            day = from_day
+            while day <= to_day:
+                skip = 0
+                while True:
+                    self.rate_limiter.acquire()
+                    page = payment_service.list_settlement_items(day, skip, PAGE_SIZE)
+                    yield from page
+                    if len(page) < PAGE_SIZE:
+                        break
+                    skip += PAGE_SIZE
+                day += datetime.timedelta(days=1)
+
+
+class FileSettlementSource:
+    """
+    Settlement items read from an NDJSON file, gzipped when the name ends in .gz.
+    The file holds the items of the reconciled days only, used for manual runs and tests.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def items(self, from_day: datetime.date, to_day: datetime.date) -> Iterator[dict]:
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with opener(self.path, "rb") as file:
+            for line in file:
+                if line.strip():
+                    yield loads(line)
+
+
+class SettlementBatch:
+    """Columns of a batch of settlement items, amounts in paise."""
+
+    def __init__(self, items: list[dict]):
+        size = len(items)
+        self.items = items
+        self.entity_ids = [item["entity_id"] for item in items]
+        self.kinds = np.fromiter(
+            (KINDS.get(item.get("type"), KIND_OTHER) for item in items), np.int8, size
+        )
+        self.amounts = np.fromiter((int(item.get("amount") or 0) for item in items), np.int64, size)
+        self.fees = np.fromiter((int(item.get("fee") or 0) for item in items), np.int64, size)
+        self.nets = np.fromiter(
+            (int(item.get("credit") or 0) - int(item.get("debit") or 0) for item in items),
+            np.int64,
+            size,
+        )
+
+    def ids_of(self, kind: int) -> list[str]:
+        return [
+            entity_id for entity_id, item_kind in zip(self.entity_ids, self.kinds) if item_kind == kind
+        ]
+
+
+def compare_batch(batch: SettlementBatch, local: dict, max_fee_rate: float) -> list[dict]:
+    """
+    Mismatches of a batch against local rows, local maps a gateway id to (amount, status).
+    A payment nets amount - fee, a refund -(amount + fee), fee includes tax.
+    """
+    size = len(batch.entity_ids)
+    matches = [local.get(entity_id) for entity_id in batch.entity_ids]
+    found = np.fromiter((match is not None for match in matches), bool, size)
+    local_amounts = np.fromiter((match[0] if match else 0 for match in matches), np.int64, size)
+    settled_status = np.fromiter(
+        (bool(match) and match[1] == STATUS_SUCCESS for match in matches), bool, size
+    )
+    relevant = batch.kinds != KIND_OTHER
+    sign = np.where(batch.kinds == KIND_REFUND, -1, 1)
+    issues = {
+        "missing_local": relevant & ~found,
+        "amount_mismatch": relevant & found & (local_amounts != batch.amounts),
+        "status_mismatch": relevant & found & ~settled_status,
+        "net_mismatch": relevant & (batch.nets != sign * batch.amounts - batch.fees),
+        "fee_excess": (batch.kinds == KIND_PAYMENT) & (batch.fees > batch.amounts * max_fee_rate),
+    }
+    any_issue = np.logical_or.reduce(list(issues.values()))
+    mismatches = []
+    for index in np.flatnonzero(any_issue):
+        item = batch.items[index]
+        match = matches[index]
+        mismatches.append({
+            "entity_id": item["entity_id"],
+            "type": item.get("type"),
+            "settlement_id": item.get("settlement_id"),
+            "amount": int(batch.amounts[index]),
+            "fee": int(batch.fees[index]),
+            "net": int(batch.nets[index]),
+            "local_amount": match[0] if match else None,
+            "local_status": match[1] if match else None,
+            "issues": [name for name, mask in issues.items() if mask[index]],
+        })
+    return mismatches
+
+
+class SettlementReconciler:
+    """Reconcile the settlements of a range of days with local transactions and refunds."""
+
+    def __init__(
+        self,
+        source,
+        driver_id: int,
+        lag_days: int = settings.settlement_lag_days,
+        max_fee_rate: float = settings.settlement_max_fee_rate,
+    ):
+        self.source = source
+        self.driver_id = driver_id
+        self.lag_days = lag_days
+        self.max_fee_rate = max_fee_rate
+        self.stats = {"items": 0, "mismatches": 0}
+
+    def local_rows(self, session: Session, batch: SettlementBatch) -> dict:
+        """(amount, status) of the local rows of a batch by gateway id, one query per kind."""
+        local = {}
+        payment_ids = batch.ids_of(KIND_PAYMENT)
+        if payment_ids:
+            statement = (
+                select(Transaction.gateway_payment_id, Transaction.amount, Transaction.status)
+                .where(Transaction.driver == self.driver_id)
+                .where(col(Transaction.gateway_payment_id).in_(payment_ids))
+            )
+            for payment_id, amount, status in session.exec(statement):
+                local[payment_id] = (to_paise(amount), status)
+            # payments of orders with several attempts are only linked through analytics
+            missing = [payment_id for payment_id in payment_ids if payment_id not in local]
+            if missing:
+                statement = (
+                    select(PaymentAnalytic.payment_id, Transaction.amount, Transaction.status)
+                    .join(Transaction, Transaction.id == PaymentAnalytic.transaction_id)
+                    .where(col(PaymentAnalytic.payment_id).in_(missing))
+                )
+                for payment_id, amount, status in session.exec(statement):
+                    local[payment_id] = (to_paise(amount), status)
+        refund_ids = batch.ids_of(KIND_REFUND)
+        if refund_ids:
+            statement = select(
+                RefundTransaction.refund_id, RefundTransaction.amount, RefundTransaction.status
+            ).where(col(RefundTransaction.refund_id).in_(refund_ids))
+            for refund_id, amount, status in session.exec(statement):
+                local[refund_id] = (to_paise(amount), status)
+        return local
+
+    def batches(self, from_day: datetime.date, to_day: datetime.date) -> Iterator[SettlementBatch]:
+        items = []
+        for item in self.source.items(from_day, to_day):
+            items.append(item)
+            if len(items) == BATCH_SIZE:
+                yield SettlementBatch(items)
+                items = []
+        if items:
+            yield SettlementBatch(items)
+
+    def unsettled_payments(
+        self, settled_ids: np.ndarray, from_day: datetime.date, to_day: datetime.date
+    ) -> Iterator[dict]:
+        """
+        Successful local payments created in [from_day, to_day + 1 - lag_days) missing from
+        the settlements, they had at least lag_days to settle and can not have settled earlier.
+        """
+        end = datetime.datetime.combine(to_day, datetime.time()) + datetime.timedelta(
+            days=1 - self.lag_days
+        )
+        statement = (
+            select(Transaction.id, Transaction.gateway_payment_id, Transaction.amount)
+            .where(Transaction.driver == self.driver_id)
+            .where(Transaction.status == STATUS_SUCCESS)
+            .where(col(Transaction.gateway_payment_id).is_not(None))
+            .where(Transaction.created_at >= datetime.datetime.combine(from_day, datetime.time()))
+            .where(Transaction.created_at < end)
+        )
+        for rows in stream_rows(statement, BATCH_SIZE):
+            payment_ids = np.array([row["gateway_payment_id"] for row in rows], dtype=f"S{ID_WIDTH}")
+            settled = np.zeros(len(rows), bool)
+            if len(settled_ids):
+                positions = np.minimum(np.searchsorted(settled_ids, payment_ids), len(settled_ids) - 1)
+                settled = settled_ids[positions] == payment_ids
+            for index in np.flatnonzero(~settled):
+                row = rows[index]
+                yield {
+                    "entity_id": row["gateway_payment_id"],
+                    "type": "payment",
+                    "transaction_id": row["id"],
+                    "local_amount": to_paise(row["amount"]),
+                    "issues": ["not_settled"],
+                }
+
+    def run(self, from_day: datetime.date, to_day: datetime.date, report_path: str) -> dict:
+        """Reconcile settlement days [from_day, to_day] and write mismatches to report_path."""
+        settled = []
+        with Session(engine) as session, open(report_path, "wb") as report:
+            for batch in self.batches(from_day, to_day):
+                mismatches = compare_batch(batch, self.local_rows(session, batch), self.max_fee_rate)
+                report.writelines(dumps(mismatch) + b"\n" for mismatch in mismatches)
+                settled.append(np.array(batch.ids_of(KIND_PAYMENT), dtype=f"S{ID_WIDTH}"))
+                self.stats["items"] += len(batch.entity_ids)
+                self.stats["mismatches"] += len(mismatches)
+                # rows of a batch are not needed once compared
+                session.expunge_all()
+                logger.info(f"settlement recon: {self.stats}")
+            settled_ids = np.unique(np.concatenate(settled)) if settled else np.zeros(0, f"S{ID_WIDTH}")
+            for mismatch in self.unsettled_payments(settled_ids, from_day, to_day):
+                report.write(dumps(mismatch) + b"\n")
+                self.stats["mismatches"] += 1
+        logger.info(f"settlement recon done: {self.stats}, report {report_path}")
+        return self.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--driver", dest="driver_id", type=int, required=True)
+    parser.add_argument("--from", dest="from_day", type=datetime.date.fromisoformat, required=True)
+    parser.add_argument("--to", dest="to_day", type=datetime.date.fromisoformat, required=True)
+    parser.add_argument("--file", help="read settlement items from an NDJSON file")
+    parser.add_argument("--lag-days", type=int, default=settings.settlement_lag_days)
+    parser.add_argument("-o", "--output", default="settlement_report.ndjson")
+    args = parser.parse_args()
+    source = FileSettlementSource(args.file) if args.file else GatewaySettlementSource(args.driver_id)
+    SettlementReconciler(source, args.driver_id, lag_days=args.lag_days).run(
+        args.from_day, args.to_day, args.output
+    )
@@ -0,0 +1,262 @@
+"""
+incremental columnar snapshots of transactions, refund transactions and payment analytics
+
+Rows changed since the last run are read through a server side cursor by their (updated_at, id)
+watermark and appended as parquet files partitioned by creation day:
+
+    <snapshot root>/<table>/day=YYYY-MM-DD/part-<run>-<n>.parquet
+
+The root is snapshot_dir or, with settings.snapshot_storage "s3", snapshot_bucket. The
+watermarks live in the shared database, so the scheduled job refuses local storage unless
+settings.allow_local_storage is set, the files would only be on the replica running it.
+
+A changed row is written again by a later run, every file carries the run that wrote it in
+_snapshot_run and read_snapshot() keeps only the newest version of each id. Analytics are
+meant to run on these files instead of the production tables.
+
+usage: python -m payment_app.services.snapshot [table ...]
+"""
+import datetime
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Final, Optional
+from urllib.parse import urlparse
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from loguru import logger
+from sqlalchemy import JSON, Boolean, DateTime, Integer, Numeric, and_, func, or_, select
+from sqlmodel import Session
+
+from payment_app.configs.db import engine
+from payment_app.lib.archive_storage import require_shared_storage
+from payment_app.lib.checkpoint import load_checkpoint, save_checkpoint
+from payment_app.lib.errors.error_handler import InternalServerException
+from payment_app.lib.serializer import dumps
+from payment_app.models.payment_analytic import PaymentAnalytic
+from payment_app.models.refund_transactions import RefundTransaction
+from payment_app.models.transaction import Transaction
+from payment_app.models.types import CompressedJSON
+from payment_app.services.export import CROCKFORD, stream_rows
+from payment_app.settings import settings
+
+TABLES: Final = {
+    "transactions": Transaction,
+    "refund_transactions": RefundTransaction,
+    "payment_analytics": PaymentAnalytic,
+}
+CHUNK_SIZE: Final = 20000
+# rows updated within the last seconds are left to the next run, a later update in the same
+# second as the watermark could otherwise sort before it and be skipped
+SNAPSHOT_LAG: Final = 5
+RUN_COLUMN: Final = "_snapshot_run"
+
+
+def arrow_type(column) -> pa.DataType:
+    """Arrow type of a table column, JSON columns are stored as json text."""
+    if isinstance(column.type, (JSON, CompressedJSON)):
+        return pa.string()
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Numeric):
+        return pa.decimal128(column.type.precision or 18, column.type.scale or 2)
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("s")
+    return pa.string()
+
+
+def arrow_schema(model) -> pa.Schema:
+    return pa.schema(
+        [(column.name, arrow_type(column)) for column in model.__table__.columns]
+        + [(RUN_COLUMN, pa.int64())]
+    )
+
+
+def snapshot_filesystem(directory: Optional[str] = None) -> tuple[pafs.FileSystem, str]:
+    """Filesystem and root of the snapshots, directory forces a local root."""
+    if directory or settings.snapshot_storage == "local":
+        return pafs.LocalFileSystem(), os.path.abspath(directory or settings.snapshot_dir)
+    if settings.snapshot_storage == "s3":
+        if not settings.snapshot_bucket:
+            raise InternalServerException(message="snapshot_bucket is not set")
+        if not settings.snapshot_endpoint_url:
+            return pafs.S3FileSystem(), settings.snapshot_bucket
+        endpoint = urlparse(settings.snapshot_endpoint_url)
+        filesystem = pafs.S3FileSystem(endpoint_override=endpoint.netloc, scheme=endpoint.scheme)
+        return filesystem, settings.snapshot_bucket
+    raise InternalServerException(message=f"unknown snapshot storage {settings.snapshot_storage}")
+
+
+def ulid_day(ulid_value: str) -> str:
+    """Creation day (UTC) encoded in a ULID."""
+    millis = 0
+    for char in ulid_value[:10].upper():
+        millis = millis * 32 + CROCKFORD.index(char)
+    return datetime.datetime.utcfromtimestamp(millis / 1000).strftime("%Y-%m-%d")
+
+
+def row_day(table: str, row) -> str:
+    # analytics rows older than their created_at column carry their creation time in the id
+    if table == "payment_analytics":
+        return ulid_day(row["id"])
+    return row["created_at"].strftime("%Y-%m-%d") if row["created_at"] else "unknown"
+
+
+class SnapshotWriter:
+    """Append the rows of one table changed since its watermark to the snapshot."""
+
+    def __init__(self, table: str, directory: Optional[str] = None):
+        self.table = table
+        self.model = TABLES[table]
+        self.filesystem, root = snapshot_filesystem(directory)
+        self.directory = f"{root}/{table}"
+        self.checkpoint_name = f"snapshot:{table}"
+        self.schema = arrow_schema(self.model)
+        self.json_columns = [
+            column.name
+            for column in self.model.__table__.columns
+            if isinstance(column.type, (JSON, CompressedJSON))
+        ]
+        self.run_id = int(time.time() * 1000)
+        self.files = 0
+
+    def statement(self, watermark: Optional[dict], cutoff: datetime.datetime):
+        columns = self.model.__table__.c
+        statement = select(*self.model.__table__.columns)
+        statement = statement.where(columns.updated_at < cutoff)
+        if watermark:
+            updated_at = datetime.datetime.fromisoformat(watermark["updated_at"])
+            statement = statement.where(
+                or_(
+                    columns.updated_at > updated_at,
+                    and_(columns.updated_at == updated_at, columns.id > watermark["id"]),
+                )
+            )
+        return statement.order_by(columns.updated_at, columns.id)
+
+    def watermark_of(self, row) -> dict:
+        return {"updated_at": row["updated_at"].isoformat(), "id": row["id"]}
+
+    def write_chunk(self, rows: list):
+        """Write one chunk as one file per day, renamed into place once complete."""
+        days = defaultdict(list)
+        for row in rows:
+            record = dict(row)
+            for name in self.json_columns:
+                if record[name] is not None:
+                    record[name] = dumps(record[name]).decode()
+            record[RUN_COLUMN] = self.run_id
+            days[row_day(self.table, row)].append(record)
+        for day, records in days.items():
+            directory = f"{self.directory}/day={day}"
+            self.filesystem.create_dir(directory, recursive=True)
+            path = f"{directory}/part-{self.run_id}-{self.files}.parquet"
+            data = pa.Table.from_pylist(records, schema=self.schema)
+            if isinstance(self.filesystem, pafs.LocalFileSystem):
+                # dot files are ignored by readers until the rename
+                temporary = f"{directory}/.part-{self.run_id}-{self.files}.parquet"
+                pq.write_table(data, temporary, compression="zstd", filesystem=self.filesystem)
+                self.filesystem.move(temporary, path)
+            else:
+                # objects only become visible once the upload completes
+                pq.write_table(data, path, compression="zstd", filesystem=self.filesystem)
+            self.files += 1
+
+    def run(self, deadline: Optional[float] = None) -> int:
+        """Snapshot changed rows, return the number written."""
+        written = 0
+        with Session(engine) as session:
+            watermark = load_checkpoint(session, self.checkpoint_name)
+            cutoff = session.execute(select(func.now())).scalar() - datetime.timedelta(
+                seconds=SNAPSHOT_LAG
+            )
+            for rows in stream_rows(self.statement(watermark, cutoff), CHUNK_SIZE):
+                self.write_chunk(rows)
+                written += len(rows)
+                save_checkpoint(session, self.checkpoint_name, self.watermark_of(rows[-1]))
+                if deadline and time.monotonic() >= deadline:
+                    break
+        logger.info(f"snapshot {self.table}: {written} rows in {self.files} files")
+        return written
+
+
+def snapshot_tables(
+    deadline: Optional[float] = None,
+    tables: Optional[list] = None,
+    allow_local: bool = settings.allow_local_storage,
+) -> dict:
+    """Snapshot each table in turn, local storage only when allow_local is set."""
+    require_shared_storage(settings.snapshot_storage, allow_local)
+    stats = {}
+    for table in tables or TABLES:
+        stats[table] = SnapshotWriter(table).run(deadline=deadline)
+        if deadline and time.monotonic() >= deadline:
+            break
+    return stats
+
+
+def read_snapshot(
+    table: str,
+    columns: Optional[list[str]] = None,
+    from_day: Optional[datetime.date] = None,
+    to_day: Optional[datetime.date] = None,
+    filter_expression: Optional[ds.Expression] = None,
+    directory: Optional[str] = None,
+) -> pa.Table:
+    """
+    Latest version of every snapshotted row of table as an arrow table.
+    from_day and to_day (inclusive) prune day partitions before any file is read, a row keeps
+    its day across versions. filter_expression applies to the latest versions only, an older
+    version matching it must not stand in for a newer one that does not.
+    """
+    filesystem, root = snapshot_filesystem(directory)
+    path = f"{root}/{table}"
+    if filesystem.get_file_info(path).type != pafs.FileType.Directory:
+        empty = arrow_schema(TABLES[table]).empty_table()
+        return empty.select(columns) if columns else empty.drop([RUN_COLUMN])
+    dataset = ds.dataset(
+        path,
+        format="parquet",
+        filesystem=filesystem,
+        partitioning=ds.partitioning(pa.schema([("day", pa.string())]), flavor="hive"),
+    )
+    expression = None
+    conditions = []
+    if from_day:
+        conditions.append(ds.field("day") >= from_day.isoformat())
+    if to_day:
+        conditions.append(ds.field("day") <= to_day.isoformat())
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    # the filter may use any column, every column is read when there is one
+    read_columns = None
+    if columns is not None and filter_expression is None:
+        read_columns = list(dict.fromkeys([*columns, "id", RUN_COLUMN]))
+    data = latest_versions(dataset.to_table(columns=read_columns, filter=expression))
+    if filter_expression is not None:
+        data = ds.dataset(data).to_table(filter=filter_expression)
+    return data.select(columns) if columns else data.drop([RUN_COLUMN, "day"])
+
+
+def latest_versions(data: pa.Table) -> pa.Table:
+    """Keep the row written by the newest run for every id."""
+    if data.num_rows == 0:
+        return data
+    data = data.take(
+        pc.sort_indices(data, sort_keys=[("id", "ascending"), (RUN_COLUMN, "descending")])
+    )
+    ids = data.column("id").combine_chunks()
+    first = pc.not_equal(ids.slice(1), ids.slice(0, len(ids) - 1))
+    return data.filter(pa.concat_arrays([pa.array([True]), first]))
+
+
+if __name__ == "__main__":
+    # run by hand the snapshot may go to the local snapshot_dir
+    logger.info(snapshot_tables(tables=sys.argv[1:] or None, allow_local=True))
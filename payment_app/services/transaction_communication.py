@@ -1,8 +1,9 @@
 """
 cron job for hitting callback of client till client recived the information on success or failur
 """
-
+import time
 from datetime import datetime, timedelta
+from typing import Optional
 
 from loguru import logger
 from sqlmodel import Session, select
@@ -11,37 +12,48 @@ from payment_app.configs.db import engine
 from payment_app.handlers.client_callback_handler import (
     client_callback_transaction_handler,
 )
+from payment_app.lib.work_claim import claim_batch, default_owner, release_claims
 from payment_app.models.transaction_communication import TransactionCommunications
 from payment_app.utils import get_driver_name
 
+CLAIM_ENTITY = "transaction_communication"
+# communications are retried until they succeed or were sent this many times
+MAX_COMMUNICATIONS = 50
+
 
-def pick_clients(session):
-    """Pick successful transaction communications."""
+def pick_clients(session, owner: str):
+    """Claim pending transaction communications, rows claimed by another instance are skipped."""
     statement = (
         select(TransactionCommunications)
-        .where(TransactionCommunications.communication_count <= 50)
+        .where(TransactionCommunications.communication_count <= MAX_COMMUNICATIONS)
         .where(TransactionCommunications.status != "success")
     ).order_by(TransactionCommunications.created_at.desc()).limit(50)
-    results = session.exec(statement)
-    return results
+    return claim_batch(session, CLAIM_ENTITY, statement, TransactionCommunications, owner)
 
 
-def communicate_with_client():
-    """Handle client callbacks."""
+def communicate_with_client(deadline: Optional[float] = None):
+    """Handle client callbacks, stops once the time.monotonic() deadline has passed."""
+    owner = default_owner()
     with Session(engine) as session:
         logger.info("clients")
-        clients = pick_clients(session)
-        for client in clients:
-            logger.info(client)
-            client_callback_transaction_handler(
-                session,
-                {
-                    "event": client.event,
-                    "transaction": client.transaction,
-                    "driver": get_driver_name(client.transaction.driver),
-                },
-            )
-
+        clients = pick_clients(session, owner)
+        communication_ids = [client.id for client in clients]
+        try:
+            for client in clients:
+                if deadline and time.monotonic() >= deadline:
+                    # unsent rows are released below and picked up by the next run
+                    break
+                logger.info(client)
+                client_callback_transaction_handler(
+                    session,
+                    {
+                        "event": client.event,
+                        "transaction": client.transaction,
+                        "driver": get_driver_name(client.transaction.driver),
+                    },
+                )
+        finally:
+            release_claims(session, CLAIM_ENTITY, communication_ids, owner)
 
 
 if __name__ == "__main__":
@@ -6,6 +6,59 @@ class Settings(BaseSettings):
     openapi_url: str = None
     docs_url: str = None
     redoc_url: str = None
+    # background reconciliation
+    reconcile_workers: int = 8
+    reconcile_batch_size: int = 200
+    gateway_rate_limit: float = 10
+    refund_sync_max_refunds: int = 5000
+    # refunds unknown to the gateway are issued again after this many seconds, failed after days
+    refund_retry_after: float = 3600
+    refund_fail_after_days: int = 7
+    # seconds a claimed row stays hidden from other workers, see lib.work_claim
+    claim_ttl: float = 600
+    # callbacks per second sent to one client by bulk resends
+    client_callback_rate_limit: float = 5
+    # embedded job scheduler, see services.scheduled_jobs
+    scheduler_enabled: bool = False
+    scheduler_tick: float = 5
+    # scheduled jobs writing files (snapshots, archives) refuse local storage unless set, the
+    # files would only exist on the disk of the replica that happened to run the job
+    allow_local_storage: bool = False
+
+    # list endpoint totals, see lib.totals
+    total_cache_ttl: float = 30
+    total_estimate_threshold: int = 1000000
+    # widest created_at range of a transaction search without store or client filter
+    search_max_range_days: int = 31
+    # parquet snapshots of the payment tables, see services.snapshot, storage is "local"
+    # (snapshot_dir) or "s3" (snapshot_bucket, any S3 compatible endpoint)
+    snapshot_storage: str = "local"
+    snapshot_dir: str = "snapshots"
+    snapshot_bucket: str = None
+    snapshot_endpoint_url: str = None
+    # days of transaction and refund rollups recomputed by the daily rebuild
+    rollup_rebuild_days: int = 2
+    # seconds the payments of a window are kept for failure analytics
+    failure_analytics_cache_ttl: float = 300
+    # settlement reconciliation, days a payment may take to settle and highest expected fee rate
+    settlement_lag_days: int = 3
+    settlement_max_fee_rate: float = 0.03
+    # months of rows kept per table before the archive job moves them to archive storage,
+    # storage is "local" (archive_dir) or "s3" (archive_bucket, any S3 compatible endpoint)
+    archive_retention_months: dict[str, int] = {
+        "transaction_callbacks": 6,
+        "transaction_communications": 3,
+    }
+    archive_storage: str = "local"
+    archive_dir: str = "archive"
+    archive_bucket: str = None
+    archive_endpoint_url: str = None
+    # finalized transactions not updated for this many months move to the cold archive in
+    # archive storage, cold_archive_dir holds the local copies read by lookups and replicas
+    # list new segments every cold_archive_refresh seconds
+    cold_archive_months: int = 12
+    cold_archive_dir: str = "cold_archive"
+    cold_archive_refresh: float = 60
 
     class Config:
         """Config class"""
@@ -61,6 +61,7 @@ class TestApiV1(unittest.TestCase):
         session.refresh(refund_transaction)
 
         self.transactionId = transaction.id
+        self.storeId = transaction.store_id
         self.refundTransactionId = refund_transaction.id
 
     """
@@ -88,6 +89,59 @@ class TestApiV1(unittest.TestCase):
         assert isinstance(response.json()["results"], list) 
         assert response.json()["total"] == 1
 
+    def test_get_transactions_with_cursor(self):
+        response = client.get("/admin/v1/get_transactions?limit=1&ordering=-created_at", headers={"x-api-key": x_api_key})
+        assert response.status_code == 200
+        assert len(response.json()["results"]) == 1
+        next_cursor = response.json()["next_cursor"]
+        assert next_cursor
+        response = client.get(f"/admin/v1/get_transactions?limit=1&ordering=-created_at&cursor={next_cursor}", headers={"x-api-key": x_api_key})
+        assert response.status_code == 200
+        assert response.json()["results"] == []
+        assert response.json()["next_cursor"] is None
+
+    def test_get_transactions_with_invalid_ordering(self):
+        response = client.get("/admin/v1/get_transactions?page=1&limit=10&ordering=amount", headers={"x-api-key": x_api_key})
+        assert response.status_code == 422
+
+    def test_get_transactions_defers_json_columns(self):
+        response = client.get("/admin/v1/get_transactions?limit=10", headers={"x-api-key": x_api_key})
+        assert response.status_code == 200
+        assert "api_response" not in response.json()["results"][0]
+        response = client.get("/admin/v1/get_transactions?limit=10&expand=api_response", headers={"x-api-key": x_api_key})
+        assert "api_response" in response.json()["results"][0]
+
+    def test_get_transactions_with_fields(self):
+        response = client.get("/admin/v1/get_transactions?limit=10&fields=id,amount,status", headers={"x-api-key": x_api_key})
+        assert response.status_code == 200
+        assert set(response.json()["results"][0]) == {"id", "amount", "status"}
+        response = client.get("/admin/v1/get_transactions?limit=10&fields=id,unknown", headers={"x-api-key": x_api_key})
+        assert response.status_code == 422
+
+    def test_search_transactions_by_store(self):
+        response = client.get(f"/admin/v1/search_transactions?store_id={self.storeId}&status=pending", headers={"x-api-key": x_api_key})
+        assert response.status_code == 200
+        assert len(response.json()["results"]) == 1
+        assert response.json()["total"] == 1
+
+    def test_search_transactions_without_selective_filter(self):
+        response = client.get("/admin/v1/search_transactions?status=failed", headers={"x-api-key": x_api_key})
+        assert response.status_code == 422
+
+    def test_export_transactions(self):
+        response = client.get(f"/admin/v1/export/transactions?created_from=2000-01-01T00:00:00&created_to=2100-01-01T00:00:00&store_id={self.storeId}", headers={"x-api-key": x_api_key})
+        assert response.status_code == 200
+        assert len(response.text.splitlines()) == 1
+        response = client.get("/admin/v1/export/refund_transactions?created_from=2000-01-01T00:00:00&created_to=2100-01-01T00:00:00&driver=1", headers={"x-api-key": x_api_key})
+        assert response.status_code == 422
+
+    def test_transaction_summary(self):
+        response = client.get(f"/admin/v1/summary/transactions?from_day=2000-01-01&to_day=2100-01-01&store_id={self.storeId}&group_by=status", headers={"x-api-key": x_api_key})
+        assert response.status_code == 200
+        assert response.json()["results"] == [{"status": "pending", "count": 1, "amount": 10.0}]
+        response = client.get("/admin/v1/summary/refunds?from_day=2000-01-01&to_day=2100-01-01&group_by=payment_type", headers={"x-api-key": x_api_key})
+        assert response.status_code == 422
+
     def test_get_transaction_with_invalid_id(self):
         response = client.get("/admin/v1/get_transaction/12312312", headers={"x-api-key": x_api_key})
         assert response.json()["error_code"] == 404
@@ -0,0 +1,48 @@
+import datetime
+import gzip
+
+from payment_app.lib.archive_storage import LocalStorage, MemoryStorage
+from payment_app.services.archive import TableArchiver, add_months, month_range, retention_cutoff
+from payment_app.services.export import encode_ndjson, gzip_stream
+
+
+def test_add_months_crosses_years():
+    assert add_months(datetime.date(2022, 11, 15), 3) == datetime.date(2023, 2, 1)
+    assert add_months(datetime.date(2022, 1, 31), -1) == datetime.date(2021, 12, 1)
+
+
+def test_retention_cutoff_keeps_whole_months():
+    assert retention_cutoff(6, datetime.date(2022, 3, 20)) == datetime.date(2021, 9, 1)
+    assert month_range(datetime.date(2021, 12, 1)) == (
+        datetime.datetime(2021, 12, 1), datetime.datetime(2022, 1, 1)
+    )
+
+
+def test_local_storage_writes_complete_files(tmp_path):
+    storage = LocalStorage(str(tmp_path))
+    chunks = gzip_stream(encode_ndjson([[{"id": 1}, {"id": 2}], [{"id": 3}]]))
+    key = "transaction_callbacks/2022-01/part-1.ndjson.gz"
+    size = storage.write(key, chunks)
+
+    assert size == (tmp_path / key).stat().st_size
+    assert gzip.decompress(storage.read(key)) == b'{"id":1}\n{"id":2}\n{"id":3}\n'
+    assert [path.name for path in (tmp_path / "transaction_callbacks/2022-01").iterdir()] == [
+        "part-1.ndjson.gz"
+    ]
+
+
+def test_memory_storage():
+    storage = MemoryStorage()
+    assert storage.write("a/b", [b"x", b"y"]) == 2
+    assert storage.read("a/b") == b"xy"
+
+
+def test_communications_are_archived_once_done():
+    archiver = TableArchiver("transaction_communications", MemoryStorage(), 3)
+    sql = str(archiver.month_statement(datetime.date(2022, 1, 1)))
+    assert "transaction_communications.status = " in sql
+    assert "transaction_communications.communication_count > " in sql
+
+    archiver = TableArchiver("transaction_callbacks", MemoryStorage(), 6)
+    where = str(archiver.month_statement(datetime.date(2022, 1, 1))).split("WHERE")[1]
+    assert "status" not in where
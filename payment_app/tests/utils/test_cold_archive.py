@@ -0,0 +1,60 @@
+import datetime
+from decimal import Decimal
+
+from payment_app.lib.archive_storage import MemoryStorage
+from payment_app.lib.segment_store import SegmentWriter, publish_segment
+from payment_app.services.cold_archive import (
+    INDEXES,
+    PREFIX,
+    MAX_MERGE_SIZE,
+    ColdArchive,
+    encode_record,
+    merge_groups,
+    record_keys,
+)
+
+
+def test_archived_rows_round_trip(tmp_path):
+    transaction = {
+        "id": "01GE4A4E7GNE05TSTV7359X5MK",
+        "source_id": "order-1",
+        "gateway_order_id": "order_KNffB1CDl3a9Ex",
+        "gateway_payment_id": "pay_KNffH8ubvcYxRg",
+        "status": "success",
+        "amount": Decimal("245.10"),
+        "api_response": {"id": "order_KNffB1CDl3a9Ex"},
+        "created_at": datetime.datetime(2021, 3, 1, 10, 30),
+    }
+    refund = {
+        "id": "01GE4JR5BFRHD06G9AGWRTC22E",
+        "transaction_id": transaction["id"],
+        "refund_id": "rfnd_KNiEDViGF5gtB3",
+        "status": "success",
+        "amount": Decimal("10.00"),
+    }
+    storage = MemoryStorage()
+    writer = SegmentWriter(str(tmp_path / "staging"), "0001", INDEXES)
+    writer.add(encode_record(transaction, [refund], None), record_keys(transaction, [refund]))
+    writer.close()
+    publish_segment(storage, PREFIX, str(tmp_path / "staging"), "0001")
+    archive = ColdArchive(storage, str(tmp_path / "cache"))
+
+    archived = archive.get_transaction(transaction["id"])
+    assert archived.amount == Decimal("245.10")
+    assert archived.created_at == datetime.datetime(2021, 3, 1, 10, 30)
+    assert archived.api_response == {"id": "order_KNffB1CDl3a9Ex"}
+    assert [row.id for row in archive.transactions_by("source_id", "order-1")] == [transaction["id"]]
+    assert archive.get_refund("refund_id", "rfnd_KNiEDViGF5gtB3").amount == Decimal("10.00")
+    assert archive.get_refund("id", refund["id"]).transaction_id == transaction["id"]
+    assert archive.get_transaction("unknown") is None
+
+
+def test_merge_groups_of_similar_size():
+    sizes = {f"{number:04d}": 5000 for number in range(9)}
+    sizes["0100"] = 20000
+    sizes["0101"] = MAX_MERGE_SIZE
+
+    assert merge_groups(sizes) == [
+        ["0000", "0001", "0002", "0003"], ["0004", "0005", "0006", "0007"]
+    ]
+    assert merge_groups({"0000": 5000, "0001": 20000, "0002": 80000, "0003": 320000}) == []
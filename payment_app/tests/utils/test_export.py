@@ -0,0 +1,30 @@
+import datetime
+import gzip
+import json
+
+from payment_app.services.export import encode_csv, encode_ndjson, gzip_stream, ulid_floor
+
+
+def test_encode_ndjson():
+    chunks = [[{"id": "a", "amount": 1}], [{"id": "b", "amount": 2}]]
+    lines = b"".join(encode_ndjson(chunks)).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == ["a", "b"]
+
+
+def test_encode_csv_writes_json_columns_as_text():
+    chunks = [[{"id": "a", "notes": {"store": "1"}, "status": None}]]
+    data = b"".join(encode_csv(chunks, ["id", "notes", "status"])).decode()
+    assert data.splitlines() == ["id,notes,status", 'a,"{""store"":""1""}",']
+
+
+def test_gzip_stream_round_trip():
+    data = [b"first\n", b"second\n"]
+    assert gzip.decompress(b"".join(gzip_stream(data))) == b"first\nsecond\n"
+
+
+def test_ulid_floor_orders_by_time():
+    earlier = ulid_floor(datetime.datetime(2022, 3, 1))
+    later = ulid_floor(datetime.datetime(2022, 4, 1))
+    assert len(earlier) == 26
+    assert earlier < later
+    assert ulid_floor(datetime.datetime(1970, 1, 1)) == "0" * 26
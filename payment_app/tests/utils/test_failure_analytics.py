@@ -0,0 +1,73 @@
+import datetime
+from unittest.mock import patch
+
+from payment_app.services.failure_analytics import (
+    PaymentColumns,
+    load_payments,
+    rates_by,
+    summary,
+    top_failure_reasons,
+    trend,
+)
+
+
+def payment(moment, status, method, reason=None):
+    return {
+        "payment_created_at": moment,
+        "razorpay_status": status,
+        "payment_method": method,
+        "card_network": None,
+        "issuer": None,
+        "step": None,
+        "reason": reason,
+        "store_id": "store",
+    }
+
+
+def payments():
+    columns = PaymentColumns()
+    columns.add([
+        payment(datetime.datetime(2022, 3, 1, 10), "captured", "upi"),
+        payment(datetime.datetime(2022, 3, 1, 10, 30), "failed", "upi", "bank declined"),
+        payment(datetime.datetime(2022, 3, 1, 11), "failed", "card", "bank declined"),
+    ])
+    columns.add([payment(datetime.datetime(2022, 3, 1, 11, 5), "failed", "card", "timeout")])
+    return columns.finish()
+
+
+def test_payments_are_timed_by_gateway_creation():
+    moment = datetime.datetime(2022, 3, 1, 10, 30)
+    columns = PaymentColumns()
+    columns.add([payment(moment, "failed", "upi")])
+    millis = columns.finish().columns["millis"]
+    assert millis[0] == int(moment.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+
+
+def test_rates_by_method():
+    rates = {row["value"]: row for row in rates_by(payments(), "payment_method")}
+    assert rates["upi"]["success_rate"] == 0.5
+    assert rates["card"]["failed"] == 2
+    assert summary(payments())["success"] == 1
+
+
+def test_top_failure_reasons():
+    reasons = top_failure_reasons(payments())
+    assert reasons[0] == {"reason": "bank declined", "count": 2, "share": 0.6667}
+
+
+def test_trend_by_hour():
+    buckets = trend(payments(), "hour")
+    assert [row["payments"] for row in buckets] == [2, 2]
+    assert buckets[1]["bucket_start"] == "2022-03-01T11:00:00"
+
+
+@patch("payment_app.services.failure_analytics.stream_rows", return_value=[])
+def test_load_payments_windows_on_gateway_creation(stream_rows):
+    ist = datetime.timezone(datetime.timedelta(hours=5, minutes=30))
+    load_payments(datetime.datetime(2022, 3, 1, 15, 30, tzinfo=ist), datetime.datetime(2022, 3, 2))
+
+    statement = stream_rows.call_args.args[0]
+    sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+    # repaired rows are inserted long after their payment, the ULID id is not their time
+    assert "payment_analytics.payment_created_at >= '2022-03-01 10:00:00'" in sql
+    assert "payment_analytics.payment_created_at < '2022-03-02 00:00:00'" in sql
@@ -0,0 +1,23 @@
+import datetime
+
+import pytest
+
+from payment_app.lib.errors import UnprocessableEntity
+from payment_app.lib.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    created_at = datetime.datetime(2023, 1, 2, 3, 4, 5)
+    cursor = encode_cursor("-created_at", created_at, "01GS9HDEQSG4CJMFQ0MA3KPVKD")
+    assert decode_cursor(cursor, "-created_at") == (created_at, "01GS9HDEQSG4CJMFQ0MA3KPVKD")
+
+
+def test_cursor_of_other_ordering():
+    cursor = encode_cursor("-created_at", datetime.datetime(2023, 1, 2), "id")
+    with pytest.raises(UnprocessableEntity):
+        decode_cursor(cursor, "updated_at")
+
+
+def test_invalid_cursor():
+    with pytest.raises(UnprocessableEntity):
+        decode_cursor("not a cursor", "-created_at")
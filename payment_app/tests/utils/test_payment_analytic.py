@@ -0,0 +1,65 @@
+import datetime
+from unittest.mock import Mock, patch
+
+import requests
+from razorpay.errors import BadRequestError, GatewayError, ServerError
+
+from payment_app.services.payment_analytic import (
+    PaymentAnalyticBackfill,
+    analytic_row,
+    is_transient,
+)
+
+
+def test_analytic_row_card_payment():
+    row = analytic_row("txn_1", "failed", {
+        "id": "pay_1",
+        "order_id": "order_1",
+        "status": "failed",
+        "method": "card",
+        "error_step": "payment_authentication",
+        "error_description": "Payment failed",
+        "card": {"id": "card_1", "name": "", "network": "Visa", "type": "credit", "issuer": "HDFC"},
+        "created_at": 1646128800,
+    })
+    assert row["payment_id"] == "pay_1"
+    assert row["transaction_id"] == "txn_1"
+    assert row["card_network"] == "Visa"
+    assert row["issuer"] == "HDFC"
+    assert row["step"] == "payment_authentication"
+    assert row["payment_created_at"] == datetime.datetime(2022, 3, 1, 10)
+
+
+def test_analytic_row_upi_payment():
+    row = analytic_row("txn_1", "success", {
+        "id": "pay_2",
+        "order_id": "order_1",
+        "status": "captured",
+        "method": "upi",
+        "error_step": None,
+        "error_description": None,
+    })
+    assert row["payment_method"] == "upi"
+    assert row["card_id"] == ""
+    assert row["payment_created_at"] is None
+
+
+def test_is_transient():
+    assert is_transient(ServerError("Internal server error"))
+    assert is_transient(requests.Timeout())
+    assert is_transient(requests.ConnectionError())
+    assert is_transient(BadRequestError("Too many requests"))
+    assert not is_transient(BadRequestError("The id provided does not exist"))
+    assert not is_transient(GatewayError("Payment failed"))
+    assert not is_transient(KeyError("items"))
+
+
+@patch("payment_app.services.payment_analytic.toml.load", Mock(return_value={"gateway": []}))
+def test_pick_transactions_skips_transactions_with_analytics():
+    session = Mock()
+    PaymentAnalyticBackfill().pick_transactions(session, {"id": "01GE4A4E7GNE05TSTV7359X5MK"})
+
+    statement = session.exec.call_args.args[0]
+    sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+    assert "NOT (EXISTS (SELECT *" in sql
+    assert "payment_analytics.transaction_id = transactions.id" in sql
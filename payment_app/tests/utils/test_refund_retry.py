@@ -0,0 +1,78 @@
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+from payment_app.drivers.razorpay_driver import RazorpayDriver
+from payment_app.models.refund_transactions import RefundTransaction
+from payment_app.services.refund_retry import RefundSynchroniser
+
+
+def refund_request():
+    return RefundTransaction(
+        id="01GE4JR5BFRHD06G9AGWRTC22E",
+        transaction_id="01GE4A4E7GNE05TSTV7359X5MK",
+        status="pending",
+        amount=Decimal("10.00"),
+        # stored by RazorpayDriver.refund_payment
+        api_request={
+            "payment_id": "pay_KNffH8ubvcYxRg",
+            "amount": 1000,
+            "notes": {"transaction_id": "01GE4A4E7GNE05TSTV7359X5MK"},
+            "receipt": "receipt-1",
+        },
+    )
+
+
+@patch("payment_app.drivers.razorpay_driver.apply_refund_change")
+def test_retry_refunds_issues_the_stored_request(apply_refund_change):
+    driver = RazorpayDriver(Mock(), None, "key_id", "key_secret", "webhook_secret")
+    driver.client = Mock()
+    driver.client.payment.refund.return_value = {"id": "rfnd_KNiEDViGF5gtB3", "amount": 1000}
+    payment_service = SimpleNamespace(gateway_id=1, retry_refund=driver.retry_refund)
+    refund = refund_request()
+    synchroniser = RefundSynchroniser()
+
+    synchroniser.retry_refunds([(payment_service, refund)])
+
+    driver.client.payment.refund.assert_called_once_with(
+        "pay_KNffH8ubvcYxRg",
+        {
+            "amount": 1000,
+            "notes": {"transaction_id": "01GE4A4E7GNE05TSTV7359X5MK"},
+            "receipt": "receipt-1",
+        },
+    )
+    assert refund.refund_id == "rfnd_KNiEDViGF5gtB3"
+    assert synchroniser.stats["retried"] == 1
+    assert synchroniser.stats["errors"] == 0
+    apply_refund_change.assert_called_once()
+
+
+@patch("payment_app.drivers.razorpay_driver.apply_refund_change")
+def test_retry_refunds_counts_gateway_errors(apply_refund_change):
+    driver = RazorpayDriver(Mock(), None, "key_id", "key_secret", "webhook_secret")
+    driver.client = Mock()
+    driver.client.payment.refund.side_effect = Exception("payment already refunded")
+    payment_service = SimpleNamespace(gateway_id=1, retry_refund=driver.retry_refund)
+    synchroniser = RefundSynchroniser()
+
+    synchroniser.retry_refunds([(payment_service, refund_request())])
+
+    assert synchroniser.stats["retried"] == 0
+    assert synchroniser.stats["errors"] == 1
+    apply_refund_change.assert_not_called()
+
+
+@patch("payment_app.services.refund_retry.save_checkpoint")
+@patch("payment_app.services.refund_retry.load_checkpoint")
+def test_save_cursor_only_moves_forward(load_checkpoint, save_checkpoint):
+    synchroniser = RefundSynchroniser()
+    load_checkpoint.return_value = {"created_at": "2022-03-02T10:00:00", "id": "b"}
+
+    synchroniser.save_cursor(Mock(), {"created_at": "2022-03-02T10:00:00", "id": "a"})
+    save_checkpoint.assert_not_called()
+
+    cursor = {"created_at": "2022-03-02T10:00:00", "id": "c"}
+    synchroniser.save_cursor(Mock(), cursor)
+    save_checkpoint.assert_called_once()
+    assert save_checkpoint.call_args.args[2] == cursor
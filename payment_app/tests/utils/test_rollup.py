@@ -0,0 +1,25 @@
+import datetime
+from unittest.mock import Mock, patch
+
+import pytest
+
+from payment_app.lib.errors.error_handler import UnprocessableEntity
+from payment_app.services.archive import add_months
+from payment_app.services.rollup import rebuild_cutoff, rebuild_day, rebuild_rollups
+
+
+def test_rebuild_day_refuses_archived_days():
+    session = Mock()
+    with pytest.raises(UnprocessableEntity):
+        rebuild_day(session, rebuild_cutoff() - datetime.timedelta(days=1))
+    session.execute.assert_not_called()
+
+    rebuild_day(session, rebuild_cutoff())
+    session.commit.assert_called_once()
+
+
+@patch("payment_app.services.rollup.Session")
+def test_rebuild_rollups_refuses_ranges_before_cutoff(session_class):
+    with pytest.raises(UnprocessableEntity):
+        rebuild_rollups(add_months(rebuild_cutoff(), -1), datetime.date.today())
+    session_class.assert_not_called()
@@ -0,0 +1,110 @@
+import os
+
+from payment_app.lib.archive_storage import MemoryStorage
+from payment_app.lib.segment_store import (
+    KEY_WIDTH,
+    Segment,
+    SegmentStore,
+    SegmentWriter,
+    merge_segments,
+    publish_segment,
+    unpublish_segments,
+)
+
+
+def write_segment(storage, directory, name, records):
+    writer = SegmentWriter(directory, name, ("id", "source_id"))
+    for record_id, source_id in records:
+        writer.add(f"{record_id}:{source_id}".encode(), {"id": [record_id], "source_id": [source_id]})
+    count = writer.close()
+    publish_segment(storage, "segments", directory, name)
+    return count
+
+
+def test_find_by_sorted_index(tmp_path):
+    storage, directory = MemoryStorage(), str(tmp_path / "staging")
+    assert write_segment(storage, directory, "0001", [("c", "s1"), ("a", "s2"), ("b", "s1")]) == 3
+    store = SegmentStore(storage, "segments", str(tmp_path / "cache"))
+
+    assert store.find("id", "a") == [b"a:s2"]
+    assert sorted(store.find("source_id", "s1")) == [b"b:s1", b"c:s1"]
+    assert store.find("id", "missing") == []
+    assert not [name for name in os.listdir(directory) if name.startswith(".")]
+    assert sorted(storage.objects) == [
+        "segments/0001.data", "segments/0001.id.idx", "segments/0001.source_id.idx"
+    ]
+
+
+def test_new_segments_are_picked_up(tmp_path):
+    storage, directory = MemoryStorage(), str(tmp_path / "staging")
+    store = SegmentStore(storage, "segments", str(tmp_path / "cache"), refresh=0)
+    assert store.find("id", "a") == []
+
+    write_segment(storage, directory, "0001", [("a", "s1")])
+    write_segment(storage, directory, "0002", [("a", "s1")])
+    # newest segment first
+    assert store.find("id", "a") == [b"a:s1", b"a:s1"]
+
+
+def test_listing_is_refreshed_after_interval(tmp_path):
+    storage, directory = MemoryStorage(), str(tmp_path / "staging")
+    store = SegmentStore(storage, "segments", str(tmp_path / "cache"), refresh=3600)
+    write_segment(storage, directory, "0001", [("a", "s1")])
+    assert store.find("id", "a") == [b"a:s1"]
+
+    write_segment(storage, directory, "0002", [("b", "s1")])
+    assert store.find("id", "b") == []
+    store.listed_at = None
+    assert store.find("id", "b") == [b"b:s1"]
+
+
+def test_removed_segments_are_closed(tmp_path):
+    storage, directory = MemoryStorage(), str(tmp_path / "staging")
+    cache = tmp_path / "cache"
+    store = SegmentStore(storage, "segments", str(cache), refresh=0)
+    write_segment(storage, directory, "0001", [("a", "s1")])
+    segment = store.acquire()[0]
+    store.release([segment])
+
+    for key in list(storage.objects):
+        storage.delete(key)
+    assert store.find("id", "a") == []
+    assert segment.maps == [] and segment.indexes == {}
+    assert not list(cache.iterdir())
+
+
+def test_merged_segment_replaces_its_parts(tmp_path):
+    storage, directory = MemoryStorage(), str(tmp_path / "staging")
+    store = SegmentStore(storage, "segments", str(tmp_path / "cache"), refresh=0)
+    write_segment(storage, directory, "0001", [("b", "s1"), ("c", "s2")])
+    write_segment(storage, directory, "0002", [("a", "s1")])
+    writer = SegmentWriter(directory, "0003", ("id", "source_id"))
+    writer.close()
+    parts = [Segment(directory, name) for name in ("0001", "0002", "0003")]
+
+    merge_segments(parts, directory, "0003-m1")
+    publish_segment(storage, "segments", directory, "0003-m1")
+    unpublish_segments(storage, "segments", ("0001", "0002", "0003"))
+
+    assert [segment.name for segment in store.acquire()] == ["0003-m1"]
+    assert sorted(store.find("source_id", "s1")) == [b"a:s1", b"b:s1"]
+    assert store.find("id", "c") == [b"c:s2"]
+    assert store.find("id", "d") == []
+
+
+def test_long_keys_are_truncated(tmp_path):
+    storage, directory = MemoryStorage(), str(tmp_path / "staging")
+    long_key = "x" * (KEY_WIDTH + 10)
+    write_segment(storage, directory, "0001", [(long_key, None), ("x" * KEY_WIDTH + "y", None)])
+    store = SegmentStore(storage, "segments", str(tmp_path / "cache"))
+
+    assert len(store.find("id", long_key)) == 2
+
+
+def test_aborted_segment_is_not_published(tmp_path):
+    directory = str(tmp_path / "staging")
+    writer = SegmentWriter(directory, "0001", ("id",))
+    writer.add(b"a", {"id": ["a"]})
+    writer.abort()
+
+    assert not os.listdir(directory)
@@ -0,0 +1,30 @@
+import datetime
+from decimal import Decimal
+
+from payment_app.lib.serializer import dumps, loads
+from payment_app.models import Transaction
+
+
+def test_dumps_decimal_and_datetime():
+    result = loads(dumps({
+        "amount": Decimal("10.50"),
+        "created_at": datetime.datetime(2023, 1, 2, 3, 4, 5),
+    }))
+    assert result == {"amount": 10.5, "created_at": "2023-01-02T03:04:05"}
+
+
+def test_dumps_model_with_json_columns():
+    transaction = Transaction(
+        id="01GS9HDEQSG4CJMFQ0MA3KPVKD",
+        amount=Decimal("10.00"),
+        total_amount=Decimal("10.00"),
+        source_id="source",
+        payment_type="link",
+        store_id="63",
+        api_version=1,
+        api_response={"id": "order_1", "notes": {"store_id": "63"}},
+    )
+    result = loads(dumps({"results": [transaction]}))
+    assert result["results"][0]["id"] == "01GS9HDEQSG4CJMFQ0MA3KPVKD"
+    assert result["results"][0]["amount"] == 10.0
+    assert result["results"][0]["api_response"]["notes"]["store_id"] == "63"
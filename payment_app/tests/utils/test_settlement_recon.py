@@ -0,0 +1,47 @@
+from payment_app.services.settlement_recon import SettlementBatch, compare_batch, to_paise
+
+
+def item(entity_id, kind, amount, fee, credit=0, debit=0):
+    return {
+        "entity_id": entity_id,
+        "type": kind,
+        "amount": amount,
+        "fee": fee,
+        "credit": credit,
+        "debit": debit,
+        "settlement_id": "setl_1",
+    }
+
+
+def test_to_paise():
+    assert to_paise("10.05") == 1005
+    assert to_paise(None) == 0
+
+
+def test_compare_batch():
+    batch = SettlementBatch([
+        item("pay_ok", "payment", 10000, 236, credit=9764),
+        item("pay_amount", "payment", 10000, 236, credit=9764),
+        item("pay_unknown", "payment", 500, 12, credit=488),
+        item("rfnd_ok", "refund", 5000, 0, debit=5000),
+        item("rfnd_net", "refund", 5000, 0, debit=4000),
+        item("adj_1", "adjustment", 100, 0, credit=100),
+    ])
+    local = {
+        "pay_ok": (10000, "success"),
+        "pay_amount": (9000, "success"),
+        "rfnd_ok": (5000, "success"),
+        "rfnd_net": (5000, "pending"),
+    }
+    mismatches = {row["entity_id"]: row["issues"] for row in compare_batch(batch, local, 0.03)}
+    assert mismatches == {
+        "pay_amount": ["amount_mismatch"],
+        "pay_unknown": ["missing_local"],
+        "rfnd_net": ["status_mismatch", "net_mismatch"],
+    }
+
+
+def test_compare_batch_flags_high_fees():
+    batch = SettlementBatch([item("pay_fee", "payment", 1000, 100, credit=900)])
+    mismatches = compare_batch(batch, {"pay_fee": (1000, "success")}, 0.03)
+    assert mismatches[0]["issues"] == ["fee_excess"]
@@ -0,0 +1,24 @@
+from payment_app.lib.totals import count_total
+
+
+class CountingQuery:
+    def __init__(self, total):
+        self.total = total
+        self.calls = 0
+
+    def count(self):
+        self.calls += 1
+        return self.total
+
+
+def test_count_total_is_cached():
+    query = CountingQuery(3)
+    assert count_total(None, query, ("test_totals", "cached")) == (3, True)
+    query.total = 4
+    assert count_total(None, query, ("test_totals", "cached")) == (3, True)
+    assert query.calls == 1
+
+
+def test_count_total_keys_are_separate():
+    assert count_total(None, CountingQuery(1), ("test_totals", "a")) == (1, True)
+    assert count_total(None, CountingQuery(2), ("test_totals", "b")) == (2, True)
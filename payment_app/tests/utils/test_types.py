@@ -0,0 +1,64 @@
+import struct
+import zlib
+from decimal import Decimal
+
+from payment_app.models.dictionaries import DICTIONARIES
+from payment_app.models.types import (
+    DictionaryCompressedJSON,
+    compress_json,
+    decompress_json,
+    dictionary_compress,
+    dictionary_decompress,
+    train_dictionary,
+)
+
+WEBHOOK = {
+    "entity": "event",
+    "event": "payment.captured",
+    "contains": ["payment"],
+    "payload": {"payment": {"entity": {"id": "pay_1", "amount": 100, "status": "captured"}}},
+}
+
+
+def test_compressed_json_round_trip():
+    value = {"id": "pay_1", "amount": Decimal("10.50"), "notes": {"store_id": "S1"}}
+    assert decompress_json(compress_json(value)) == {
+        "id": "pay_1", "amount": 10.5, "notes": {"store_id": "S1"}
+    }
+
+
+def test_compressed_json_matches_mysql_format():
+    data = compress_json([1, 2])
+    assert struct.unpack("<I", data[:4])[0] == len(b"[1,2]")
+    assert zlib.decompress(data[4:]) == b"[1,2]"
+    assert decompress_json(None) is None
+
+
+def test_dictionary_compressed_json_round_trip():
+    column_type = DictionaryCompressedJSON("callback")
+    value = column_type.process_bind_param(WEBHOOK, None)
+    assert value[0] == max(DICTIONARIES["callback"])
+    assert column_type.process_result_value(value, None) == WEBHOOK
+    assert column_type.process_result_value(None, None) is None
+
+
+def test_dictionary_decompress_reads_migrated_rows():
+    migrated = b"\x00" + compress_json(WEBHOOK)
+    assert DictionaryCompressedJSON("callback").process_result_value(migrated, None) == WEBHOOK
+
+
+def test_dictionary_compresses_better_than_plain_zlib():
+    data = b'{"event":"payment.failed","payload":{"payment":{"entity":{"status":"failed"}}}}'
+    dictionary = DICTIONARIES["callback"][1]
+    compressed = dictionary_compress(data, 1, dictionary)
+    assert dictionary_decompress(compressed, {1: dictionary}) == data
+    assert len(compressed) < len(zlib.compress(data))
+
+
+def test_train_dictionary_keeps_shared_fragments():
+    samples = [b'{"status":"captured","id":"a"}', b'{"status":"failed","id":"b"}']
+    dictionary = train_dictionary(samples)
+    assert b'"status":' in dictionary and b'"id":' in dictionary
+    assert b'"captured"' not in dictionary
+    # the most valuable fragment comes last
+    assert dictionary.endswith(b'"status":')
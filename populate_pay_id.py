@@ -1,25 +1,31 @@
-from sqlmodel import Session, select
+from sqlalchemy import func, update
+from sqlmodel import col
+
+from payment_app.lib.backfill import Backfill, run_backfill
 from payment_app.models.transaction import Transaction
-from payment_app.configs.db import engine
-
-
-def populate_payment_id():
-    count = 0 
-    with Session(engine) as session:
-        statement = select(Transaction)
-        transaction = session.exec(statement)
-        for tran in transaction:
-            rep = tran.api_response
-            try:
-                if rep and 'pay' in rep['id']:
-                    count = count + 1
-                    print(rep['id'])
-                    tran.gateway_payment_id = rep['id']
-                    session.add(tran)
-            except:
-                print(rep)
-        print(count)
-        session.commit()
-
-
-populate_payment_id()
+from payment_app.models.types import payload_text
+
+RESPONSE_ID = func.json_unquote(func.json_extract(payload_text(Transaction.api_response), "$.id"))
+
+
+class PopulatePaymentId(Backfill):
+    """Copy payment ids from api_response to gateway_payment_id."""
+    name = "populate_pay_id"
+    model = Transaction
+
+    def conditions(self):
+        return [RESPONSE_ID.like("%pay%")]
+
+    def apply(self, session, rows):
+        statement = (
+            update(Transaction)
+            .where(col(Transaction.id).in_([row[0] for row in rows]))
+            .where(RESPONSE_ID.like("%pay%"))
+            .values(gateway_payment_id=RESPONSE_ID)
+            .execution_options(synchronize_session=False)
+        )
+        return session.execute(statement).rowcount
+
+
+if __name__ == "__main__":
+    run_backfill(PopulatePaymentId())
@@ -1,18 +1,29 @@
-from typing import List
-from sqlmodel import Session, select
+from sqlalchemy import case, update
+from sqlmodel import col
+
+from payment_app.lib.backfill import Backfill, run_backfill
 from payment_app.models.transaction import Transaction
-from payment_app.configs.db import engine
 
-def populate_store_type():
-    with Session(engine) as session:
-        statement = select(Transaction)
-        transaction: List[Transaction] = session.exec(statement)
-        for tran in transaction:
-            if tran.payment_type == 'link':
-                tran.store_type = 'bd_store_id'
-            else:
-                tran.store_type = 'pos_store_id'
-            session.add(tran)
-        session.commit()
 
-populate_store_type()
+class PopulateStoreType(Backfill):
+    """Set store_type from payment_type."""
+    name = "populate_store_type"
+    model = Transaction
+
+    def apply(self, session, rows):
+        statement = (
+            update(Transaction)
+            .where(col(Transaction.id).in_([row[0] for row in rows]))
+            .values(
+                store_type=case(
+                    (Transaction.payment_type == "link", "bd_store_id"),
+                    else_="pos_store_id",
+                )
+            )
+            .execution_options(synchronize_session=False)
+        )
+        return session.execute(statement).rowcount
+
+
+if __name__ == "__main__":
+    run_backfill(PopulateStoreType())
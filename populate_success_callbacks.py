@@ -1,40 +1,42 @@
-from sqlmodel import Session, select
-from payment_app.models import TransactionCallbacks
-from payment_app.configs.db import engine
-from payment_app.models import Transaction
+from sqlmodel import col, select
 
-def populate_payment_id():
-    count = 0 
-    with Session(engine) as session:
-        statement = select(TransactionCallbacks).where(TransactionCallbacks.event == 'payment.failed').where(TransactionCallbacks.type=='payment').order_by(TransactionCallbacks.updated_at.desc())
-        transaction = session.exec(statement)
-        updated_trans = []
-        for tran in transaction:
-            transaction_id = tran.transaction_id
-            print(transaction_id)
-            if tran.transaction_id in updated_trans:
-                continue
-            else:
-                updated_trans.append(transaction_id)
-                transaction_callback = tran.callback
-                print(transaction_callback)
-                print(transaction_callback['payload']['payment']['entity'])
-                stat = select(Transaction).where(Transaction.id == transaction_id)
-                trans = session.exec(stat).first()
-                print(trans.id)
-                trans.callback_response = transaction_callback['payload']['payment']['entity']
-                print(trans)
-                session.add(trans)
-                session.commit()
-            #try:
-            #    if rep:
-                count = count + 1
-            #        tran.callback_response = rep
-            #        session.add(tran)
-            #except:
-            #    print(rep)
-        print(count)
-        #session.commit()
+from payment_app.lib.backfill import Backfill, run_backfill
+from payment_app.models import Transaction, TransactionCallbacks
 
 
-populate_payment_id()
+class PopulateFailedCallbacks(Backfill):
+    """Set callback_response of transactions from their latest payment.failed callback."""
+    name = "populate_success_callbacks"
+    model = TransactionCallbacks
+    key = TransactionCallbacks.transaction_id
+    distinct = True
+
+    def conditions(self):
+        return [
+            TransactionCallbacks.event == "payment.failed",
+            TransactionCallbacks.type == "payment",
+            col(TransactionCallbacks.transaction_id).is_not(None),
+        ]
+
+    def apply(self, session, rows):
+        statement = (
+            select(TransactionCallbacks.transaction_id, TransactionCallbacks.callback)
+            .where(col(TransactionCallbacks.transaction_id).in_([row[0] for row in rows]))
+            .where(*self.conditions())
+            .order_by(TransactionCallbacks.updated_at.desc())
+        )
+        latest = {}
+        for transaction_id, callback in session.exec(statement):
+            latest.setdefault(transaction_id, callback)
+        session.bulk_update_mappings(
+            Transaction,
+            [
+                {"id": transaction_id, "callback_response": callback["payload"]["payment"]["entity"]}
+                for transaction_id, callback in latest.items()
+            ],
+        )
+        return len(latest)
+
+
+if __name__ == "__main__":
+    run_backfill(PopulateFailedCallbacks())
@@ -1,33 +1,16 @@
-from loguru import logger
-from sqlmodel import Session, select
-from payment_app.configs.db import engine
-from payment_app.handlers.client_callback_handler import (
-    client_callback_transaction_handler,
-)
-from payment_app.models.transaction import STATUS_SUCCESS, Transaction
-from datetime import datetime, timedelta    
+"""Resend callbacks of the given successful transactions, see payment_app.services.resend_callbacks."""
+import sys
 
-def pick_success_transactions(session):
-    last_month = (datetime.now() - timedelta(days=40))
-    statement = select(Transaction).where(Transaction.id == '01GS9HDEQSG4CJMFQ0MA3KPVKD')
-    #.where(Transaction.created_at <= last_month)
-    transactions = session.exec(statement)
-    for transaction in transactions:
-        logger.info(f"resending success transaction {transaction.id}")
-        client_callback_transaction_handler(
-            session,
-            {
-                "event": "transaction",
-                "transaction": transaction,
-                "driver": "razorpay",
-            },
-        )
+from payment_app.models.transaction import STATUS_SUCCESS
+from payment_app.services.resend_callbacks import CallbackResender
 
 
-def success_payment_check():
-    with Session(engine) as session:
-        pick_success_transactions(session)
+def success_payment_check(transaction_ids):
+    return CallbackResender(status=STATUS_SUCCESS, transaction_ids=transaction_ids).run(resume=False)
 
 
 if __name__ == "__main__":
-    success_payment_check()
+    if len(sys.argv) < 2:
+        # without ids the resender would match every successful transaction
+        sys.exit(f"usage: python {sys.argv[0]} <transaction id> [<transaction id> ...]")
+    success_payment_check(sys.argv[1:])